@@ -0,0 +1,505 @@
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+
+import numpy as np
+import polars as pl
+import torch
+
+from .devices import cpu_count, device_id, resolve_device
+
+# Metrics not checked for regressions: spreads, counts and sizes
+_UNCHECKED_SUFFIXES = ("_std", "_ooms", "_retries", "num_params", "items", "repeats")
+
+# Scale of the median absolute deviation that estimates a standard deviation
+_MAD_SCALE = 1.4826
+
+REPORT_SCHEMA = {
+    "benchmark": pl.Utf8,
+    "metric": pl.Utf8,
+    "value": pl.Float64,
+    "baseline": pl.Float64,
+    "baseline_runs": pl.Int64,
+    "spread": pl.Float64,
+    "threshold": pl.Float64,
+    "change": pl.Float64,
+    "status": pl.Utf8,
+}
+
+
+def default_history_path():
+    cache_dir = os.environ.get(
+        "DART_CACHE_DIR", os.path.expanduser("~/.cache/dnalm_bench")
+    )
+    return os.path.join(cache_dir, "benchmark_history.sqlite")
+
+
+def metric_direction(metric):
+    """
+    1 if higher values of a metric are better (throughputs), -1 if lower
+    values are (times and memory), or None if it is not checked
+    """
+    if metric.endswith(_UNCHECKED_SUFFIXES):
+        return None
+    if metric.endswith("_per_sec"):
+        return 1
+    if metric == "seconds" or "time" in metric or "mem" in metric:
+        return -1
+
+    return None
+
+
+def _noise_floor(metric):
+    # Resident memory moves by whole pages and allocator arenas
+    return 2**20 if "mem" in metric else 0.0
+
+
+def git_commit(path=None):
+    """
+    HEAD commit of the git checkout containing path (by default this
+    package) and whether tracked files have uncommitted changes, or
+    (None, None) outside a checkout
+    """
+    cwd = path or os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+    return commit, bool(status.strip())
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+
+    return platform.processor()
+
+
+def host_info(device_name):
+    """
+    Hardware and software a benchmark ran on, given the device_id of its
+    device. Everything but the hostname goes into the host fingerprint, so
+    that runs on identical machines are compared with each other and runs on
+    different hardware, thread settings or library versions are not.
+    """
+    return {
+        "hostname": platform.node(),
+        "machine": platform.machine(),
+        "cpu": _cpu_model(),
+        "cpus": cpu_count(),
+        "num_threads": os.environ.get("DART_NUM_THREADS"),
+        "device": device_name,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+    }
+
+
+def host_fingerprint(info):
+    fields = {k: v for k, v in info.items() if k != "hostname"}
+    encoded = json.dumps(fields, sort_keys=True).encode("utf-8")
+
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def _numeric(row, columns):
+    return {
+        column: float(row[column])
+        for column in columns
+        if isinstance(row[column], (int, float)) and not isinstance(row[column], bool)
+    }
+
+
+def pipeline_metrics(table):
+    """
+    {benchmark: {metric: value}} of a benchmark_pipeline table, with one
+    benchmark per stage and family
+    """
+    columns = ["seconds", "items_per_sec", "mem_delta", "peak_mem"]
+
+    return {
+        f"{row['stage']}/{row['family']}" if row["family"] else row["stage"]: _numeric(
+            row, columns
+        )
+        for row in table.iter_rows(named=True)
+    }
+
+
+def sweep_metrics(table):
+    """
+    {benchmark: {metric: value}} of a sweep_model_resources table, with one
+    benchmark per model, mode, sequence length and batch size that ran.
+    peak_mem is left out for CPU sweeps, where it is a sampled resident
+    memory peak too noisy to track.
+    """
+    columns = [
+        "time_mean",
+        "time_p50",
+        "time_p90",
+        "time_p99",
+        "tokens_per_sec",
+        "bases_per_sec",
+        "peak_mem",
+        "peak_reserved",
+    ]
+
+    return {
+        f"{row['model']}/{row['mode']}/L{row['seq_len']}/B{row['batch_size']}": _numeric(
+            row,
+            [
+                column
+                for column in columns
+                if not (column == "peak_mem" and row["device"].startswith("cpu:"))
+            ],
+        )
+        for row in table.iter_rows(named=True)
+        if row["status"] == "ok"
+    }
+
+
+def profile_metrics(metrics, model):
+    """
+    {benchmark: {metric: value}} of the metrics written by
+    profile_model_resources for model
+    """
+    return {model: _numeric(metrics, metrics.keys())}
+
+
+class BenchmarkHistory:
+    """
+    SQLite store of benchmark runs: per run, the suite it belongs to, the git
+    commit (and whether the tree was dirty), the host it ran on (see
+    host_info), its parameters and its metrics per benchmark. compare()
+    checks a run against a rolling baseline of earlier runs of the same
+    suite, host and parameters.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_history_path()
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.path, timeout=600)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                suite TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                git_commit TEXT,
+                dirty INTEGER,
+                host TEXT NOT NULL,
+                host_info TEXT NOT NULL,
+                params TEXT NOT NULL,
+                source TEXT
+            )
+            """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                run_id INTEGER NOT NULL,
+                benchmark TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                value REAL
+            )
+            """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS runs_series ON runs (suite, host, params)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS metrics_run ON metrics (run_id)")
+        self.conn.commit()
+
+    def record(
+        self,
+        suite,
+        metrics,
+        params=None,
+        device="auto",
+        source=None,
+        commit=None,
+        device_name=None,
+    ):
+        """
+        Stores a run's {benchmark: {metric: value}} and returns its id. source
+        identifies the results file a run was read from: a run from a source
+        that is already stored is not recorded again, and its id is returned.
+        commit is a (commit, dirty) pair, taken from this package's checkout
+        by default. device is the device the benchmarks ran on, which is part
+        of the host fingerprint; for results from elsewhere, device_name
+        gives its device_id instead.
+        """
+        if source is not None:
+            row = self.conn.execute(
+                "SELECT id FROM runs WHERE source = ?", (source,)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+
+        git_hash, dirty = commit if commit is not None else git_commit()
+        if device_name is None:
+            device_name = device_id(resolve_device(device))
+        info = host_info(device_name)
+        cursor = self.conn.execute(
+            "INSERT INTO runs (suite, timestamp, git_commit, dirty, host, host_info, "
+            "params, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                suite,
+                time.time(),
+                git_hash,
+                dirty,
+                host_fingerprint(info),
+                json.dumps(info, sort_keys=True),
+                json.dumps(params or {}, sort_keys=True, default=str),
+                source,
+            ),
+        )
+        run_id = cursor.lastrowid
+        self.conn.executemany(
+            "INSERT INTO metrics VALUES (?, ?, ?, ?)",
+            (
+                (run_id, benchmark, metric, value)
+                for benchmark, values in metrics.items()
+                for metric, value in values.items()
+            ),
+        )
+        self.conn.commit()
+
+        return run_id
+
+    def record_file(self, path, params=None, device="auto"):
+        """
+        Records a results file: a benchmark_pipeline or sweep_model_resources
+        TSV, or a profile_model_resources JSON (named after its model) from a
+        run on device. Sweeps are fingerprinted by the device recorded in
+        them, and pipeline results by the parameters written next to them,
+        so they share baselines with runs recorded as they ran. The file's
+        path and mtime are its source, so recording it again is a no-op.
+        Returns the run id.
+        """
+        from .benchmarks import params_path
+
+        source = f"{os.path.abspath(path)}:{os.path.getmtime(path)}"
+        device_name = None
+        if path.endswith(".json"):
+            with open(path) as f:
+                data = json.load(f)
+            model = os.path.splitext(os.path.basename(path))[0]
+            suite, metrics = "model_profile", profile_metrics(data, model)
+        else:
+            table = pl.read_csv(path, separator="\t")
+            if "stage" in table.columns:
+                suite, metrics = "pipeline", pipeline_metrics(table)
+                device = "cpu"
+                if params is None and os.path.exists(params_path(path)):
+                    with open(params_path(path)) as f:
+                        params = json.load(f)
+            else:
+                suite, metrics = "model_sweep", sweep_metrics(table)
+                device_name = table["device"][0]
+
+        return self.record(
+            suite, metrics, params, device, source, device_name=device_name
+        )
+
+    def runs(self, suite=None):
+        """
+        Stored runs, oldest first, as a frame
+        """
+        query = (
+            "SELECT id, suite, timestamp, git_commit, dirty, host, params, source "
+            "FROM runs"
+        )
+        params = ()
+        if suite is not None:
+            query += " WHERE suite = ?"
+            params = (suite,)
+
+        return pl.DataFrame(
+            self.conn.execute(query + " ORDER BY id", params).fetchall(),
+            schema={
+                "id": pl.Int64,
+                "suite": pl.Utf8,
+                "timestamp": pl.Float64,
+                "git_commit": pl.Utf8,
+                "dirty": pl.Boolean,
+                "host": pl.Utf8,
+                "params": pl.Utf8,
+                "source": pl.Utf8,
+            },
+        )
+
+    def _metrics(self, run_ids):
+        values = {}
+        rows = self.conn.execute(
+            f"SELECT run_id, benchmark, metric, value FROM metrics "
+            f"WHERE run_id IN ({', '.join('?' * len(run_ids))})",
+            run_ids,
+        )
+        for run_id, benchmark, metric, value in rows:
+            values.setdefault((benchmark, metric), {})[run_id] = value
+
+        return values
+
+    def compare(self, run_id, window=10, min_runs=3, rel_threshold=0.05, num_mads=3.0):
+        """
+        Report of a run's metrics against the rolling baseline of the window
+        latest earlier runs with the same suite, host and parameters. The
+        baseline of a metric is its median over those runs, and a change in
+        its worse direction (see metric_direction) is a regression once it
+        exceeds the larger of rel_threshold of the baseline, num_mads robust
+        standard deviations (scaled median absolute deviations) of the
+        baseline runs and a noise floor for memory. Larger changes in the
+        better direction are improvements. Metrics with fewer than min_runs
+        baseline values are new, and those without a direction unchecked.
+        """
+        suite, host, params = self.conn.execute(
+            "SELECT suite, host, params FROM runs WHERE id = ?", (run_id,)
+        ).fetchone()
+        baseline_ids = [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT id FROM runs WHERE suite = ? AND host = ? AND params = ? "
+                "AND id < ? ORDER BY id DESC LIMIT ?",
+                (suite, host, params, run_id, window),
+            )
+        ]
+        current = self._metrics([run_id])
+        baseline = self._metrics(baseline_ids) if baseline_ids else {}
+
+        rows = []
+        for (benchmark, metric), by_run in sorted(current.items()):
+            value = by_run[run_id]
+            history = np.array(
+                [
+                    v
+                    for v in baseline.get((benchmark, metric), {}).values()
+                    if v is not None
+                ]
+            )
+            row = {
+                "benchmark": benchmark,
+                "metric": metric,
+                "value": value,
+                "baseline": None,
+                "baseline_runs": len(history),
+                "spread": None,
+                "threshold": None,
+                "change": None,
+                "status": "new",
+            }
+            direction = metric_direction(metric)
+            if direction is None:
+                row["status"] = "unchecked"
+            elif len(history) >= min_runs and value is not None:
+                median = float(np.median(history))
+                spread = _MAD_SCALE * float(np.median(np.abs(history - median)))
+                threshold = max(
+                    rel_threshold * abs(median), num_mads * spread, _noise_floor(metric)
+                )
+                delta = (value - median) * direction
+                if delta < -threshold:
+                    status = "regression"
+                elif delta > threshold:
+                    status = "improvement"
+                else:
+                    status = "ok"
+                row.update(
+                    baseline=median,
+                    spread=spread,
+                    threshold=threshold,
+                    change=(value - median) / abs(median) if median else None,
+                    status=status,
+                )
+            rows.append(row)
+
+        return pl.DataFrame(rows, schema=REPORT_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+
+def print_report(report, out_path=None):
+    """
+    Prints the regressions and improvements of a compare() report, writing
+    the full report as a TSV to out_path if given. Returns the number of
+    regressions.
+    """
+    flagged = report.filter(pl.col("status").is_in(["regression", "improvement"]))
+    for row in flagged.iter_rows(named=True):
+        change = "" if row["change"] is None else f"{row['change'] * 100:+7.1f}%"
+        print(
+            f"{row['status']:<12} {row['benchmark']:<48} {row['metric']:<16} "
+            f"{row['value']:14.4g} vs {row['baseline']:14.4g} {change}"
+        )
+    counts = report.group_by("status").len().rows()
+    print(", ".join(f"{count} {status}" for status, count in sorted(counts)))
+
+    if out_path is not None:
+        report.write_csv(out_path, separator="\t")
+
+    return flagged.filter(pl.col("status") == "regression").height
+
+
+def track_pipeline(work_dir, history_path=None, report_path=None, **kwargs):
+    """
+    Runs benchmark_pipeline with kwargs, records it in the history and
+    prints its comparison against the baseline. Returns the run id and
+    report.
+    """
+    from .benchmarks import benchmark_pipeline, pipeline_params
+
+    params = pipeline_params(**kwargs)
+    table = benchmark_pipeline(work_dir, **kwargs)
+    history = BenchmarkHistory(history_path)
+    run_id = history.record("pipeline", pipeline_metrics(table), params, "cpu")
+    report = history.compare(run_id)
+    history.close()
+    print_report(report, report_path)
+
+    return run_id, report
+
+
+if __name__ == "__main__":
+    # python -m dnalm_bench.benchmark_history pipeline <work_dir> [report.tsv]
+    # python -m dnalm_bench.benchmark_history record <results file>...
+    history_path = os.environ.get("DART_BENCHMARK_HISTORY")
+    command = sys.argv[1]
+    if command == "pipeline":
+        report_path = sys.argv[3] if len(sys.argv) > 3 else None
+        _, report = track_pipeline(sys.argv[2], history_path, report_path)
+        num_regressions = report.filter(pl.col("status") == "regression").height
+    elif command == "record":
+        history = BenchmarkHistory(history_path)
+        num_regressions = 0
+        for path in sys.argv[2:]:
+            print(path)
+            run_id = history.record_file(path)
+            num_regressions += print_report(history.compare(run_id))
+        history.close()
+    else:
+        raise ValueError(f"Unknown command {command}, expected pipeline or record")
+
+    sys.exit(1 if num_regressions else 0)
@@ -0,0 +1,447 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import polars as pl
+import torch
+
+from .devices import memory_in_use, peak_memory, resolve_device
+from .models import MODEL_FAMILIES
+from .synthetic import (
+    TINY_FAMILIES,
+    random_onehot,
+    tiny_model,
+    tiny_tokenizer,
+    write_bigwig,
+    write_embedding_store,
+    write_genome_fasta,
+    write_paired_control_elements,
+)
+from .utils import dinucleotide_shuffle, one_hot_encode, onehot_to_chars
+
+STAGES = (
+    "paired_control_getitem",
+    "dinucleotide_shuffle",
+    "one_hot_encode",
+    "onehot_to_chars",
+    "tokenize_hf",
+    "tokenize_native",
+    "offsets_to_indices",
+    "embedding_read",
+    "collate_batch",
+    "zero_shot_score",
+)
+
+
+class PipelineFixtures:
+    """
+    Synthetic inputs for the pipeline benchmarks, written to work_dir: a
+    genome FASTA and bigWig over two chromosomes, a paired control elements
+    TSV of num_elements windows of seq_len bases with elem_len-base elements
+    and an embedding store for them. Tiny tokenizers and models for each
+    family (see synthetic.tiny_tokenizer and synthetic.tiny_model) are built
+    on first use. Everything is derived from seed.
+    """
+
+    def __init__(
+        self,
+        work_dir,
+        num_elements=256,
+        seq_len=500,
+        elem_len=200,
+        num_tokens=100,
+        hidden=32,
+        seed=0,
+    ):
+        os.makedirs(work_dir, exist_ok=True)
+        self.num_elements = num_elements
+        self.seq_len = seq_len
+        self.elem_len = elem_len
+        self.seed = seed
+
+        rng = np.random.default_rng(seed)
+        chrom_sizes = {"chr1": 200_000, "chr2": 100_000}
+        self.genome_fa = write_genome_fasta(
+            os.path.join(work_dir, "genome.fa"), chrom_sizes, rng
+        )
+        self.bigwig = write_bigwig(
+            os.path.join(work_dir, "signal.bw"), chrom_sizes, rng
+        )
+        self.elements_tsv = write_paired_control_elements(
+            os.path.join(work_dir, "elements.tsv"),
+            chrom_sizes,
+            num_elements,
+            seq_len,
+            elem_len,
+            rng,
+        )
+        self.embeddings_h5 = write_embedding_store(
+            os.path.join(work_dir, "embeddings.h5"),
+            num_elements,
+            seq_len,
+            num_tokens,
+            hidden,
+            rng,
+        )
+
+    def rng(self, stage):
+        # Each stage draws from its own stream, so its inputs do not depend
+        # on which other stages run
+        return np.random.default_rng([self.seed, STAGES.index(stage)])
+
+    @functools.cache
+    def tokenizer(self, family):
+        return tiny_tokenizer(family, seed=self.seed)
+
+    @functools.cache
+    def native_tokenizer(self, family):
+        native_cls = MODEL_FAMILIES[family].native_tokenizer
+        if native_cls is None:
+            return None
+
+        return native_cls(self.tokenizer(family))
+
+    @functools.cache
+    def model(self, family, max_len):
+        return tiny_model(family, self.tokenizer(family), max_len, seed=self.seed)
+
+
+def _measure(fn, num_items, num_repeats):
+    """
+    Median time of fn over num_repeats runs after a warm-up run, with the
+    resident memory held by the warm-up run's output and the peak resident
+    memory of the process so far (which only grows from stage to stage)
+    """
+    base = memory_in_use("cpu")
+    out = fn()
+    mem_delta = memory_in_use("cpu") - base
+    del out
+
+    times = []
+    for _ in range(num_repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    seconds = float(np.median(times))
+
+    return {
+        "items": num_items,
+        "seconds": seconds,
+        "items_per_sec": num_items / seconds,
+        "mem_delta": mem_delta,
+        "peak_mem": peak_memory("cpu"),
+    }
+
+
+def _paired_control_getitem(fixtures, families, batch_size):
+    from .task_1_paired_control.components import PairedControlDataset
+
+    dataset = PairedControlDataset(
+        fixtures.genome_fa, fixtures.elements_tsv, None, fixtures.seed
+    )
+
+    def fn():
+        return [dataset[i] for i in range(len(dataset))]
+
+    yield None, len(dataset), fn
+
+
+def _dinucleotide_shuffle(fixtures, families, batch_size):
+    rng = fixtures.rng("dinucleotide_shuffle")
+    seqs = random_onehot(fixtures.num_elements, fixtures.elem_len, rng).numpy()
+
+    def fn():
+        shuffle_rng = np.random.default_rng(fixtures.seed)
+        return [dinucleotide_shuffle(seq, shuffle_rng) for seq in seqs]
+
+    yield None, len(seqs), fn
+
+
+def _one_hot_encode(fixtures, families, batch_size):
+    rng = fixtures.rng("one_hot_encode")
+    seqs = onehot_to_chars(random_onehot(fixtures.num_elements, fixtures.seq_len, rng))
+
+    def fn():
+        return [one_hot_encode(seq) for seq in seqs]
+
+    yield None, len(seqs), fn
+
+
+def _onehot_to_chars(fixtures, families, batch_size):
+    rng = fixtures.rng("onehot_to_chars")
+    seqs = random_onehot(fixtures.num_elements, fixtures.seq_len, rng)
+    batches = torch.split(seqs, batch_size)
+
+    def fn():
+        return [onehot_to_chars(batch) for batch in batches]
+
+    yield None, len(seqs), fn
+
+
+def _tokenize_hf(fixtures, families, batch_size):
+    rng = fixtures.rng("tokenize_hf")
+    batches = torch.split(
+        random_onehot(fixtures.num_elements, fixtures.seq_len, rng), batch_size
+    )
+    for family in families:
+        tokenizer = fixtures.tokenizer(family)
+
+        # As in HFEmbeddingExtractor.tokenize
+        def fn():
+            return [
+                tokenizer(
+                    onehot_to_chars(batch),
+                    return_tensors="pt",
+                    padding=True,
+                    return_offsets_mapping=True,
+                )
+                for batch in batches
+            ]
+
+        yield family, fixtures.num_elements, fn
+
+
+def _tokenize_native(fixtures, families, batch_size):
+    rng = fixtures.rng("tokenize_native")
+    batches = torch.split(
+        random_onehot(fixtures.num_elements, fixtures.seq_len, rng), batch_size
+    )
+    for family in families:
+        native = fixtures.native_tokenizer(family)
+        if native is None:
+            continue
+
+        tokenizer = fixtures.tokenizer(family)
+        expected = tokenizer(onehot_to_chars(batches[0]), return_tensors="pt")
+        if not torch.equal(expected["input_ids"], native(batches[0])):
+            raise AssertionError(f"Native {family} tokenizer ids differ")
+
+        def fn():
+            return [native(batch) for batch in batches]
+
+        yield family, fixtures.num_elements, fn
+
+
+def _offsets_to_indices(fixtures, families, batch_size):
+    from .task_1_paired_control.supervised.embeddings import (
+        DNABERT2EmbeddingExtractor,
+        GenaLMEmbeddingExtractor,
+        MistralDNAEmbeddingExtractor,
+    )
+
+    extractors = {
+        "dnabert2": DNABERT2EmbeddingExtractor,
+        "gena_lm": GenaLMEmbeddingExtractor,
+        "mistral_dna": MistralDNAEmbeddingExtractor,
+    }
+    rng = fixtures.rng("offsets_to_indices")
+    batches = torch.split(
+        random_onehot(fixtures.num_elements, fixtures.seq_len, rng), batch_size
+    )
+    # Families with fixed indices only record a slice
+    for family in families:
+        if family not in extractors:
+            continue
+
+        tokenizer = fixtures.tokenizer(family)
+        offsets = [
+            tokenizer(
+                onehot_to_chars(batch),
+                return_tensors="pt",
+                padding=True,
+                return_offsets_mapping=True,
+            )["offset_mapping"]
+            for batch in batches
+        ]
+        offsets_to_indices = extractors[family]._offsets_to_indices
+
+        def fn():
+            return [
+                offsets_to_indices(batch_offsets, batch)
+                for batch_offsets, batch in zip(offsets, batches)
+            ]
+
+        yield family, fixtures.num_elements, fn
+
+
+def _embeddings_dataset(fixtures):
+    from .task_1_paired_control.supervised.training import EmbeddingsDataset
+
+    return EmbeddingsDataset(fixtures.embeddings_h5, fixtures.elements_tsv, None)
+
+
+def _embedding_read(fixtures, families, batch_size):
+    dataset = _embeddings_dataset(fixtures)
+
+    def fn():
+        return list(dataset)
+
+    yield None, len(dataset), fn
+
+
+def _collate_batch(fixtures, families, batch_size):
+    from .task_1_paired_control.supervised.training import _collate_batch
+
+    items = list(_embeddings_dataset(fixtures))
+    batches = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+
+    def fn():
+        return [_collate_batch(batch) for batch in batches]
+
+    yield None, len(items), fn
+
+
+def _zero_shot_score(fixtures, families, batch_size, score_seq_len=64):
+    from .task_1_paired_control.zero_shot.evaluators import (
+        CaduceusEvaluator,
+        DNABERT2Evaluator,
+        GenaLMEvaluator,
+        HDEvaluator,
+        HFZeroShotEvaluator,
+        MistralEvaluator,
+        NTEvaluator,
+    )
+
+    evaluators = {
+        "dnabert2": DNABERT2Evaluator,
+        "gena_lm": GenaLMEvaluator,
+        "hyenadna": HDEvaluator,
+        "mistral_dna": MistralEvaluator,
+        "nucleotide_transformer": NTEvaluator,
+        "caduceus": CaduceusEvaluator,
+    }
+    rng = fixtures.rng("zero_shot_score")
+    seqs = random_onehot(batch_size, score_seq_len, rng)
+    for family in families:
+        # The family's evaluator (special tokens, scoring and forward pass)
+        # around the tiny tokenizer and model instead of a pretrained one
+        evaluator_cls = evaluators[family]
+        evaluator = evaluator_cls.__new__(evaluator_cls)
+        HFZeroShotEvaluator.__init__(
+            evaluator,
+            fixtures.tokenizer(family),
+            fixtures.model(family, score_seq_len + 2),
+            seqs,
+            batch_size,
+            0,
+            "cpu",
+        )
+        evaluator.native_tokenizer = fixtures.native_tokenizer(family)
+        tokens, starts, ends, attention_mask = evaluator.tokenize(seqs)
+
+        def fn():
+            return evaluator.score(tokens, starts, ends, attention_mask)
+
+        yield family, len(seqs), fn
+
+
+STAGE_BENCHMARKS = {
+    "paired_control_getitem": _paired_control_getitem,
+    "dinucleotide_shuffle": _dinucleotide_shuffle,
+    "one_hot_encode": _one_hot_encode,
+    "onehot_to_chars": _onehot_to_chars,
+    "tokenize_hf": _tokenize_hf,
+    "tokenize_native": _tokenize_native,
+    "offsets_to_indices": _offsets_to_indices,
+    "embedding_read": _embedding_read,
+    "collate_batch": _collate_batch,
+    "zero_shot_score": _zero_shot_score,
+}
+
+
+def benchmark_pipeline(
+    work_dir,
+    stages=None,
+    families=None,
+    num_elements=256,
+    seq_len=500,
+    elem_len=200,
+    batch_size=32,
+    num_repeats=3,
+    seed=0,
+    out_path=None,
+):
+    """
+    Throughput (items per second) and memory of each stage of the data and
+    evaluation pipeline run in isolation on the CPU, offline: fixtures (see
+    PipelineFixtures) are written to work_dir and models are tiny random
+    stand-ins, so results track the cost of our own code rather than of
+    pretrained weights. Family-specific stages run for each of families
+    (default: all six). Returns the results as a table, also written as a
+    TSV to out_path if given, with the parameters (see pipeline_params) in
+    a JSON next to it (see params_path).
+    """
+    params = pipeline_params(
+        stages=stages,
+        families=families,
+        num_elements=num_elements,
+        seq_len=seq_len,
+        elem_len=elem_len,
+        batch_size=batch_size,
+        num_repeats=num_repeats,
+        seed=seed,
+    )
+    stages = stages or STAGES
+    families = families or list(TINY_FAMILIES)
+    for stage in stages:
+        if stage not in STAGE_BENCHMARKS:
+            raise ValueError(f"Unknown stage {stage}, expected one of {STAGES}")
+
+    resolve_device("cpu")
+    torch.manual_seed(seed)
+    fixtures = PipelineFixtures(work_dir, num_elements, seq_len, elem_len, seed=seed)
+
+    rows = []
+    for stage in stages:
+        for family, num_items, fn in STAGE_BENCHMARKS[stage](
+            fixtures, families, batch_size
+        ):
+            row = {"stage": stage, "family": family}
+            row.update(_measure(fn, num_items, num_repeats))
+            rows.append(row)
+            print(
+                f"{stage:<24} {family or '':<24} {row['items_per_sec']:12.1f} items/s  "
+                f"{row['mem_delta'] / 2**20:8.1f} MiB  "
+                f"peak {row['peak_mem'] / 2**20:8.1f} MiB"
+            )
+
+    results = pl.from_dicts(rows)
+    if out_path is not None:
+        results.write_csv(out_path, separator="\t")
+        with open(params_path(out_path), "w") as f:
+            json.dump(params, f, indent=4)
+
+    return results
+
+
+def pipeline_params(**kwargs):
+    """
+    Parameters of a benchmark_pipeline call with kwargs, defaults included,
+    other than where it writes to. Runs with equal parameters are comparable.
+    """
+    bound = inspect.signature(benchmark_pipeline).bind_partial(**kwargs)
+    bound.apply_defaults()
+
+    return {
+        k: list(v) if isinstance(v, tuple) else v
+        for k, v in bound.arguments.items()
+        if k not in ("work_dir", "out_path")
+    }
+
+
+def params_path(out_path):
+    """
+    Where benchmark_pipeline writes the parameters of results at out_path
+    """
+    return f"{os.path.splitext(out_path)[0]}_params.json"
+
+
+if __name__ == "__main__":
+    work_dir = sys.argv[1]
+    out_path = sys.argv[2] if len(sys.argv) > 2 else None
+    stages = sys.argv[3].split(",") if len(sys.argv) > 3 else None
+    benchmark_pipeline(work_dir, stages=stages, out_path=out_path)
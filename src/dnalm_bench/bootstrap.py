@@ -0,0 +1,392 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+_CHUNK_ELEMENTS = 2**24
+
+
+def bootstrap_indices(num_samples, num_replicates, rng, strata=None):
+    """
+    Draws a (num_replicates, num_samples) matrix of resampling indices. With
+    strata, each stratum is resampled separately so every replicate keeps the
+    original stratum sizes.
+    """
+    if strata is None:
+        return rng.integers(0, num_samples, size=(num_replicates, num_samples))
+
+    strata = np.asarray(strata)
+    indices = np.empty((num_replicates, num_samples), dtype=np.int64)
+    for stratum in np.unique(strata):
+        members = np.flatnonzero(strata == stratum)
+        draws = rng.integers(0, len(members), size=(num_replicates, len(members)))
+        indices[:, members] = members[draws]
+
+    return indices
+
+
+def bootstrap_weights(indices, num_samples):
+    """
+    Converts a (num_replicates, n) index matrix into per-sample multiplicities,
+    so that metrics can be computed on the original (sorted once) data.
+    """
+    num_replicates = indices.shape[0]
+    offsets = np.arange(num_replicates)[:, None] * num_samples
+    counts = np.bincount(
+        (indices + offsets).ravel(), minlength=num_replicates * num_samples
+    )
+
+    return counts.reshape(num_replicates, num_samples).astype(np.int32)
+
+
+def _sort_with_ties(values):
+    # Sort order of a 1D array, and for each sorted position the first and
+    # last position of its tie group
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+
+    n = len(values)
+    positions = np.arange(n)
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = sorted_values[1:] != sorted_values[:-1]
+    is_end = np.ones(n, dtype=bool)
+    is_end[:-1] = is_start[1:]
+
+    starts = np.maximum.accumulate(np.where(is_start, positions, 0))
+    ends = np.minimum.accumulate(np.where(is_end, positions, n - 1)[::-1])[::-1]
+
+    return order, starts, ends
+
+
+def _prefix_sums(values):
+    # Cumulative sums with a leading zero, so sums over [i, j] are c[j + 1] - c[i]
+    dtype = values.dtype if np.issubdtype(values.dtype, np.integer) else np.float64
+    sums = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,), dtype=dtype)
+    np.cumsum(values, axis=-1, out=sums[..., 1:])
+
+    return sums
+
+
+def _per_row(fn, values, weights, *others):
+    # Applies fn(row, weights, *other_rows) to each row of values (..., n) with
+    # (num_replicates, n) weights, giving (..., num_replicates). Without
+    # weights every sample counts once and the replicate axis is dropped.
+    values = np.asarray(values)
+    squeeze = weights is None
+    if squeeze:
+        weights = np.ones((1, values.shape[-1]), dtype=np.int32)
+
+    others = [np.broadcast_to(o, values.shape) for o in others]
+    rows = [o.reshape(-1, values.shape[-1]) for o in [values] + others]
+    out = np.stack([fn(row[0], weights, *row[1:]) for row in zip(*rows)])
+    out = out.reshape(values.shape[:-1] + out.shape[1:])
+
+    return out[..., 0] if squeeze else out
+
+
+def _row_ranks(values, weights):
+    order, starts, ends = _sort_with_ties(values)
+    cum_weights = _prefix_sums(weights[:, order])
+    below = cum_weights[:, starts]
+    tied = cum_weights[:, ends + 1] - below
+
+    ranks = np.empty(cum_weights[:, 1:].shape, dtype=np.float64)
+    ranks[:, order] = below + (tied + 1) / 2
+
+    return ranks
+
+
+def average_ranks(values, weights=None):
+    """
+    1-based ranks along the last axis, with ties given their average rank
+    (scipy.stats.rankdata's "average" method). With (num_replicates, n) weights,
+    gives the ranks of each sample in every replicate where sample i appears
+    weights[r, i] times, with shape (..., num_replicates, n).
+    """
+    values = np.asarray(values)
+    rows = values.reshape(-1, values.shape[-1])
+    unweighted = weights is None
+    if unweighted:
+        weights = np.ones((1, values.shape[-1]), dtype=np.int32)
+
+    ranks = np.stack([_row_ranks(row, weights) for row in rows])
+    if unweighted:
+        return ranks[:, 0].reshape(values.shape)
+
+    return ranks.reshape(values.shape[:-1] + ranks.shape[1:])
+
+
+def _row_auroc(scores, weights, labels):
+    order, starts, ends = _sort_with_ties(scores)
+    sorted_labels = labels[order]
+    sorted_weights = weights[:, order]
+
+    # Only positives contribute, through the negatives below and tied with them
+    pos = np.flatnonzero(sorted_labels)
+    pos_weights = sorted_weights[:, pos]
+    cum_neg = _prefix_sums(np.where(sorted_labels, 0, sorted_weights))
+    neg_below = cum_neg[:, starts[pos]]
+    neg_tied = cum_neg[:, ends[pos] + 1] - neg_below
+
+    num_pos = pos_weights.sum(axis=-1)
+    num_neg = cum_neg[:, -1]
+    wins = (pos_weights * (2 * neg_below + neg_tied)).sum(axis=-1) / 2
+
+    return wins / (num_pos * num_neg)
+
+
+def auroc(scores, labels, weights=None):
+    """
+    Area under the ROC curve along the last axis, from the weighted count of
+    negatives ranked below (or tied with) each positive. Labels are boolean
+    and broadcast against scores.
+    """
+    labels = np.asarray(labels, dtype=bool)
+
+    return _per_row(_row_auroc, scores, weights, labels)
+
+
+def _row_average_precision(scores, weights, labels):
+    order, _, ends = _sort_with_ties(-scores)
+    sorted_labels = labels[order]
+    sorted_weights = weights[:, order]
+
+    # Each positive contributes the precision at the end of its tie group
+    pos = np.flatnonzero(sorted_labels)
+    pos_weights = sorted_weights[:, pos]
+    cum_pos = _prefix_sums(np.where(sorted_labels, sorted_weights, 0))
+    cum_all = _prefix_sums(sorted_weights)
+
+    tp = cum_pos[:, ends[pos] + 1]
+    predicted = cum_all[:, ends[pos] + 1]
+    precision = np.divide(tp, predicted, out=np.zeros(tp.shape), where=predicted > 0)
+
+    return (pos_weights * precision).sum(axis=-1) / cum_pos[:, -1]
+
+
+def average_precision(scores, labels, weights=None):
+    """
+    Average precision along the last axis, matching
+    sklearn.metrics.average_precision_score (tied scores share one threshold).
+    """
+    labels = np.asarray(labels, dtype=bool)
+
+    return _per_row(_row_average_precision, scores, weights, labels)
+
+
+def _weighted_pearson(x, y, weights):
+    total = weights.sum(axis=-1, keepdims=True)
+    x = x - (weights * x).sum(axis=-1, keepdims=True) / total
+    y = y - (weights * y).sum(axis=-1, keepdims=True) / total
+    cov = (weights * x * y).sum(axis=-1)
+    var_x = (weights * x * x).sum(axis=-1)
+    var_y = (weights * y * y).sum(axis=-1)
+
+    return cov / np.sqrt(var_x * var_y)
+
+
+def pearson(x, y, weights=None):
+    """
+    Pearson correlation along the last axis
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if weights is None:
+        return _weighted_pearson(x, y, np.ones(x.shape[-1]))
+
+    return _weighted_pearson(x[..., None, :], y[..., None, :], weights)
+
+
+def spearman(x, y, weights=None):
+    """
+    Spearman correlation along the last axis
+    """
+    x_ranks = average_ranks(x, weights)
+    y_ranks = average_ranks(y, weights)
+    if weights is None:
+        return pearson(x_ranks, y_ranks)
+
+    return _weighted_pearson(x_ranks, y_ranks, weights)
+
+
+def accuracy(correct, weights=None):
+    """
+    Fraction of correct predictions along the last axis
+    """
+    correct = np.asarray(correct, dtype=np.float64)
+    if weights is None:
+        return correct.mean(axis=-1)
+
+    return (correct[..., None, :] * weights).sum(axis=-1) / weights.sum(axis=-1)
+
+
+def mcc(preds, labels, weights=None):
+    """
+    Matthews correlation coefficient of boolean predictions along the last
+    axis, taken as 0 when any confusion-matrix margin is empty (as in sklearn).
+    """
+    preds = np.asarray(preds, dtype=bool)
+    labels = np.asarray(labels, dtype=bool)
+    if weights is None:
+        weights = np.ones((1, preds.shape[-1]), dtype=np.int32)
+        squeeze = True
+    else:
+        squeeze = False
+
+    preds = preds[..., None, :]
+    labels = labels[..., None, :]
+    tp = (weights * (preds & labels)).sum(axis=-1, dtype=np.float64)
+    tn = (weights * (~preds & ~labels)).sum(axis=-1, dtype=np.float64)
+    fp = (weights * (preds & ~labels)).sum(axis=-1, dtype=np.float64)
+    fn = (weights * (~preds & labels)).sum(axis=-1, dtype=np.float64)
+
+    denom = np.sqrt((tp + fp) * (tp + fn) * (tn + fp) * (tn + fn))
+    out = np.divide(
+        tp * tn - fp * fn, denom, out=np.zeros(denom.shape), where=denom > 0
+    )
+
+    return out[..., 0] if squeeze else out
+
+
+def _paired(statistic, *arrays, weights=None):
+    # Arrays hold the elements followed by their controls; a resampled pair
+    # brings both along
+    if weights is not None:
+        weights = np.concatenate([weights, weights], axis=-1)
+
+    return statistic(*arrays, weights=weights)
+
+
+def paired_score_statistics(seq_scores, ctrl_scores):
+    """
+    Statistics for zero-shot paired-control scores (scores.tsv)
+    """
+    return {"acc": partial(accuracy, np.asarray(seq_scores) > np.asarray(ctrl_scores))}
+
+
+def paired_classifier_statistics(seq_logits, ctrl_logits):
+    """
+    Statistics for a binary element-vs-control classifier, from per-pair
+    log-odds of the element class (eval_*_scores.tsv)
+    """
+    seq_logits = np.asarray(seq_logits)
+    ctrl_logits = np.asarray(ctrl_logits)
+    logits = np.concatenate([seq_logits, ctrl_logits])
+    labels = np.arange(len(logits)) < len(seq_logits)
+    preds = logits > 0
+
+    return {
+        "test_acc": partial(_paired, accuracy, preds == labels),
+        "test_acc_paired": partial(accuracy, seq_logits > ctrl_logits),
+        "test_auroc": partial(_paired, auroc, logits, labels),
+        "test_auprc": partial(_paired, average_precision, logits, labels),
+        "test_mcc": partial(_paired, mcc, preds, labels),
+    }
+
+
+def multiclass_statistics(labels, log_odds, classes):
+    """
+    Overall accuracy and per-class one-vs-rest statistics from per-example
+    labels and (n, num_classes) log-odds (eval_*_scores.tsv)
+    """
+    labels = np.asarray(labels)
+    log_odds = np.asarray(log_odds)
+
+    statistics = {"test_acc": partial(accuracy, log_odds.argmax(axis=1) == labels)}
+    for class_name, class_idx in classes.items():
+        class_log_odds = log_odds[:, class_idx]
+        class_preds = class_log_odds >= 0
+        class_labels = labels == class_idx
+
+        statistics[f"class_{class_name}_auroc"] = partial(
+            auroc, class_log_odds, class_labels
+        )
+        statistics[f"class_{class_name}_auprc"] = partial(
+            average_precision, class_log_odds, class_labels
+        )
+        statistics[f"class_{class_name}_mcc"] = partial(mcc, class_preds, class_labels)
+        statistics[f"class_{class_name}_acc"] = partial(
+            accuracy, class_preds == class_labels
+        )
+
+    return statistics
+
+
+def _bootstrap_chunk(statistics, num_samples, num_replicates, seed, strata):
+    rng = np.random.default_rng(seed)
+    indices = bootstrap_indices(num_samples, num_replicates, rng, strata)
+    weights = bootstrap_weights(indices, num_samples)
+
+    return {name: statistic(weights=weights) for name, statistic in statistics.items()}
+
+
+def bootstrap_ci(
+    statistics,
+    num_samples,
+    num_replicates=1000,
+    alpha=0.05,
+    seed=0,
+    strata=None,
+    num_workers=0,
+):
+    """
+    Percentile bootstrap intervals for a dict of statistics, each a callable
+    taking weights=None (the full data) or a (replicates, num_samples) matrix of
+    resampling multiplicities. All statistics share the same replicates, which
+    are drawn in chunks from child seeds of seed so results do not depend on
+    num_workers. Returns {name: {"estimate", "ci_lower", "ci_upper"}}.
+    """
+    chunk_size = max(1, _CHUNK_ELEMENTS // num_samples)
+    chunk_sizes = [
+        min(chunk_size, num_replicates - start)
+        for start in range(0, num_replicates, chunk_size)
+    ]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    chunk_fn = partial(_bootstrap_chunk, statistics, num_samples, strata=strata)
+
+    if num_workers > 0:
+        with ProcessPoolExecutor(num_workers) as executor:
+            chunks = list(executor.map(chunk_fn, chunk_sizes, seeds))
+    else:
+        chunks = [chunk_fn(size, child) for size, child in zip(chunk_sizes, seeds)]
+
+    intervals = {}
+    for name, statistic in statistics.items():
+        replicates = np.concatenate([chunk[name] for chunk in chunks], axis=-1)
+        lower, upper = percentile_interval(np.moveaxis(replicates, -1, 0), alpha)
+        intervals[name] = {
+            "estimate": float(statistic(weights=None)),
+            "ci_lower": float(lower),
+            "ci_upper": float(upper),
+        }
+
+    return intervals
+
+
+def write_intervals(intervals, path):
+    with open(path, "w") as f:
+        json.dump(intervals, f, indent=4)
+
+
+def load_intervals(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def format_interval(interval, precision=4):
+    """
+    LaTeX "estimate $\\pm$ half-width" string for a bootstrap interval
+    """
+    error = (interval["ci_upper"] - interval["ci_lower"]) / 2
+
+    return f"{interval['estimate']:.{precision}f} $\\pm$ {error:.{precision}e}"
+
+
+def percentile_interval(replicates, alpha=0.05):
+    """
+    Percentile bootstrap interval over the first axis of the replicate array
+    """
+    lower, upper = np.nanquantile(replicates, [alpha / 2, 1 - alpha / 2], axis=0)
+
+    return lower, upper
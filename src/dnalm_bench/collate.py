@@ -0,0 +1,176 @@
+import math
+import sys
+import time
+
+import torch
+from torch.utils.data import get_worker_info
+
+from .devices import synchronize
+
+
+class BufferRing:
+    """
+    Ring of preallocated pinned host buffers that collated batches are
+    written into instead of freshly allocated tensors, for batches headed to
+    a CUDA device. Each slot keeps one buffer per batch field, grown to the
+    largest shape seen. to_device copies a batch out asynchronously and
+    records when the copy is done, and a slot is only refilled after that.
+
+    The ring is inactive (collation allocates fresh tensors) for CPU devices,
+    where batches are used in place and could be overwritten while still
+    referenced, and in DataLoader workers, whose batches are handed over
+    through shared memory.
+    """
+
+    def __init__(self, device, num_slots=4):
+        self.active = torch.device(device).type == "cuda"
+        self.num_slots = num_slots
+        self._reset()
+
+    def _reset(self):
+        self.buffers = [{} for _ in range(self.num_slots)]
+        self.events = [None] * self.num_slots
+        self.next_slot = 0
+
+    def __getstate__(self):
+        # Workers get an empty ring, which they do not use
+        state = self.__dict__.copy()
+        state["buffers"] = None
+        state["events"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._reset()
+
+    def acquire(self):
+        """
+        Slot to collate the next batch into, or None to allocate fresh tensors
+        """
+        if not self.active or get_worker_info() is not None:
+            return None
+
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % self.num_slots
+        if self.events[slot] is not None:
+            self.events[slot].synchronize()
+            self.events[slot] = None
+
+        return slot
+
+    def buffer(self, slot, key, shape, dtype=torch.float32):
+        if slot is None:
+            return torch.empty(shape, dtype=dtype)
+
+        size = math.prod(shape)
+        buf = self.buffers[slot].get(key)
+        if buf is None or buf.numel() < size or buf.dtype != dtype:
+            buf = torch.empty(size, dtype=dtype, pin_memory=True)
+            self.buffers[slot][key] = buf
+
+        return buf[:size].view(shape)
+
+    def to_device(self, tensors, device):
+        """
+        Non-blocking copies of a collated batch's tensors to the device
+        """
+        out = tuple(t.to(device, non_blocking=True) for t in tensors)
+        if self.active:
+            ptr = tensors[0].untyped_storage().data_ptr()
+            for slot, buffers in enumerate(self.buffers):
+                if any(b.untyped_storage().data_ptr() == ptr for b in buffers.values()):
+                    event = torch.cuda.Event()
+                    event.record()
+                    self.events[slot] = event
+
+        return out
+
+
+def stack(tensors, ring=None, slot=None, key="stack"):
+    """
+    torch.stack, into a buffer of the ring slot if there is one
+    """
+    if ring is None:
+        return torch.stack(tensors)
+
+    shape = (len(tensors),) + tuple(tensors[0].shape)
+    return torch.stack(tensors, out=ring.buffer(slot, key, shape, tensors[0].dtype))
+
+
+def collate_embeddings(embs, scales, ring=None, slot=None, key="embs"):
+    """
+    Pads per-item stored embeddings into one float32 batch, dequantizing
+    them while they are copied in. When every item has the same length the
+    batch is filled by a single stacked copy rather than item by item.
+    """
+    max_len = max(emb.shape[0] for emb in embs)
+    shape = (len(embs), max_len, embs[0].shape[1])
+    out = torch.empty(shape) if ring is None else ring.buffer(slot, key, shape)
+
+    if all(emb.shape[0] == max_len for emb in embs):
+        if all(emb.dtype == out.dtype for emb in embs):
+            torch.stack(embs, out=out)
+        else:
+            out.copy_(torch.stack(embs))
+    else:
+        out.zero_()
+        for i, emb in enumerate(embs):
+            out[i, : emb.shape[0]] = emb
+
+    if all(scale is not None for scale in scales):
+        out.mul_(torch.stack(scales)[:, None, :])
+    else:
+        for i, (emb, scale) in enumerate(zip(embs, scales)):
+            if scale is not None:
+                out[i, : emb.shape[0]].mul_(scale)
+
+    return out
+
+
+def benchmark_collate(
+    batch_size=512,
+    seq_len=2114,
+    hidden=256,
+    num_batches=20,
+    store_dtype=torch.float32,
+    device="cpu",
+):
+    """
+    Mean collate time per batch of the previous embedding collation (fresh
+    zeroed tensor filled item by item) and of collate_embeddings with a ring
+    for device, on uniform-length items
+    """
+    items = [torch.randn(seq_len, hidden).to(store_dtype) for _ in range(batch_size)]
+    inds = [torch.arange(seq_len) for _ in range(batch_size)]
+    scales = [None] * batch_size
+
+    def previous():
+        seq_embs = torch.zeros(batch_size, seq_len, hidden)
+        for i, emb in enumerate(items):
+            seq_embs[i, : emb.shape[0]] = emb
+        return seq_embs, torch.stack(inds)
+
+    ring = BufferRing(device)
+
+    def current():
+        slot = ring.acquire()
+        return collate_embeddings(items, scales, ring, slot), stack(
+            inds, ring, slot, "inds"
+        )
+
+    results = {}
+    for name, collate in [("previous", previous), ("ring", current)]:
+        collate()
+        start = time.perf_counter()
+        for _ in range(num_batches):
+            batch = collate()
+            ring.to_device(batch, device)
+        synchronize(device)
+        results[name] = (time.perf_counter() - start) / num_batches
+        print(f"{name:<10} {results[name] * 1000:8.1f} ms/batch")
+
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_collate(device=sys.argv[1] if len(sys.argv) > 1 else "cpu")
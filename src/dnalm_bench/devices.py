@@ -0,0 +1,222 @@
+import ctypes
+import ctypes.util
+import os
+import resource
+import threading
+
+import torch
+
+# Inter-op threads can only be set once per process, before any parallel work
+_interop_threads_set = False
+
+
+def cpu_count():
+    """
+    Cores this process may run on
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count()
+
+
+def configure_cpu_threads(num_workers=0):
+    """
+    Splits the cores between this process and num_workers DataLoader workers
+    (which PyTorch runs single-threaded): the process gets the cores left over
+    as intra-op threads, and at most 4 inter-op threads. DART_NUM_THREADS
+    overrides the intra-op thread count. Returns it.
+    """
+    global _interop_threads_set
+
+    threads = int(os.environ.get("DART_NUM_THREADS", 0))
+    if threads <= 0:
+        threads = max(cpu_count() - (num_workers or 0), 1)
+    torch.set_num_threads(threads)
+
+    if not _interop_threads_set:
+        try:
+            torch.set_num_interop_threads(min(threads, 4))
+        except RuntimeError:
+            pass
+        _interop_threads_set = True
+
+    return threads
+
+
+def resolve_device(device="auto", num_workers=0):
+    """
+    The torch.device for a device name, where "auto" (or None) is CUDA when
+    available and the CPU otherwise. On the CPU, threads are set up for
+    num_workers DataLoader workers (see configure_cpu_threads).
+    """
+    if device is None or device == "auto":
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    device = torch.device(device)
+    if device.type == "cpu":
+        configure_cpu_threads(num_workers)
+
+    return device
+
+
+def synchronize(device):
+    """
+    Waits for queued work on device, so that timings cover it
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def _malloc_trim():
+    # glibc keeps freed heap memory mapped; return it to the OS where possible
+    name = ctypes.util.find_library("c")
+    if name is None:
+        return
+    try:
+        ctypes.CDLL(name).malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+def empty_cache(device):
+    """
+    Releases cached memory: the caching allocator's free blocks on a GPU,
+    and freed heap memory of the process on the CPU
+    """
+    if torch.device(device).type == "cuda":
+        torch.cuda.empty_cache()
+    else:
+        _malloc_trim()
+
+
+def device_id(device):
+    """
+    Device model and memory size, identifying comparable devices across runs
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        props = torch.cuda.get_device_properties(device)
+        return f"{props.name}:{props.total_memory >> 30}GiB"
+    total = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+
+    return f"{device.type}:{total >> 30}GiB"
+
+
+def available_memory(device):
+    """
+    Bytes that could still be allocated on device: free GPU memory plus what
+    PyTorch has cached, or available system RAM
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        free, _ = torch.cuda.mem_get_info(device)
+        cached = torch.cuda.memory_reserved(device) - torch.cuda.memory_allocated(
+            device
+        )
+        return free + cached
+
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+
+
+def memory_in_use(device):
+    """
+    Bytes allocated by PyTorch on a GPU, or the resident memory of the
+    process on the CPU
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        return torch.cuda.memory_allocated(device)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return peak_memory(device)
+
+
+def reset_peak_memory(device):
+    device = torch.device(device)
+    if device.type == "cuda":
+        torch.cuda.reset_peak_memory_stats(device)
+
+
+def peak_memory(device):
+    """
+    Peak bytes allocated since reset_peak_memory on a GPU. On the CPU, the
+    peak resident memory of the process so far, which cannot be reset: after
+    a larger peak it overestimates, erring on the safe side.
+    """
+    device = torch.device(device)
+    if device.type == "cuda":
+        return torch.cuda.max_memory_allocated(device)
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def memory_stats(device):
+    """
+    Memory in use and its peak (see memory_in_use and peak_memory), and on
+    a GPU the caching allocator's peak reservation, cudaMalloc retries and
+    out-of-memory errors, which are None on the CPU
+    """
+    device = torch.device(device)
+    stats = {
+        "mem_in_use": memory_in_use(device),
+        "peak_mem": peak_memory(device),
+        "peak_reserved": None,
+        "alloc_retries": None,
+        "num_ooms": None,
+    }
+    if device.type == "cuda":
+        cuda_stats = torch.cuda.memory_stats(device)
+        stats["peak_reserved"] = cuda_stats.get("reserved_bytes.all.peak", 0)
+        stats["alloc_retries"] = cuda_stats.get("num_alloc_retries", 0)
+        stats["num_ooms"] = cuda_stats.get("num_ooms", 0)
+
+    return stats
+
+
+class MemorySampler:
+    """
+    Peak resident memory of the process while in the context, above what it
+    was on entry, sampled every interval seconds by a background thread.
+    This gives a peak per section of code on the CPU, where the peak RSS of
+    the process (see peak_memory) cannot be reset. Spikes shorter than the
+    interval can be missed.
+    """
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.base = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, memory_in_use("cpu"))
+
+    def __enter__(self):
+        self.base = memory_in_use("cpu")
+        self.peak = self.base
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, memory_in_use("cpu"))
+
+    @property
+    def peak_delta(self):
+        return self.peak - self.base
@@ -0,0 +1,361 @@
+import json
+import math
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+from .utils import lazy_import
+
+h5py = lazy_import("h5py")
+
+STORE_DTYPES = ("float32", "float16", "bfloat16", "int8")
+PROJECTIONS = ("pca", "random")
+
+
+def encode_embeddings(embs, store_dtype="float32"):
+    """
+    Token embeddings (batch, positions, channels) as stored: as they are
+    (float32), float16, bfloat16 (as its raw 16 bits, since HDF5 has no
+    bfloat16 type) or int8 with one float32 scale per item and channel, taken
+    from the channel's absolute maximum over the item's positions. Returns
+    the stored array and the (batch, channels) scales, or None when there
+    are none.
+    """
+    if store_dtype == "float32":
+        return embs.numpy(force=True), None
+    if store_dtype == "float16":
+        return embs.to(torch.float16).numpy(force=True), None
+    if store_dtype == "bfloat16":
+        return embs.to(torch.bfloat16).view(torch.int16).numpy(force=True), None
+    if store_dtype == "int8":
+        embs = embs.float()
+        scales = embs.abs().amax(dim=1) / 127
+        scales = torch.where(scales > 0, scales, torch.ones_like(scales))
+        codes = torch.round(embs / scales[:, None, :]).clamp(-127, 127)
+        return codes.to(torch.int8).numpy(force=True), scales.numpy(force=True)
+
+    raise ValueError(
+        f"Unknown store dtype {store_dtype}, expected one of {STORE_DTYPES}"
+    )
+
+
+def write_embeddings(grp, name, embs, store_dtype="float32"):
+    """
+    Writes a chunk of token embeddings to grp[name], recording any encoding
+    other than the default as an attribute. int8 scales go to the sibling
+    dataset scale_{...}.
+    """
+    data, scales = encode_embeddings(embs, store_dtype)
+    dset = grp.create_dataset(name, data=data)
+    if store_dtype != "float32":
+        dset.attrs["encoding"] = store_dtype
+    if scales is not None:
+        grp.create_dataset(name.replace("emb_", "scale_", 1), data=scales)
+
+
+def read_embeddings(grp, name):
+    """
+    A chunk of stored token embeddings as a tensor in its stored dtype
+    (bfloat16 viewed back from its raw bits), along with its per-item
+    scales, or None if it is not int8. Chunks without a recorded encoding
+    are read as they are.
+    """
+    dset = grp[name]
+    encoding = dset.attrs.get("encoding", "float32")
+    codes = torch.from_numpy(dset[:])
+    if encoding == "bfloat16":
+        codes = codes.view(torch.bfloat16)
+
+    scales = None
+    if encoding == "int8":
+        scales = torch.from_numpy(grp[name.replace("emb_", "scale_", 1)][:])
+
+    return codes, scales
+
+
+class IncrementalPCA:
+    """
+    Leading principal components of a stream of vectors, updated one batch at
+    a time from the SVD of the current components (scaled by their singular
+    values) stacked with the centered batch and a mean correction row, as in
+    scikit-learn's IncrementalPCA
+    """
+
+    def __init__(self, num_components):
+        self.num_components = num_components
+        self.num_seen = 0
+        self.mean = None
+        self.components = None
+        self.singular_values = None
+
+    def partial_fit(self, x):
+        x = x.double()
+        num_new = x.shape[0]
+        batch_mean = x.mean(dim=0)
+        centered = x - batch_mean
+
+        if self.num_seen == 0:
+            stacked = centered
+            mean = batch_mean
+        else:
+            total = self.num_seen + num_new
+            correction = math.sqrt(self.num_seen * num_new / total) * (
+                self.mean - batch_mean
+            )
+            stacked = torch.cat(
+                [
+                    self.singular_values[:, None] * self.components,
+                    centered,
+                    correction[None],
+                ]
+            )
+            mean = (self.num_seen * self.mean + num_new * batch_mean) / total
+
+        _, s, vh = torch.linalg.svd(stacked, full_matrices=False)
+        self.components = vh[: self.num_components]
+        self.singular_values = s[: self.num_components]
+        self.mean = mean
+        self.num_seen += num_new
+
+
+class EmbeddingWriter:
+    """
+    Writes token embedding chunks to one store. With reduce_dim set, chunks
+    are stored projected to reduce_dim channels, either onto the principal
+    components of a sample of their token embeddings (pca) or by a random
+    Gaussian matrix (random). The PCA is fitted on up to fit_vectors token
+    embeddings from each of the first fit_chunks chunks, which are held in
+    memory until it is. The projection matrix (channels, reduce_dim) and the
+    mean subtracted before it are saved at the top level of the store as
+    projection and projection_mean; see load_projection and reconstruct.
+    close must be called before the store is.
+    """
+
+    def __init__(
+        self,
+        h5,
+        store_dtype="float32",
+        reduce_dim=None,
+        projection="pca",
+        fit_chunks=1,
+        fit_vectors=16384,
+        seed=0,
+    ):
+        if projection not in PROJECTIONS:
+            raise ValueError(
+                f"Unknown projection {projection}, expected one of {PROJECTIONS}"
+            )
+
+        self.h5 = h5
+        self.store_dtype = store_dtype
+        self.reduce_dim = reduce_dim
+        self.projection = projection
+        self.fit_chunks = fit_chunks
+        self.fit_vectors = fit_vectors
+        self.generator = torch.Generator().manual_seed(seed)
+
+        self.pca = IncrementalPCA(reduce_dim) if projection == "pca" else None
+        self.pending = []
+        self.matrix = None
+        self.mean = None
+
+    def _fit_chunk(self, embs):
+        if self.pca is None:
+            return
+        flat = embs.reshape(-1, embs.shape[-1])
+        sample = torch.randperm(flat.shape[0], generator=self.generator)
+        sample = sample[: self.fit_vectors].to(flat.device)
+        self.pca.partial_fit(flat[sample])
+
+    def _finish_fit(self, num_channels):
+        if self.pca is not None:
+            self.matrix = self.pca.components.T.float().cpu()
+            self.mean = self.pca.mean.float().cpu()
+        else:
+            self.matrix = torch.randn(
+                num_channels, self.reduce_dim, generator=self.generator
+            ) / math.sqrt(self.reduce_dim)
+            self.mean = torch.zeros(num_channels)
+
+        for grp, name, embs in self.pending:
+            write_embeddings(grp, name, self.project(embs), self.store_dtype)
+        self.pending = []
+
+    def project(self, embs):
+        embs = embs.float() - self.mean.to(embs.device)
+        return embs @ self.matrix.to(embs.device)
+
+    def write(self, grp, name, embs):
+        if self.reduce_dim is None:
+            write_embeddings(grp, name, embs, self.store_dtype)
+        elif self.matrix is not None:
+            write_embeddings(grp, name, self.project(embs), self.store_dtype)
+        else:
+            self.pending.append((grp, name, embs.cpu()))
+            self._fit_chunk(embs)
+            if len(self.pending) >= self.fit_chunks:
+                self._finish_fit(embs.shape[-1])
+
+    def close(self):
+        if self.reduce_dim is None:
+            return
+        if self.matrix is None:
+            if not self.pending:
+                return
+            self._finish_fit(self.pending[0][2].shape[-1])
+
+        self.h5.create_dataset("projection", data=self.matrix.numpy())
+        self.h5.create_dataset("projection_mean", data=self.mean.numpy())
+        self.h5["projection"].attrs["method"] = self.projection
+
+
+def load_projection(store_path):
+    """
+    Projection matrix and mean of a reduced store, or None if its embeddings
+    are full width
+    """
+    with h5py.File(store_path, "r") as h5:
+        if "projection" not in h5:
+            return None
+        return torch.from_numpy(h5["projection"][:]), torch.from_numpy(
+            h5["projection_mean"][:]
+        )
+
+
+def reconstruct(embs, projection):
+    """
+    Least-squares full-width approximation of reduced token embeddings
+    (batch, positions, reduce_dim), given the projection from
+    load_projection. This is close for PCA; random projections preserve
+    distances between embeddings rather than the embeddings themselves.
+    Probes can instead be trained on the reduced embeddings directly, with
+    their input channels set to reduce_dim.
+    """
+    matrix, mean = projection
+    inverse = torch.linalg.pinv(matrix).to(embs.device)
+    return embs @ inverse + mean.to(embs.device)
+
+
+def dequantize(codes, scales):
+    """
+    float32 embeddings of a chunk read by read_embeddings
+    """
+    embs = codes.float()
+    if scales is not None:
+        embs *= scales[:, None, :]
+
+    return embs
+
+
+def convert_store(
+    in_path, out_path, store_dtype, reduce_dim=None, projection="pca", **kwargs
+):
+    """
+    Re-encodes (and with reduce_dim, projects; see EmbeddingWriter) every
+    embedding chunk of a store, copying everything else, so an existing
+    float32 store can be compared against its quantized or reduced version
+    without re-running the model
+    """
+
+    def copy_group(src, dst, writer):
+        for key, item in src.items():
+            if isinstance(item, h5py.Group):
+                copy_group(item, dst.create_group(key), writer)
+            elif key.startswith("emb_"):
+                writer.write(dst, key, dequantize(*read_embeddings(src, key)))
+            elif key.startswith("scale_"):
+                continue
+            elif reduce_dim is None or not key.startswith("projection"):
+                src.copy(item, dst, name=key)
+
+    with h5py.File(in_path, "r") as src, h5py.File(out_path + ".tmp", "w") as dst:
+        writer = EmbeddingWriter(dst, store_dtype, reduce_dim, projection, **kwargs)
+        copy_group(src, dst, writer)
+        writer.close()
+
+    os.rename(out_path + ".tmp", out_path)
+
+
+def quantization_drift_report(
+    reference_h5, reference_metrics, quantized, out_path, max_chunks=None
+):
+    """
+    How much quantizing a store changes it and the probes trained on it.
+    quantized maps a store dtype to a (store path, metrics json) pair, where
+    the metrics come from evaluating a probe on the same split as
+    reference_metrics. Per dtype, the report gives the size and read time of
+    the store relative to the reference, the relative RMS error and mean
+    cosine similarity of its embeddings to the reference embeddings (over
+    the first max_chunks chunks of each group), and the difference of every
+    probe metric from the reference.
+    """
+
+    def read_time(path):
+        start = time.perf_counter()
+        with h5py.File(path, "r") as h5:
+            for grp in h5.values():
+                if isinstance(grp, h5py.Group):
+                    for key in grp:
+                        if key.startswith("emb_"):
+                            read_embeddings(grp, key)
+        return time.perf_counter() - start
+
+    with open(reference_metrics) as f:
+        ref_metrics = json.load(f)
+
+    ref_size = os.path.getsize(reference_h5)
+    ref_time = read_time(reference_h5)
+
+    report = {}
+    with h5py.File(reference_h5, "r") as ref_h5:
+        for store_dtype, (store_path, metrics_path) in quantized.items():
+            sq_err = 0.0
+            sq_norm = 0.0
+            cos_sum = 0.0
+            num_vectors = 0
+            with h5py.File(store_path, "r") as h5:
+                for grp_name, ref_grp in ref_h5.items():
+                    if not isinstance(ref_grp, h5py.Group):
+                        continue
+                    chunks = sorted(
+                        (k for k in ref_grp if k.startswith("emb_")),
+                        key=lambda k: int(k.split("_")[1]),
+                    )[:max_chunks]
+                    for key in chunks:
+                        ref = dequantize(*read_embeddings(ref_grp, key))
+                        embs = dequantize(*read_embeddings(h5[grp_name], key))
+
+                        sq_err += (embs - ref).square().sum().item()
+                        sq_norm += ref.square().sum().item()
+                        cos = torch.nn.functional.cosine_similarity(embs, ref, dim=2)
+                        cos_sum += cos.sum().item()
+                        num_vectors += cos.numel()
+
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+
+            report[store_dtype] = {
+                "size_ratio": os.path.getsize(store_path) / ref_size,
+                "read_time_ratio": read_time(store_path) / ref_time,
+                "relative_rmse": float(np.sqrt(sq_err / sq_norm)),
+                "mean_cosine": cos_sum / num_vectors,
+                "metric_drift": {
+                    k: metrics[k] - v
+                    for k, v in ref_metrics.items()
+                    if isinstance(v, (int, float)) and k in metrics
+                },
+            }
+
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=4)
+
+    return report
+
+
+if __name__ == "__main__":
+    reduce_dim = int(sys.argv[4]) if len(sys.argv) > 4 else None
+    projection = sys.argv[5] if len(sys.argv) > 5 else "pca"
+    convert_store(sys.argv[1], sys.argv[2], sys.argv[3], reduce_dim, projection)
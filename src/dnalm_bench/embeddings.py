@@ -1,16 +1,181 @@
+import os
 from abc import ABCMeta, abstractmethod
 
 import torch
 
+from .devices import resolve_device
+from .microbatch import MicroBatched
 from .utils import onehot_to_chars
 
 
-class EmbeddingExtractor(metaclass=ABCMeta):
+class _StopForward(Exception):
+    pass
+
+
+def _first(output):
+    if torch.is_tensor(output):
+        return output
+    return output[0]
+
+
+def find_layers(model):
+    """
+    The list of transformer or SSM blocks of a model, taken to be the longest
+    ModuleList in it
+    """
+    layers = None
+    for module in model.modules():
+        if isinstance(module, torch.nn.ModuleList):
+            if layers is None or len(module) > len(layers):
+                layers = module
+
+    return layers
+
+
+def find_lm_head(model):
+    """
+    The LM head of a masked or causal LM, i.e. its one child module besides
+    the backbone. LM heads act on each position independently.
+    """
+    heads = [module for module in model.children() if module is not model.base_model]
+    if len(heads) != 1:
+        raise ValueError(f"Cannot identify the LM head of {type(model).__name__}")
+
+    return heads[0]
+
+
+def layer_path(out_path, layer):
+    """
+    Output path for the embeddings of a layer; the final layer (-1) keeps
+    out_path itself
+    """
+    if layer == -1:
+        return out_path
+    root, ext = os.path.splitext(out_path)
+
+    return f"{root}_layer_{layer}{ext}"
+
+
+class HiddenStateCapture:
+    """
+    Records selected hidden states with forward hooks instead of
+    output_hidden_states=True, which keeps every layer's activations alive
+    and still runs the LM head. Layers are indexed like hidden_states: 0 is
+    the input to the first block, i the output of block i and -1 (or the
+    number of blocks) the output of model.base_model, which includes any
+    final normalization and so matches hidden_states[-1].
+
+    The forward pass is abandoned as soon as the deepest requested layer is
+    recorded, so the LM head never runs. With truncate=False the remaining
+    blocks of the backbone are still run. Blocks that work on unpadded
+    tokens (DNABERT-2) have their outputs scattered back to
+    (batch, length, dim) using the attention mask.
+    """
+
+    def __init__(self, model, layers=(-1,), truncate=True):
+        self.model = model
+        self.blocks = find_layers(model)
+        self.truncate = truncate
+
+        num_blocks = len(self.blocks)
+        self.layers = {}
+        for layer in layers:
+            index = layer + num_blocks + 1 if layer < 0 else layer
+            if not 0 <= index <= num_blocks:
+                raise ValueError(f"Layer {layer} out of range for {num_blocks} blocks")
+            self.layers[layer] = index
+
+        deepest = max(self.layers.values())
+        self.stop_at = deepest if truncate else num_blocks
+
+    def _hooks(self, captured):
+        indices = set(self.layers.values())
+        num_blocks = len(self.blocks)
+        handles = []
+
+        def record(index, hidden):
+            if index in indices:
+                captured[index] = hidden
+            if index == self.stop_at:
+                raise _StopForward
+
+        if 0 in indices:
+
+            def pre_hook(module, args, kwargs):
+                hidden = args[0] if args else kwargs["hidden_states"]
+                record(0, hidden)
+
+            handles.append(
+                self.blocks[0].register_forward_pre_hook(pre_hook, with_kwargs=True)
+            )
+
+        # The final layer is taken from the backbone output rather than the
+        # last block, so that it includes any final normalization
+        for i, block in enumerate(self.blocks[: min(self.stop_at, num_blocks - 1)]):
+            if i + 1 in indices:
+
+                def block_hook(module, args, output, index=i + 1):
+                    record(index, _first(output))
+
+                handles.append(block.register_forward_hook(block_hook))
+
+        def base_hook(module, args, output):
+            record(num_blocks, _first(output))
+
+        handles.append(self.model.base_model.register_forward_hook(base_hook))
+
+        return handles
+
+    def __call__(self, tokens, attention_mask=None, **kwargs):
+        """
+        Runs the model on tokens and returns {layer: hidden states} for the
+        requested layers
+        """
+        if attention_mask is not None:
+            kwargs["attention_mask"] = attention_mask
+
+        captured = {}
+        handles = self._hooks(captured)
+        try:
+            self.model(tokens, **kwargs)
+        except _StopForward:
+            pass
+        finally:
+            for handle in handles:
+                handle.remove()
+
+        if attention_mask is None:
+            attention_mask = torch.ones_like(tokens)
+        mask = attention_mask.bool()
+        outputs = {}
+        for layer, index in self.layers.items():
+            hidden = captured[index]
+            if hidden.dim() == 2:
+                padded = hidden.new_zeros(*mask.shape, hidden.shape[-1])
+                padded[mask] = hidden
+                hidden = padded
+            outputs[layer] = hidden
+
+        return outputs
+
+
+class EmbeddingExtractor(MicroBatched, metaclass=ABCMeta):
+    # Hidden state layers to extract, as indexed by HiddenStateCapture. Set
+    # several for a layer sweep; each gets its own file (see layer_path).
+    layers = (-1,)
+    # Encoding of stored embeddings, one of embedding_store.STORE_DTYPES.
+    # float16/bfloat16 halve and int8 quarters disk use and read bandwidth.
+    store_dtype = "float32"
+    # Channels to project stored embeddings down to (None keeps them full
+    # width), and how: "pca" or "random" (see embedding_store.EmbeddingWriter)
+    store_dim = None
+    store_projection = "pca"
+
     @abstractmethod
     def __init__(self, batch_size, num_workers, device):
         self.batch_size = batch_size
         self.num_workers = num_workers
-        self.device = device
+        self.device = resolve_device(device, num_workers)
 
     @abstractmethod
     def tokenize(self, seqs):
@@ -29,9 +194,9 @@ class HFEmbeddingExtractor(EmbeddingExtractor, metaclass=ABCMeta):
     def __init__(self, tokenizer, model, batch_size, num_workers, device):
         self.tokenizer = tokenizer
         self.model = model
-        self.model.to(device)
         model.eval()
         super().__init__(batch_size, num_workers, device)
+        self.model.to(self.device)
 
     def tokenize(self, seqs):
         seqs_str = onehot_to_chars(seqs)
@@ -44,13 +209,13 @@ class HFEmbeddingExtractor(EmbeddingExtractor, metaclass=ABCMeta):
         return tokens, offsets
 
     def model_fwd(self, tokens):
+        """
+        {layer: token embeddings} for the layers in self.layers
+        """
         tokens = tokens.to(device=self.device)
-        with torch.no_grad():
-            torch_outs = self.model(tokens, output_hidden_states=True)
-            if torch.is_tensor(torch_outs.hidden_states):
-                embs = torch_outs.hidden_states
-            else:
-                embs = torch_outs.hidden_states[-1]
+        capture = HiddenStateCapture(self.model, self.layers)
+        with torch.inference_mode():
+            embs = capture(tokens)
         return embs
 
     def detokenize(self, seqs, token_embeddings, offsets):
@@ -75,4 +240,4 @@ class SequenceBaselineEmbeddingExtractor(EmbeddingExtractor, metaclass=ABCMeta):
         return seqs, None
 
     def model_fwd(self, seqs):
-        return seqs
+        return {-1: seqs}
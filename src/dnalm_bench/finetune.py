@@ -1,10 +1,11 @@
 from functools import partial
 
-import minlora
 import torch
 import torch.nn as nn
 
-from .utils import onehot_to_chars
+from .utils import lazy_import, onehot_to_chars
+
+minlora = lazy_import("minlora")
 
 
 class LoRAModule(nn.Module):
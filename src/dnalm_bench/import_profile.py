@@ -0,0 +1,119 @@
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+LIBRARY_MODULES = [
+    "dnalm_bench.benchmark_history",
+    "dnalm_bench.benchmarks",
+    "dnalm_bench.bootstrap",
+    "dnalm_bench.collate",
+    "dnalm_bench.devices",
+    "dnalm_bench.embedding_store",
+    "dnalm_bench.embeddings",
+    "dnalm_bench.finetune",
+    "dnalm_bench.microbatch",
+    "dnalm_bench.models",
+    "dnalm_bench.native_tokenizers",
+    "dnalm_bench.results",
+    "dnalm_bench.score_writer",
+    "dnalm_bench.synthetic",
+    "dnalm_bench.utils",
+    "dnalm_bench.variant_cache",
+    "dnalm_bench.task_1_paired_control.components",
+    "dnalm_bench.task_1_paired_control.finetune",
+    "dnalm_bench.task_1_paired_control.supervised.embeddings",
+    "dnalm_bench.task_1_paired_control.supervised.training",
+    "dnalm_bench.task_1_paired_control.zero_shot.evaluators",
+    "dnalm_bench.task_2_5_single.components",
+    "dnalm_bench.task_2_5_single.embeddings",
+    "dnalm_bench.task_2_5_single.evaluators",
+    "dnalm_bench.task_2_5_single.finetune",
+    "dnalm_bench.task_2_5_single.profile",
+    "dnalm_bench.task_2_5_single.training",
+    "dnalm_bench.task_2_5_single.zero_shot",
+]
+
+# Runs in a fresh interpreter, like a spawned DataLoader worker unpickling a dataset
+_CHILD = """
+import importlib, json, resource, sys, time
+
+def rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+rss_start = rss()
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+import_time = time.perf_counter() - start
+heavy = ["h5py", "ncls", "pandas", "scipy", "sklearn", "tensorflow", "transformers"]
+print(json.dumps({
+    "import_time": import_time,
+    "rss": rss() - rss_start,
+    "loaded": [m for m in heavy if m in sys.modules],
+}))
+"""
+
+
+def _profile_once(module):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD, module], capture_output=True, text=True
+    )
+    wall_time = time.perf_counter() - start
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1]}
+
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["wall_time"] = wall_time
+
+    return result
+
+
+def profile_import_time(modules, out_path, num_repeats=5, progress_bar=True):
+    """
+    Cold import cost of each module, measured in fresh interpreters. Records
+    the median import time, process wall time (interpreter start-up plus
+    import, i.e. the cost of a spawn-mode worker) and resident memory added
+    by the import, along with which heavy third-party packages got loaded.
+    """
+    results = {}
+    for module in modules:
+        runs = [_profile_once(module) for _ in range(num_repeats)]
+        errors = [run["error"] for run in runs if "error" in run]
+        if errors:
+            results[module] = {"error": errors[0]}
+        else:
+            results[module] = {
+                "import_time": float(np.median([run["import_time"] for run in runs])),
+                "wall_time": float(np.median([run["wall_time"] for run in runs])),
+                "rss": int(np.median([run["rss"] for run in runs])),
+                "loaded": runs[-1]["loaded"],
+            }
+
+        if progress_bar:
+            r = results[module]
+            if "error" in r:
+                print(f"{module:<60} {r['error']}")
+            else:
+                print(
+                    f"{module:<60} {r['import_time']:7.3f}s {r['wall_time']:7.3f}s "
+                    f"{r['rss'] / 2**20:8.1f} MiB  {','.join(r['loaded'])}"
+                )
+
+    with open(out_path, "w") as f:
+        json.dump(results, f, indent=4)
+
+    return results
+
+
+if __name__ == "__main__":
+    out_path = sys.argv[1] if len(sys.argv) > 1 else "import_time.json"
+    modules = sys.argv[2:] or LIBRARY_MODULES
+    profile_import_time(modules, out_path)
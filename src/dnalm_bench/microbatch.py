@@ -0,0 +1,412 @@
+import functools
+import json
+import os
+import warnings
+
+import numpy as np
+import torch
+
+from .devices import (
+    available_memory,
+    device_id,
+    empty_cache,
+    memory_in_use,
+    peak_memory,
+    reset_peak_memory,
+)
+
+MODES = ("inference", "train")
+
+
+def default_cache_path():
+    cache_dir = os.environ.get(
+        "DART_CACHE_DIR", os.path.expanduser("~/.cache/dnalm_bench")
+    )
+    return os.path.join(cache_dir, "micro_batch_sizes.json")
+
+
+def is_oom(exc):
+    """
+    Whether an exception is a CUDA or CPU allocator out-of-memory error
+    """
+    if isinstance(exc, torch.cuda.OutOfMemoryError):
+        return True
+    message = str(exc)
+    return isinstance(exc, RuntimeError) and (
+        "out of memory" in message or "can't allocate memory" in message
+    )
+
+
+def model_id(model):
+    """
+    Identifies a model across runs by its class, the name or path of any
+    pretrained model inside it and its parameter count
+    """
+    name = None
+    for module in model.modules():
+        name = getattr(module, "name_or_path", None)
+        if name:
+            break
+    num_params = sum(p.numel() for p in model.parameters())
+
+    return f"{type(model).__name__}:{name}:{num_params}"
+
+
+def _batch_size(args):
+    for arg in args:
+        if torch.is_tensor(arg) or isinstance(arg, np.ndarray):
+            return arg.shape[0]
+    raise ValueError("No batched tensor among the arguments")
+
+
+def _length(args):
+    for arg in args:
+        if torch.is_tensor(arg) or isinstance(arg, np.ndarray):
+            return arg.shape[1] if arg.ndim > 1 else None
+
+
+def _slice(args, batch_size, start, end):
+    return tuple(
+        (
+            arg[start:end]
+            if (torch.is_tensor(arg) or isinstance(arg, np.ndarray))
+            and arg.ndim > 0
+            and arg.shape[0] == batch_size
+            else arg
+        )
+        for arg in args
+    )
+
+
+def _tile(args, batch_size, n):
+    # Trial inputs of n items, cycling through the items of a real batch
+    rows = np.arange(n) % batch_size
+    return tuple(
+        (
+            arg[torch.from_numpy(rows) if torch.is_tensor(arg) else rows]
+            if (torch.is_tensor(arg) or isinstance(arg, np.ndarray))
+            and arg.ndim > 0
+            and arg.shape[0] == batch_size
+            else arg
+        )
+        for arg in args
+    )
+
+
+def _concat(outputs):
+    first = outputs[0]
+    if first is None:
+        return None
+    if torch.is_tensor(first):
+        return torch.cat(outputs)
+    if isinstance(first, np.ndarray):
+        return np.concatenate(outputs)
+    if isinstance(first, dict):
+        return {k: _concat([out[k] for out in outputs]) for k in first}
+    if isinstance(first, (tuple, list)):
+        return type(first)(_concat(list(outs)) for outs in zip(*outputs))
+
+    raise TypeError(f"Cannot concatenate micro-batch outputs of type {type(first)}")
+
+
+class MicroBatchCache:
+    """
+    Micro-batch sizes on disk, as JSON keyed by model, input length,
+    precision, device and mode. Each entry records the size and whether it is
+    a limit (something larger did not fit) or only the largest size tried.
+    """
+
+    def __init__(self, path=None):
+        self.path = default_cache_path() if path is None else path
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def get(self, key):
+        return self._load().get(key)
+
+    def put(self, key, size, limit):
+        entries = self._load()
+        entries[key] = {"size": size, "limit": limit}
+
+        dirname = os.path.dirname(self.path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f, indent=4, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class MicroBatcher:
+    """
+    Runs per-batch model calls on micro-batches, so that the logical batch
+    size no longer has to fit in memory. Sizes are kept per input length
+    (the second dimension of the first batched argument) and start from:
+
+    - size=None: whole batches
+    - an int: at most that many items
+    - "auto": the largest size found to fit by trial runs on copies of the
+      first batch of each length (see search), bounded by the batch size
+
+    A micro-batch that runs out of memory is retried at half the size, which
+    is kept for later batches. With a cache (and a model to identify), sizes
+    found by search or by running out of memory are stored per model, input
+    length, precision, device and mode, and used as the starting size of
+    later runs.
+    """
+
+    def __init__(
+        self,
+        device,
+        size=None,
+        model=None,
+        mode="inference",
+        precision=None,
+        cache=None,
+        memory_fraction=0.9,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode {mode}, expected one of {MODES}")
+
+        self.device = device
+        self.size = size
+        self.mode = mode
+        self.cache = cache if model is not None else None
+        self.memory_fraction = memory_fraction
+
+        self.model_id = None
+        self.params = []
+        if model is not None:
+            self.model_id = model_id(model)
+            params = list(model.parameters())
+            if precision is None and params:
+                precision = str(params[0].dtype).removeprefix("torch.")
+            if mode == "train":
+                self.params = [p for p in params if p.requires_grad]
+        self.precision = precision or "float32"
+
+        self.sizes = {}
+        self.limits = {}
+
+    def key(self, length):
+        return "|".join(
+            [
+                self.model_id,
+                str(length),
+                self.precision,
+                device_id(self.device),
+                self.mode,
+            ]
+        )
+
+    def _store(self, length, size, limit):
+        self.sizes[length] = size
+        self.limits[length] = limit
+        if self.cache is not None:
+            self.cache.put(self.key(length), size, limit)
+
+    def _size(self, trial, args, batch_size):
+        length = _length(args)
+        if length not in self.sizes:
+            entry = None
+            if self.cache is not None:
+                entry = self.cache.get(self.key(length))
+            if entry is not None:
+                self.sizes[length] = entry["size"]
+                self.limits[length] = entry["limit"]
+            else:
+                self.sizes[length] = None
+                self.limits[length] = False
+
+        size = self.sizes[length]
+        if self.size == "auto" and not self.limits[length]:
+            if size is None or size < batch_size:
+                found, limit = self.search(trial, args, batch_size)
+                self._store(length, found, limit)
+                size = found
+        elif isinstance(self.size, int):
+            size = self.size if size is None else min(size, self.size)
+
+        return batch_size if size is None else min(size, batch_size)
+
+    def _shrink(self, args, size):
+        empty_cache(self.device)
+        new_size = max(size // 2, 1)
+        warnings.warn(
+            f"Micro-batch of {size} does not fit in memory, retrying with {new_size}"
+        )
+        self._store(_length(args), new_size, True)
+
+        return new_size
+
+    def _run_trial(self, fn, args):
+        if self.mode == "train":
+            fn(*args).backward()
+        else:
+            with torch.no_grad():
+                fn(*args)
+
+    def _grads(self):
+        return [None if p.grad is None else p.grad.clone() for p in self.params]
+
+    def _restore_grads(self, grads):
+        for p, grad in zip(self.params, grads):
+            p.grad = grad
+
+    def search(self, fn, args, batch_size, max_steps=3):
+        """
+        Largest micro-batch (up to batch_size) that fn runs on without running
+        out of memory, found by doubling from 1 and then bisecting for at most
+        max_steps steps. A size is also ruled out without running it if the
+        peak memory of the previous trial, scaled up, would exceed
+        memory_fraction of the memory available at the start (how RAM limits
+        apply on CPU, where allocation rarely fails cleanly). Returns the size
+        and whether it is a limit rather than batch_size.
+        """
+        budget = self.memory_fraction * available_memory(self.device)
+        grads = self._grads()
+        per_item = None
+
+        def fits(n):
+            nonlocal per_item
+            if per_item is not None and per_item * n > budget:
+                return False
+
+            base = memory_in_use(self.device)
+            reset_peak_memory(self.device)
+            failed = False
+            try:
+                self._run_trial(fn, _tile(args, batch_size, n))
+            except RuntimeError as e:
+                if not is_oom(e):
+                    raise
+                failed = True
+            if failed:
+                empty_cache(self.device)
+                return False
+
+            per_item = max(peak_memory(self.device) - base, 0) / n
+            return True
+
+        try:
+            good, bad = 0, None
+            n = 1
+            while n <= batch_size:
+                if not fits(n):
+                    bad = n
+                    break
+                good = n
+                if n == batch_size:
+                    break
+                n = min(n * 2, batch_size)
+
+            if good == 0:
+                return 1, True
+            if bad is None:
+                return good, False
+
+            for _ in range(max_steps):
+                if bad - good <= 1:
+                    break
+                mid = (good + bad) // 2
+                if fits(mid):
+                    good = mid
+                else:
+                    bad = mid
+        finally:
+            self._restore_grads(grads)
+
+        return good, True
+
+    def map(self, fn, *args):
+        """
+        fn(*args) computed over micro-batches of the batched arguments (those
+        whose first dimension is the batch size; the rest are passed as they
+        are), with the outputs (tensors, arrays, or tuples or dicts of them)
+        concatenated
+        """
+        batch_size = _batch_size(args)
+        size = self._size(fn, args, batch_size)
+        if size >= batch_size:
+            try:
+                return fn(*args)
+            except RuntimeError as e:
+                if not is_oom(e) or batch_size == 1:
+                    raise
+            size = self._shrink(args, batch_size)
+
+        outputs = []
+        start = 0
+        while start < batch_size:
+            end = min(start + size, batch_size)
+            try:
+                outputs.append(fn(*_slice(args, batch_size, start, end)))
+                start = end
+                continue
+            except RuntimeError as e:
+                if not is_oom(e) or size == 1:
+                    raise
+            size = self._shrink(args, size)
+
+        return _concat(outputs)
+
+    def backward(self, loss_fn, *args):
+        """
+        Backpropagates the mean loss of a batch micro-batch by micro-batch,
+        where loss_fn returns the mean loss of the items it is given: each
+        micro-batch's loss is weighted by its share of the batch, so the
+        accumulated gradients are those of the whole batch. If a micro-batch
+        runs out of memory, the gradients are reset to what they were before
+        the batch and it is redone with smaller micro-batches. Returns the
+        (detached) loss of the batch.
+
+        Being able to retry takes a copy of the existing gradients, which is
+        free when they are None (after zero_grad()) but costs a model's worth
+        of gradient memory when they are being accumulated across batches. No
+        copy is taken at a micro-batch size of 1, which is never retried.
+        """
+        batch_size = _batch_size(args)
+        size = self._size(loss_fn, args, batch_size)
+        grads = self._grads() if size > 1 else None
+
+        while True:
+            total = 0.0
+            try:
+                for start in range(0, batch_size, size):
+                    end = min(start + size, batch_size)
+                    loss = loss_fn(*_slice(args, batch_size, start, end))
+                    if end - start < batch_size:
+                        loss = loss * ((end - start) / batch_size)
+                    loss.backward()
+                    total += loss.detach()
+                return total
+            except RuntimeError as e:
+                if not is_oom(e) or size == 1:
+                    raise
+            self._restore_grads(grads)
+            size = self._shrink(args, size)
+
+
+class MicroBatched:
+    """
+    Gives evaluators and extractors (which have a device and usually a model)
+    a micro_batcher for their per-batch model calls, with sizes cached in the
+    default MicroBatchCache. Set micro_batch_size to an int or "auto" to split
+    batches up front; see MicroBatcher.
+    """
+
+    micro_batch_size = None
+
+    @functools.cached_property
+    def micro_batcher(self):
+        return MicroBatcher(
+            self.device,
+            self.micro_batch_size,
+            getattr(self, "model", None),
+            cache=MicroBatchCache(),
+        )
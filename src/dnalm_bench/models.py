@@ -0,0 +1,234 @@
+import contextlib
+import importlib
+import os
+from collections import OrderedDict
+
+from .native_tokenizers import CharTokenizer, KmerTokenizer
+from .utils import NoModule, lazy_import
+
+transformers = lazy_import("transformers")
+dynamic_module_utils = lazy_import("transformers.dynamic_module_utils")
+
+HEADS = {
+    "base": "AutoModel",
+    "masked_lm": "AutoModelForMaskedLM",
+    "causal_lm": "AutoModelForCausalLM",
+    "sequence_classification": "AutoModelForSequenceClassification",
+}
+
+
+class ModelFamily:
+    """
+    How to load the tokenizer and models of one DNALM family from the Hub.
+    head_classes maps a head type to a class name in the family's remote code,
+    for heads that are not exposed through the transformers Auto classes.
+    native_tokenizer builds a vectorized equivalent of the tokenizer that
+    works on one-hot batches, for fixed-vocabulary tokenizers.
+    """
+
+    def __init__(
+        self,
+        org,
+        padding_side=None,
+        bert_config=False,
+        disabled_modules=(),
+        head_classes=None,
+        native_tokenizer=None,
+    ):
+        self.org = org
+        self.padding_side = padding_side
+        self.bert_config = bert_config
+        self.disabled_modules = disabled_modules
+        self.head_classes = head_classes or {}
+        self.native_tokenizer = native_tokenizer
+
+    def repo(self, model_name):
+        return f"{self.org}/{model_name}"
+
+    @staticmethod
+    def head_class(head):
+        return getattr(transformers, HEADS[head])
+
+    def _context(self):
+        # Import transformers before hiding modules so that its optional
+        # dependency checks are not cached as missing for other families
+        importlib.import_module("transformers")
+        stack = contextlib.ExitStack()
+        for module in self.disabled_modules:
+            stack.enter_context(NoModule(module))
+        return stack
+
+    def load_tokenizer(self, model_name):
+        kwargs = {}
+        if self.padding_side is not None:
+            kwargs["padding_side"] = self.padding_side
+        with self._context():
+            return transformers.AutoTokenizer.from_pretrained(
+                self.repo(model_name), trust_remote_code=True, **kwargs
+            )
+
+    def load_model(self, model_name, head, pretrained=True, **config_kwargs):
+        repo = self.repo(model_name)
+        with self._context():
+            if not pretrained:
+                config = transformers.AutoConfig.from_pretrained(
+                    repo, trust_remote_code=True, **config_kwargs
+                )
+                return self.head_class(head).from_config(config, trust_remote_code=True)
+
+            if head in self.head_classes:
+                config = transformers.AutoConfig.from_pretrained(
+                    repo, trust_remote_code=True
+                )
+                base_cls = dynamic_module_utils.get_class_from_dynamic_module(
+                    config.auto_map["AutoModel"], repo
+                )
+                cls = getattr(
+                    importlib.import_module(base_cls.__module__),
+                    self.head_classes[head],
+                )
+                return cls.from_pretrained(repo, **config_kwargs)
+
+            if self.bert_config:
+                config = transformers.BertConfig.from_pretrained(
+                    repo, trust_remote_code=True, **config_kwargs
+                )
+                return self.head_class(head).from_pretrained(
+                    repo, config=config, trust_remote_code=True
+                )
+
+            return self.head_class(head).from_pretrained(
+                repo, trust_remote_code=True, **config_kwargs
+            )
+
+
+MODEL_FAMILIES = {
+    "dnabert2": ModelFamily(
+        "zhihan1996", bert_config=True, disabled_modules=("triton",)
+    ),
+    "gena_lm": ModelFamily(
+        "AIRI-Institute",
+        head_classes={"sequence_classification": "BertForSequenceClassification"},
+    ),
+    "hyenadna": ModelFamily(
+        "LongSafari", padding_side="right", native_tokenizer=CharTokenizer
+    ),
+    "mistral_dna": ModelFamily("RaphaelMourad"),
+    "nucleotide_transformer": ModelFamily(
+        "InstaDeepAI", native_tokenizer=KmerTokenizer
+    ),
+    "caduceus": ModelFamily(
+        "kuleshov-group", padding_side="right", native_tokenizer=CharTokenizer
+    ),
+}
+
+
+def model_nbytes(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelPool:
+    """
+    Process-wide cache of loaded DNALMs keyed by (family, model name, head),
+    so evaluators and extractors run back-to-back share one copy of the
+    weights. A request for the bare backbone ("base") is served from a cached
+    LM-head model of the same checkpoint when there is one. Least recently
+    used models are dropped from the pool once the total parameter and buffer
+    size exceeds memory_budget bytes (None for no limit); callers still
+    holding a reference keep theirs alive.
+
+    Pooled models are shared objects, so anything that changes their weights
+    or modules (fine-tuning, LoRA wrapping) must load with shared=False.
+    """
+
+    def __init__(self, memory_budget=None):
+        self.memory_budget = memory_budget
+        self.models = OrderedDict()
+        self.tokenizers = {}
+
+    def tokenizer(self, family, model_name):
+        key = (family, model_name)
+        if key not in self.tokenizers:
+            self.tokenizers[key] = MODEL_FAMILIES[family].load_tokenizer(model_name)
+
+        return self.tokenizers[key]
+
+    def _shared_backbone(self, family, model_name):
+        for head in ["masked_lm", "causal_lm"]:
+            key = (family, model_name, head)
+            if key in self.models:
+                self.models.move_to_end(key)
+                model = self.models[key][0]
+                if model.base_model is not model:
+                    return model.base_model
+
+        return None
+
+    def model(self, family, model_name, head):
+        key = (family, model_name, head)
+        if key in self.models:
+            self.models.move_to_end(key)
+            return self.models[key][0]
+
+        if head == "base":
+            backbone = self._shared_backbone(family, model_name)
+            if backbone is not None:
+                return backbone
+
+        model = MODEL_FAMILIES[family].load_model(model_name, head)
+        self.models[key] = (model, model_nbytes(model))
+        self._evict()
+
+        return model
+
+    def _evict(self):
+        if self.memory_budget is None:
+            return
+        while len(self.models) > 1 and self.nbytes > self.memory_budget:
+            self.models.popitem(last=False)
+
+    @property
+    def nbytes(self):
+        return sum(nbytes for _, nbytes in self.models.values())
+
+    def clear(self):
+        self.models.clear()
+        self.tokenizers.clear()
+
+
+_budget = os.environ.get("DART_MODEL_POOL_BYTES")
+model_pool = ModelPool(int(_budget) if _budget else None)
+
+
+def load_pretrained(
+    family, model_name, head, shared=True, pretrained=True, **config_kwargs
+):
+    """
+    Tokenizer and model for a registered DNALM family. Frozen pretrained
+    models come from the process-wide pool; shared=False, randomly initialized
+    models (pretrained=False) and models with config overrides such as
+    num_labels are loaded fresh.
+    """
+    tokenizer = model_pool.tokenizer(family, model_name)
+    if shared and pretrained and not config_kwargs:
+        model = model_pool.model(family, model_name, head)
+    else:
+        model = MODEL_FAMILIES[family].load_model(
+            model_name, head, pretrained=pretrained, **config_kwargs
+        )
+
+    return tokenizer, model
+
+
+def load_native_tokenizer(family, model_name):
+    """
+    Vectorized tokenizer mapping one-hot batches straight to the input ids of
+    a family's HF tokenizer, or None for families without one
+    """
+    native_tokenizer = MODEL_FAMILIES[family].native_tokenizer
+    if native_tokenizer is None:
+        return None
+
+    return native_tokenizer(model_pool.tokenizer(family, model_name))
@@ -0,0 +1,355 @@
+import contextlib
+import os
+from abc import ABCMeta, abstractmethod
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader
+from tqdm import tqdm
+
+from .embedding_store import EmbeddingWriter
+from .embeddings import (
+    HFEmbeddingExtractor,
+    HiddenStateCapture,
+    find_lm_head,
+    layer_path,
+)
+from .models import load_native_tokenizer, load_pretrained
+from .utils import lazy_import, onehot_to_chars
+
+h5py = lazy_import("h5py")
+
+
+class MultiOutputExtractor(HFEmbeddingExtractor, metaclass=ABCMeta):
+    """
+    Runs the model once per batch and writes what the zero-shot, probing and
+    embedding scoring pipelines would otherwise each recompute into a single
+    HDF5 store. Every input group (seq/ctrl, allele1/allele2, ...) holds:
+
+    emb_{start}_{end}, idx_var or idx_fix: last-layer token embeddings, laid
+        out (and encoded or reduced, see store_dtype and store_dim) as by the
+        embedding extractors so the probing datasets read them
+    pooled: token embeddings averaged over positions, as in
+        VariantEmbeddingEvaluator.embed
+    lls_{start}_{end}, likelihood: per-token log-likelihoods of the observed
+        tokens and their sum over the sequence tokens (causal models only)
+
+    A trailing per-item index in the batch (as returned by
+    PairedControlDataset) is stored at the top level as idx.
+
+    The store holds the last layer's outputs. Each other layer in layers gets
+    a store of its own (see layer_path) with its embeddings and pooled
+    embeddings, laid out the same way.
+    """
+
+    _idx_mode = "variable"
+    _causal = False
+    _use_attention_mask = True
+    # Vectorized tokenizer used instead of the HF one where available
+    native_tokenizer = None
+
+    @property
+    @abstractmethod
+    def start_token(self):
+        pass
+
+    @property
+    @abstractmethod
+    def end_token(self):
+        pass
+
+    @staticmethod
+    def _offsets_to_indices(offsets, seqs):
+        gather_idx = np.zeros((seqs.shape[0], seqs.shape[1]), dtype=np.uint32)
+        for i, offset in enumerate(offsets):
+            for j, (start, end) in enumerate(offset):
+                gather_idx[i, start:end] = j
+
+        return gather_idx
+
+    def tokenize(self, seqs):
+        if self.native_tokenizer is not None:
+            tokens = self.native_tokenizer(seqs)
+            offsets = None
+            attention_mask = torch.ones_like(tokens)
+        else:
+            seqs_str = onehot_to_chars(seqs)
+            encoded = self.tokenizer(
+                seqs_str,
+                return_tensors="pt",
+                padding=True,
+                return_offsets_mapping=(self._idx_mode == "variable"),
+            )
+            tokens = encoded["input_ids"]
+            offsets = encoded.get("offset_mapping")
+            attention_mask = encoded.get("attention_mask")
+        if self.start_token is not None:
+            starts = torch.where(tokens == self.start_token)[1] + 1
+        else:
+            starts = torch.zeros(tokens.shape[0], dtype=torch.long)
+        if self.end_token is not None:
+            ends = torch.where(tokens == self.end_token)[1]
+        else:
+            ends = attention_mask.sum(dim=1)
+
+        return tokens, offsets, starts, ends, attention_mask
+
+    @property
+    def store_layers(self):
+        # The last layer first, as it goes into the main store
+        return tuple(dict.fromkeys((-1, *self.layers)))
+
+    def model_fwd(self, tokens, attention_mask):
+        """
+        {layer: token embeddings} for store_layers, and for causal models the
+        per-token log-likelihoods, which take the LM head applied once to the
+        last layer
+        """
+        tokens = tokens.to(device=self.device)
+        if not self._use_attention_mask:
+            attention_mask = None
+        elif attention_mask is not None:
+            attention_mask = attention_mask.to(device=self.device)
+
+        capture = HiddenStateCapture(self.model, self.store_layers)
+        with torch.inference_mode():
+            embs = capture(tokens, attention_mask=attention_mask)
+
+            lls = None
+            if self._causal:
+                logits = find_lm_head(self.model)(embs[-1]).swapaxes(1, 2)
+                lls = torch.zeros(tokens.shape[:2], device=self.device)
+                lls[:, 1:] = -F.cross_entropy(
+                    logits[:, :, :-1], tokens[:, 1:], reduction="none"
+                )
+
+        return embs, lls
+
+    def _write_batch(self, writers, grps, seqs, start, end, num_items):
+        tokens, offsets, starts, ends, attention_mask = self.tokenize(seqs)
+        token_embs, lls = self.micro_batcher.map(self.model_fwd, tokens, attention_mask)
+
+        if self._idx_mode == "variable" or start == 0:
+            indices = self._offsets_to_indices(offsets, seqs)
+
+        for layer in self.store_layers:
+            grp = grps[layer]
+            if self._idx_mode == "variable":
+                indices_dset = grp.require_dataset(
+                    "idx_var", (num_items, indices.shape[1]), dtype=np.uint32
+                )
+                indices_dset[start:end] = indices
+            elif start == 0:
+                grp.create_dataset("idx_fix", data=indices, dtype=np.uint32)
+
+            writers[layer].write(grp, f"emb_{start}_{end}", token_embs[layer])
+
+            pooled = token_embs[layer].mean(dim=1).numpy(force=True)
+            pooled_dset = grp.require_dataset(
+                "pooled", (num_items, pooled.shape[1]), dtype=pooled.dtype
+            )
+            pooled_dset[start:end] = pooled
+
+        if lls is not None:
+            grp = grps[-1]
+            positions = torch.arange(lls.shape[1], device=self.device)
+            clip_mask = (positions[None, :] >= starts[:, None].to(self.device)) & (
+                positions[None, :] < ends[:, None].to(self.device)
+            )
+            grp.create_dataset(f"lls_{start}_{end}", data=lls.numpy(force=True))
+            likelihood_dset = grp.require_dataset(
+                "likelihood", (num_items,), dtype=np.float32
+            )
+            likelihood_dset[start:end] = (lls * clip_mask).sum(1).numpy(force=True)
+
+    def extract(self, dataset, out_path, groups=("seq",), progress_bar=False):
+        """
+        Writes the stores for a dataset whose items are one one-hot sequence
+        per name in groups, optionally followed by an item index.
+        """
+        dataloader = DataLoader(
+            dataset,
+            batch_size=self.batch_size,
+            shuffle=False,
+            num_workers=self.num_workers,
+        )
+
+        with contextlib.ExitStack() as stack:
+            out_fs = {}
+            writers = {}
+            for layer in self.store_layers:
+                out_fs[layer] = stack.enter_context(
+                    h5py.File(layer_path(out_path, layer) + ".tmp", "w")
+                )
+                writers[layer] = EmbeddingWriter(
+                    out_fs[layer],
+                    self.store_dtype,
+                    self.store_dim,
+                    self.store_projection,
+                )
+            grps = [
+                {layer: out_f.create_group(name) for layer, out_f in out_fs.items()}
+                for name in groups
+            ]
+
+            start = 0
+            for batch in tqdm(dataloader, disable=(not progress_bar)):
+                if torch.is_tensor(batch):
+                    batch = (batch,)
+                end = start + len(batch[0])
+
+                for layer_grps, seqs in zip(grps, batch):
+                    self._write_batch(
+                        writers, layer_grps, seqs, start, end, len(dataset)
+                    )
+
+                if len(batch) > len(groups):
+                    for out_f in out_fs.values():
+                        idx_dset = out_f.require_dataset(
+                            "idx", (len(dataset),), dtype=np.int64
+                        )
+                        idx_dset[start:end] = batch[len(groups)].numpy()
+
+                start = end
+
+            for writer in writers.values():
+                writer.close()
+
+        for layer in self.store_layers:
+            os.rename(layer_path(out_path, layer) + ".tmp", layer_path(out_path, layer))
+
+
+def read_store(store_path, group, name):
+    """
+    A per-item output (pooled, likelihood) of one group of a multi-output
+    store, or the top-level item index when group is None
+    """
+    with h5py.File(store_path, "r") as h5:
+        if group is None:
+            return h5[name][:]
+        return h5[group][name][:]
+
+
+class DNABERT2MultiOutputExtractor(MultiOutputExtractor):
+    def __init__(self, model_name, batch_size, num_workers, device):
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
+        super().__init__(tokenizer, model, batch_size, num_workers, device)
+
+    @property
+    def start_token(self):
+        return 1
+
+    @property
+    def end_token(self):
+        return 2
+
+
+class GenaLMMultiOutputExtractor(MultiOutputExtractor):
+    def __init__(self, model_name, batch_size, num_workers, device):
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
+        super().__init__(tokenizer, model, batch_size, num_workers, device)
+
+    @property
+    def start_token(self):
+        return 1
+
+    @property
+    def end_token(self):
+        return 2
+
+
+class HyenaDNAMultiOutputExtractor(MultiOutputExtractor):
+    _idx_mode = "fixed"
+    _causal = True
+    _use_attention_mask = False
+
+    def __init__(self, model_name, batch_size, num_workers, device):
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
+        super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
+
+    @property
+    def start_token(self):
+        return None
+
+    @property
+    def end_token(self):
+        return 1
+
+    @staticmethod
+    def _offsets_to_indices(offsets, seqs):
+        slice_idx = [0, seqs.shape[1]]
+
+        return np.array(slice_idx)
+
+
+class MistralDNAMultiOutputExtractor(MultiOutputExtractor):
+    _causal = True
+
+    def __init__(self, model_name, batch_size, num_workers, device):
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
+        super().__init__(tokenizer, model, batch_size, num_workers, device)
+
+    @property
+    def start_token(self):
+        return 1
+
+    @property
+    def end_token(self):
+        return 2
+
+
+class NucleotideTransformerMultiOutputExtractor(MultiOutputExtractor):
+    _idx_mode = "fixed"
+
+    def __init__(self, model_name, batch_size, num_workers, device):
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
+        super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
+
+    @property
+    def start_token(self):
+        return 3
+
+    @property
+    def end_token(self):
+        return None
+
+    @staticmethod
+    def _offsets_to_indices(offsets, seqs):
+        seq_len = seqs.shape[1]
+        inds = np.zeros(seq_len, dtype=np.int32)
+        for i in range(seq_len // 6):
+            inds[i * 6 : (i + 1) * 6] = i + 1
+        inds[(i + 1) * 6 :] = np.arange(i + 2, i + (seq_len % 6) + 2)
+
+        return inds
+
+
+class CaduceusMultiOutputExtractor(MultiOutputExtractor):
+    _idx_mode = "fixed"
+    _use_attention_mask = False
+
+    def __init__(self, model_name, batch_size, num_workers, device):
+        tokenizer, model = load_pretrained("caduceus", model_name, "masked_lm")
+        super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
+
+    @property
+    def start_token(self):
+        return None
+
+    @property
+    def end_token(self):
+        return 1
+
+    @staticmethod
+    def _offsets_to_indices(offsets, seqs):
+        slice_idx = [0, seqs.shape[1]]
+
+        return np.array(slice_idx)
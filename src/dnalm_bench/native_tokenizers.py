@@ -0,0 +1,209 @@
+import itertools
+import sys
+import time
+
+import numpy as np
+import torch
+
+from .utils import onehot_to_chars
+
+
+def base_indices(seqs):
+    """
+    (batch, length) base indices (0-3 for ACGT) of one-hot sequences. Rows
+    with no base (N) map to A, as they do through onehot_to_chars. Integer
+    token arrays are passed through.
+    """
+    if seqs.dim() == 3:
+        return seqs.argmax(dim=2)
+
+    return seqs.long()
+
+
+def _special_tokens(tokenizer):
+    # Special tokens the tokenizer puts around a single sequence. Tokenizers
+    # backed by the tokenizers library have no build_inputs_with_special_tokens
+    # in recent transformers, so they are found around an encoded base instead.
+    if hasattr(tokenizer, "build_inputs_with_special_tokens"):
+        ids = tokenizer.build_inputs_with_special_tokens([-1])
+        split = ids.index(-1)
+    else:
+        ids = tokenizer("A")["input_ids"]
+        split = ids.index(tokenizer.convert_tokens_to_ids("A"))
+
+    return (
+        torch.tensor(ids[:split], dtype=torch.long),
+        torch.tensor(ids[split + 1 :], dtype=torch.long),
+    )
+
+
+def _wrap(ids, prefix, suffix):
+    batch_size = ids.shape[0]
+
+    return torch.cat(
+        [prefix.expand(batch_size, -1), ids, suffix.expand(batch_size, -1)], dim=1
+    )
+
+
+def _wrap_offsets(starts, ends, prefix, suffix, batch_size):
+    # (batch, tokens, 2) base ranges of the tokens, (0, 0) for special tokens
+    # as in the offset_mapping of HF tokenizers
+    offsets = torch.cat(
+        [
+            torch.zeros((len(prefix), 2), dtype=torch.long),
+            torch.stack([starts, ends], dim=1),
+            torch.zeros((len(suffix), 2), dtype=torch.long),
+        ]
+    )
+
+    return offsets.expand(batch_size, -1, -1)
+
+
+class CharTokenizer:
+    """
+    Vectorized equivalent of a character-level HF tokenizer (HyenaDNA,
+    Caduceus): base indices are looked up in a table of the tokenizer's
+    A/C/G/T ids and wrapped in its special tokens. Returns the input ids of a
+    batch of equal-length sequences.
+    """
+
+    def __init__(self, tokenizer):
+        self.base_ids = torch.tensor(
+            tokenizer.convert_tokens_to_ids(list("ACGT")), dtype=torch.long
+        )
+        self.prefix, self.suffix = _special_tokens(tokenizer)
+
+    def __call__(self, seqs):
+        ids = self.base_ids[base_indices(seqs)]
+
+        return _wrap(ids, self.prefix, self.suffix)
+
+    def offsets(self, seqs):
+        """
+        Base ranges covered by the tokens of seqs (see _wrap_offsets)
+        """
+        positions = torch.arange(seqs.shape[1])
+
+        return _wrap_offsets(
+            positions, positions + 1, self.prefix, self.suffix, seqs.shape[0]
+        )
+
+
+class KmerTokenizer:
+    """
+    Vectorized equivalent of the Nucleotide Transformer tokenizer, which
+    splits a sequence into non-overlapping k-mers from its start and
+    tokenizes the bases left over at the end one at a time. k-mers are packed
+    into base-4 codes and looked up in a table of the tokenizer's k-mer ids.
+    """
+
+    def __init__(self, tokenizer, k=6):
+        self.k = k
+
+        kmers = ["".join(kmer) for kmer in itertools.product("ACGT", repeat=k)]
+        kmer_ids = tokenizer.convert_tokens_to_ids(kmers)
+        if tokenizer.unk_token_id in kmer_ids:
+            raise ValueError(f"Tokenizer vocabulary does not cover all {k}-mers")
+
+        self.kmer_ids = torch.tensor(kmer_ids, dtype=torch.long)
+        self.base_ids = torch.tensor(
+            tokenizer.convert_tokens_to_ids(list("ACGT")), dtype=torch.long
+        )
+        self.place_values = 4 ** torch.arange(k - 1, -1, -1)
+        self.prefix, self.suffix = _special_tokens(tokenizer)
+
+    def __call__(self, seqs):
+        bases = base_indices(seqs)
+        batch_size, seq_len = bases.shape
+        kmers_len = (seq_len // self.k) * self.k
+
+        codes = bases[:, :kmers_len].reshape(batch_size, -1, self.k)
+        codes = (codes * self.place_values).sum(dim=2)
+        ids = torch.cat(
+            [self.kmer_ids[codes], self.base_ids[bases[:, kmers_len:]]], dim=1
+        )
+
+        return _wrap(ids, self.prefix, self.suffix)
+
+    def offsets(self, seqs):
+        """
+        Base ranges covered by the tokens of seqs (see _wrap_offsets)
+        """
+        seq_len = seqs.shape[1]
+        kmers_len = (seq_len // self.k) * self.k
+        starts = torch.cat(
+            [torch.arange(0, kmers_len, self.k), torch.arange(kmers_len, seq_len)]
+        )
+        widths = torch.where(starts < kmers_len, self.k, 1)
+
+        return _wrap_offsets(
+            starts, starts + widths, self.prefix, self.suffix, seqs.shape[0]
+        )
+
+
+BENCHMARK_MODELS = {
+    "hyenadna": "hyenadna-large-1m-seqlen-hf",
+    "caduceus": "caduceus-ps_seqlen-131k_d_model-256_n_layer-16",
+    "nucleotide_transformer": "nucleotide-transformer-v2-500m-multi-species",
+}
+
+
+def benchmark_tokenizers(
+    families=None, batch_size=64, seq_len=2114, num_batches=20, seed=0
+):
+    """
+    Tokenization throughput (sequences per second) of the HF tokenizer path
+    (onehot_to_chars, then the tokenizer) and of the native tokenizer for
+    each family, on random one-hot batches with some N positions. Raises if
+    the two ever produce different ids.
+    """
+    from .models import load_native_tokenizer, model_pool
+
+    rng = np.random.default_rng(seed)
+    batches = []
+    for _ in range(num_batches):
+        bases = rng.integers(0, 4, (batch_size, seq_len))
+        onehot = np.eye(4, dtype=np.int8)[bases]
+        onehot[rng.random((batch_size, seq_len)) < 0.01] = 0
+        batches.append(torch.from_numpy(onehot))
+
+    results = {}
+    for family in families or BENCHMARK_MODELS:
+        model_name = BENCHMARK_MODELS[family]
+        tokenizer = model_pool.tokenizer(family, model_name)
+        native = load_native_tokenizer(family, model_name)
+
+        start = time.perf_counter()
+        hf_ids = [
+            tokenizer(onehot_to_chars(b), return_tensors="pt", padding=True)[
+                "input_ids"
+            ]
+            for b in batches
+        ]
+        hf_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        native_ids = [native(b) for b in batches]
+        native_time = time.perf_counter() - start
+
+        for expected, ids in zip(hf_ids, native_ids):
+            if not torch.equal(expected, ids):
+                raise AssertionError(f"Native {family} tokenizer ids differ")
+
+        num_seqs = batch_size * num_batches
+        results[family] = {
+            "hf_seqs_per_s": num_seqs / hf_time,
+            "native_seqs_per_s": num_seqs / native_time,
+            "speedup": hf_time / native_time,
+        }
+        print(
+            f"{family:<24} hf {results[family]['hf_seqs_per_s']:10.1f} seqs/s  "
+            f"native {results[family]['native_seqs_per_s']:10.1f} seqs/s  "
+            f"x{results[family]['speedup']:.1f}"
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_tokenizers(sys.argv[1:] or None)
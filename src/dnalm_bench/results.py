@@ -0,0 +1,322 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+
+import polars as pl
+
+CELL_LINES = ("GM12878", "H1ESC", "HEPG2", "IMR90", "K562")
+
+# Directories holding inputs, embeddings and checkpoints rather than results
+_SKIP_DIRS = {
+    "embeddings",
+    "input_data",
+    "processed_data",
+    "processed_inputs",
+    "raw_data",
+}
+
+_METRICS_FILE = re.compile(
+    r"^(?:(?P<cell_line>[A-Z0-9]+)_)?(?:eval_(?P<split>\w+?)|metrics)(?P<ci>_ci)?\.json$"
+)
+
+
+def parse_result_path(rel_path):
+    """
+    Index fields for a result file given its path relative to the work dir,
+    e.g. task_4_chromatin_activity/supervised_model_outputs/probed/{model}/{cell_line}/eval_test.json
+    or task_1_ccre/supervised_models/fine_tuned/{model}/train.log.
+    Returns None for files that are not results.
+    """
+    parts = rel_path.split(os.sep)
+    if len(parts) < 4:
+        return None
+
+    task, stage, *middle, filename = parts
+    if filename == "train.log":
+        kind, split, cell_line = "train_log", None, None
+    else:
+        match = _METRICS_FILE.match(filename)
+        if match is None:
+            return None
+        kind = "ci" if match["ci"] else "metrics"
+        split, cell_line = match["split"], match["cell_line"]
+
+    for part in middle:
+        if part in CELL_LINES:
+            cell_line = part
+    names = [part for part in middle if part not in CELL_LINES]
+    mode = names[0]
+    model = names[1] if len(names) > 1 else names[0]
+
+    return {
+        "task": task,
+        "stage": stage,
+        "mode": mode,
+        "model": model,
+        "cell_line": cell_line,
+        "split": split,
+        "kind": kind,
+    }
+
+
+def _read_rows(path, kind):
+    """
+    (checkpoint, metric, value, ci_lower, ci_upper) rows of a result file
+    """
+    if kind == "train_log":
+        log = pl.read_csv(path, separator="\t")
+        return [
+            (int(row["epoch"]), metric, float(value), None, None)
+            for row in log.iter_rows(named=True)
+            for metric, value in row.items()
+            if metric != "epoch" and value is not None
+        ]
+
+    with open(path) as f:
+        data = json.load(f)
+
+    if kind == "ci":
+        return [
+            (None, metric, i["estimate"], i["ci_lower"], i["ci_upper"])
+            for metric, i in data.items()
+        ]
+
+    return [
+        (None, metric, float(value), None, None)
+        for metric, value in data.items()
+        if isinstance(value, (int, float))
+    ]
+
+
+class ResultsWarehouse:
+    """
+    SQLite index of the metrics JSONs, bootstrap interval JSONs and training
+    logs under a work dir. ingest() only re-reads files whose mtime or size
+    changed since the last run, so rebuilding tables stays cheap.
+    """
+
+    def __init__(self, work_dir, path=None):
+        self.work_dir = work_dir
+        self.path = path or os.path.join(work_dir, "results.sqlite")
+
+        self.conn = sqlite3.connect(self.path, timeout=600)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                task TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                model TEXT NOT NULL,
+                cell_line TEXT,
+                split TEXT,
+                kind TEXT NOT NULL
+            )
+            """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS metrics (
+                path TEXT NOT NULL,
+                checkpoint INTEGER,
+                metric TEXT NOT NULL,
+                value REAL,
+                ci_lower REAL,
+                ci_upper REAL
+            )
+            """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS files_index "
+            "ON files (task, mode, model, cell_line, split, kind)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS metrics_path ON metrics (path)")
+        self.conn.commit()
+
+    def _result_files(self):
+        for task in sorted(os.listdir(self.work_dir)):
+            task_dir = os.path.join(self.work_dir, task)
+            if not (task.startswith("task_") and os.path.isdir(task_dir)):
+                continue
+            for dirpath, dirnames, filenames in os.walk(task_dir):
+                dirnames[:] = [d for d in dirnames if d not in _SKIP_DIRS]
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    rel_path = os.path.relpath(path, self.work_dir)
+                    fields = parse_result_path(rel_path)
+                    if fields is not None:
+                        yield rel_path, fields
+
+    def ingest(self):
+        """
+        Index new and changed result files and drop deleted ones. Returns the
+        number of (re)ingested and removed files.
+        """
+        known = {
+            path: (mtime, size)
+            for path, mtime, size in self.conn.execute(
+                "SELECT path, mtime, size FROM files"
+            )
+        }
+        seen = set()
+        ingested = 0
+        for rel_path, fields in self._result_files():
+            seen.add(rel_path)
+            stat = os.stat(os.path.join(self.work_dir, rel_path))
+            if known.get(rel_path) == (stat.st_mtime, stat.st_size):
+                continue
+
+            try:
+                rows = _read_rows(os.path.join(self.work_dir, rel_path), fields["kind"])
+            except (ValueError, KeyError, pl.exceptions.PolarsError) as e:
+                print(f"Skipping {rel_path}: {e}", file=sys.stderr)
+                continue
+
+            self.conn.execute("DELETE FROM metrics WHERE path = ?", (rel_path,))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    rel_path,
+                    stat.st_mtime,
+                    stat.st_size,
+                    fields["task"],
+                    fields["stage"],
+                    fields["mode"],
+                    fields["model"],
+                    fields["cell_line"],
+                    fields["split"],
+                    fields["kind"],
+                ),
+            )
+            self.conn.executemany(
+                "INSERT INTO metrics VALUES (?, ?, ?, ?, ?, ?)",
+                ((rel_path, *row) for row in rows),
+            )
+            ingested += 1
+
+        removed = known.keys() - seen
+        self.conn.executemany(
+            "DELETE FROM metrics WHERE path = ?", ((p,) for p in removed)
+        )
+        self.conn.executemany(
+            "DELETE FROM files WHERE path = ?", ((p,) for p in removed)
+        )
+        self.conn.commit()
+
+        return ingested, len(removed)
+
+    def query(self, task, mode=None, split=None, cell_line=None, models=None):
+        """
+        Evaluation metrics as a frame with one row per (model, cell_line, metric).
+        Bootstrap intervals from the matching *_ci.json, when ingested, fill
+        the ci_lower/ci_upper columns and replace the point estimate.
+        """
+        filters = ["f.task = ?"]
+        params = [task]
+        for column, value in [
+            ("mode", mode),
+            ("split", split),
+            ("cell_line", cell_line),
+        ]:
+            if value is not None:
+                filters.append(f"f.{column} = ?")
+                params.append(value)
+        if models is not None:
+            filters.append(f"f.model IN ({', '.join('?' * len(models))})")
+            params.extend(models)
+
+        rows = self.conn.execute(
+            f"""
+            SELECT f.mode, f.model, f.cell_line, f.split, m.metric,
+                COALESCE(c.value, m.value), c.ci_lower, c.ci_upper
+            FROM files f
+            JOIN metrics m ON m.path = f.path
+            LEFT JOIN files fc
+                ON fc.kind = 'ci' AND fc.task = f.task AND fc.stage = f.stage
+                AND fc.mode = f.mode AND fc.model = f.model
+                AND fc.cell_line IS f.cell_line AND fc.split IS f.split
+            LEFT JOIN metrics c ON c.path = fc.path AND c.metric = m.metric
+            WHERE f.kind = 'metrics' AND {" AND ".join(filters)}
+            ORDER BY f.model, f.cell_line, m.metric
+            """,
+            params,
+        ).fetchall()
+
+        return pl.DataFrame(
+            rows,
+            schema={
+                "mode": pl.Utf8,
+                "model": pl.Utf8,
+                "cell_line": pl.Utf8,
+                "split": pl.Utf8,
+                "metric": pl.Utf8,
+                "value": pl.Float64,
+                "ci_lower": pl.Float64,
+                "ci_upper": pl.Float64,
+            },
+        )
+
+    def metrics_by_model(
+        self, task, mode=None, split=None, cell_line=None, models=None
+    ):
+        """
+        {model: {metric: {"value", "ci_lower", "ci_upper"}}} view of query()
+        """
+        results = {}
+        for row in self.query(task, mode, split, cell_line, models).iter_rows(
+            named=True
+        ):
+            results.setdefault(row["model"], {})[row["metric"]] = {
+                "value": row["value"],
+                "ci_lower": row["ci_lower"],
+                "ci_upper": row["ci_upper"],
+            }
+
+        return results
+
+    def train_log(self, task, mode, model, cell_line=None):
+        """
+        Per-epoch training log of a model as a frame with an epoch column
+        """
+        rows = self.conn.execute(
+            """
+            SELECT m.checkpoint, m.metric, m.value FROM files f
+            JOIN metrics m ON m.path = f.path
+            WHERE f.kind = 'train_log' AND f.task = ? AND f.mode = ? AND f.model = ?
+            AND f.cell_line IS ?
+            ORDER BY m.checkpoint
+            """,
+            (task, mode, model, cell_line),
+        ).fetchall()
+        log = pl.DataFrame(
+            rows,
+            schema={"epoch": pl.Int64, "metric": pl.Utf8, "value": pl.Float64},
+        )
+        if log.height == 0:
+            return log.select("epoch")
+
+        return log.pivot(
+            index="epoch", columns="metric", values="value", aggregate_function="first"
+        ).sort("epoch")
+
+    def best_checkpoint(self, task, mode, model, cell_line=None):
+        """
+        Epoch with the lowest validation loss, as selected by the eval scripts
+        """
+        log = self.train_log(task, mode, model, cell_line)
+        if "val_loss" not in log.columns:
+            return None
+
+        return log["epoch"][log["val_loss"].arg_min()]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    work_dir = sys.argv[1] if len(sys.argv) > 1 else os.environ.get("DART_WORK_DIR", "")
+    warehouse = ResultsWarehouse(work_dir)
+    ingested, removed = warehouse.ingest()
+    print(f"Ingested {ingested} result files, removed {removed}")
+    warehouse.close()
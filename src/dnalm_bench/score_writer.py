@@ -0,0 +1,190 @@
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import polars as pl
+from torch.utils.data import Subset
+
+_NUMPY_DTYPES = {
+    pl.Float64: np.float64,
+    pl.Float32: np.float32,
+    pl.Int64: np.int64,
+    pl.Int32: np.int32,
+    pl.UInt32: np.uint32,
+    pl.Boolean: np.bool_,
+}
+
+
+class ScoreWriter:
+    """
+    Buffers per-example scores in typed column arrays and writes them out one
+    row group at a time, as a TSV or (for .parquet paths) a Parquet file.
+
+    After every row group a checkpoint recording the number of committed rows
+    is written next to the output. With resume=True, a writer opened on an
+    interrupted run keeps the committed rows, and remaining() gives the part
+    of the dataset that still needs to be scored. close() flushes the buffers,
+    removes the checkpoint and returns the full table, built from the row
+    groups kept as they were written (only rows committed by an earlier run
+    are read back).
+    """
+
+    def __init__(
+        self,
+        path,
+        schema,
+        file_format=None,
+        header=True,
+        row_group_size=16384,
+        resume=False,
+    ):
+        if file_format is None:
+            file_format = "parquet" if path.endswith((".parquet", ".pq")) else "tsv"
+        if file_format not in ("tsv", "parquet"):
+            raise ValueError(f"Unsupported score file format: {file_format}")
+
+        self.path = path
+        self.schema = schema
+        self.file_format = file_format
+        self.header = header
+        self.row_group_size = row_group_size
+
+        self.checkpoint_path = path + ".progress.json"
+        self.parts_dir = path + ".parts"
+
+        self._buffers = {
+            name: np.empty(row_group_size, dtype=_NUMPY_DTYPES[dtype])
+            for name, dtype in schema.items()
+        }
+        self._buffered = 0
+        self._frames = []
+
+        if resume and os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            self.rows_written = checkpoint["rows"]
+            self._offset = checkpoint["offset"]
+            self._num_parts = checkpoint["parts"]
+
+            # Drop anything written after the last checkpoint
+            if self.file_format == "tsv":
+                os.truncate(self.path, self._offset)
+        else:
+            self._start()
+
+        self._resumed_rows = self.rows_written
+        self._resumed_parts = self._num_parts
+
+    def _start(self):
+        self.rows_written = 0
+        self._offset = 0
+        self._num_parts = 0
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+        if self.file_format == "tsv":
+            with open(self.path, "w") as f:
+                if self.header:
+                    f.write("\t".join(self.schema) + "\n")
+                self._offset = f.tell()
+        else:
+            os.makedirs(self.parts_dir)
+
+        self._write_checkpoint()
+
+    def _write_checkpoint(self):
+        checkpoint = {
+            "rows": self.rows_written,
+            "offset": self._offset,
+            "parts": self._num_parts,
+        }
+        with open(self.checkpoint_path + ".tmp", "w") as f:
+            json.dump(checkpoint, f)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+
+    def _flush(self):
+        if self._buffered == 0:
+            return
+
+        frame = pl.DataFrame(
+            {name: buf[: self._buffered].copy() for name, buf in self._buffers.items()},
+            schema=self.schema,
+        )
+
+        if self.file_format == "tsv":
+            with open(self.path, "ab") as f:
+                frame.write_csv(f, separator="\t", include_header=False)
+                self._offset = f.tell()
+        else:
+            part_path = os.path.join(
+                self.parts_dir, f"part_{self._num_parts:06d}.parquet"
+            )
+            frame.write_parquet(part_path + ".tmp")
+            os.replace(part_path + ".tmp", part_path)
+            self._num_parts += 1
+
+        self._frames.append(frame)
+        self.rows_written += self._buffered
+        self._buffered = 0
+        self._write_checkpoint()
+
+    def append(self, **columns):
+        num_rows = len(next(iter(columns.values())))
+        start = 0
+        while start < num_rows:
+            take = min(num_rows - start, self.row_group_size - self._buffered)
+            for name, buf in self._buffers.items():
+                buf[self._buffered : self._buffered + take] = columns[name][
+                    start : start + take
+                ]
+
+            self._buffered += take
+            start += take
+            if self._buffered == self.row_group_size:
+                self._flush()
+
+    def remaining(self, dataset):
+        if self.rows_written == 0:
+            return dataset
+
+        return Subset(dataset, range(self.rows_written, len(dataset)))
+
+    def _read_resumed(self):
+        # Rows committed by the run this writer resumed
+        if self.file_format == "tsv":
+            return pl.read_csv(
+                self.path,
+                separator="\t",
+                has_header=self.header,
+                new_columns=list(self.schema),
+                dtypes=list(self.schema.values()),
+                n_rows=self._resumed_rows,
+            )
+
+        parts = sorted(glob.glob(os.path.join(self.parts_dir, "*.parquet")))
+        return pl.concat(
+            [pl.read_parquet(part) for part in parts[: self._resumed_parts]]
+        )
+
+    def close(self):
+        self._flush()
+
+        frames = list(self._frames)
+        if self._resumed_rows > 0:
+            frames.insert(0, self._read_resumed())
+        if frames:
+            frame = pl.concat(frames)
+        else:
+            frame = pl.DataFrame(schema=self.schema)
+
+        if self.file_format == "parquet":
+            frame.write_parquet(self.path, row_group_size=self.row_group_size)
+            shutil.rmtree(self.parts_dir)
+
+        os.remove(self.checkpoint_path)
+
+        return frame
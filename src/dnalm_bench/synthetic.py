@@ -0,0 +1,287 @@
+import itertools
+
+import numpy as np
+import polars as pl
+import torch
+
+from .embedding_store import write_embeddings
+from .utils import lazy_import
+
+h5py = lazy_import("h5py")
+pyBigWig = lazy_import("pyBigWig")
+tokenizers = lazy_import("tokenizers")
+transformers = lazy_import("transformers")
+
+BASES = np.array(list("ACGT"))
+
+CHAR_VOCAB = [
+    "[CLS]",
+    "[SEP]",
+    "[BOS]",
+    "[MASK]",
+    "[PAD]",
+    "[RESERVED]",
+    "[UNK]",
+    "A",
+    "C",
+    "G",
+    "T",
+    "N",
+]
+
+# Tokenizer type and architecture of each family's stand-in: stock
+# transformers classes in place of the families' remote code (which would
+# have to be downloaded), with the special token ids the evaluators expect
+TINY_FAMILIES = {
+    "dnabert2": ("bpe", "bert"),
+    "gena_lm": ("bpe", "bert"),
+    "mistral_dna": ("bpe", "mistral"),
+    "nucleotide_transformer": ("kmer", "esm"),
+    "hyenadna": ("char", "mistral"),
+    "caduceus": ("char", "bert"),
+}
+
+TINY_CONFIG = {
+    "hidden_size": 32,
+    "num_hidden_layers": 2,
+    "num_attention_heads": 2,
+    "intermediate_size": 64,
+}
+
+
+def random_bases(length, rng):
+    return BASES[rng.integers(0, 4, length)]
+
+
+def random_onehot(num_seqs, seq_len, rng):
+    """
+    (num_seqs, seq_len, 4) int8 one-hot sequences of random bases
+    """
+    return torch.from_numpy(
+        np.eye(4, dtype=np.int8)[rng.integers(0, 4, (num_seqs, seq_len))]
+    )
+
+
+def write_genome_fasta(path, chrom_sizes, rng, line_width=80):
+    """
+    FASTA of random bases for each chromosome in chrom_sizes
+    """
+    with open(path, "w") as f:
+        for chrom, size in chrom_sizes.items():
+            f.write(f">{chrom}\n")
+            bases = random_bases(size, rng)
+            for i in range(0, size, line_width):
+                f.write("".join(bases[i : i + line_width]) + "\n")
+
+    return path
+
+
+def write_bigwig(path, chrom_sizes, rng):
+    """
+    bigWig of uniform random signal at every base of each chromosome
+    """
+    bw = pyBigWig.open(path, "w")
+    bw.addHeader(list(chrom_sizes.items()))
+    for chrom, size in chrom_sizes.items():
+        bw.addEntries(
+            chrom, 0, values=rng.random(size).astype(np.float64), span=1, step=1
+        )
+    bw.close()
+
+    return path
+
+
+def write_paired_control_elements(
+    path, chrom_sizes, num_elements, seq_len, elem_len, rng
+):
+    """
+    Elements TSV in the format read by PairedControlDataset: windows of
+    seq_len bases at random positions, with elements of elem_len bases at
+    their centers and half of them reverse complemented
+    """
+    chroms = rng.choice(list(chrom_sizes), num_elements)
+    sizes = np.array([chrom_sizes[chrom] for chrom in chroms])
+    starts = (rng.random(num_elements) * (sizes - seq_len + 1)).astype(np.int64)
+    rel_start = (seq_len - elem_len) // 2
+    rel_end = rel_start + elem_len
+
+    pl.DataFrame(
+        {
+            "chr": chroms.tolist(),
+            "input_start": starts,
+            "input_end": starts + seq_len,
+            "ccre_start": starts + rel_start,
+            "ccre_end": starts + rel_end,
+            "ccre_relative_start": [rel_start] * num_elements,
+            "ccre_relative_end": [rel_end] * num_elements,
+            "reverse_complement": rng.random(num_elements) < 0.5,
+        }
+    ).write_csv(path, separator="\t")
+
+    return path
+
+
+def write_embedding_store(
+    path,
+    num_items,
+    seq_len,
+    num_tokens,
+    hidden,
+    rng,
+    chunk_size=64,
+    store_dtype="float32",
+):
+    """
+    Paired control embedding store as written by the supervised embedding
+    extractors: random token embeddings in chunks for the seq and ctrl
+    groups, with variable token indices (idx_var) that split each sequence
+    into num_tokens runs of bases
+    """
+    with h5py.File(path, "w") as h5:
+        for name in ["seq", "ctrl"]:
+            grp = h5.create_group(name)
+            bounds = np.sort(rng.integers(1, seq_len, (num_items, num_tokens - 1)))
+            positions = np.arange(seq_len)
+            indices = np.stack(
+                [np.searchsorted(b, positions, side="right") for b in bounds]
+            )
+            grp.create_dataset("idx_var", data=indices.astype(np.uint32))
+
+            for start in range(0, num_items, chunk_size):
+                end = min(start + chunk_size, num_items)
+                embs = rng.standard_normal(
+                    (end - start, num_tokens, hidden), dtype=np.float32
+                )
+                write_embeddings(
+                    grp, f"emb_{start}_{end}", torch.from_numpy(embs), store_dtype
+                )
+
+    return path
+
+
+def _word_level(vocab, pattern, unk_token):
+    tokenizer = tokenizers.Tokenizer(
+        tokenizers.models.WordLevel(
+            {token: i for i, token in enumerate(vocab)}, unk_token=unk_token
+        )
+    )
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Split(
+        tokenizers.Regex(pattern), "isolated"
+    )
+
+    return tokenizer
+
+
+def _bpe(special_tokens, vocab_size, rng, num_seqs=100, seq_len=1000):
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE(unk_token=special_tokens[0]))
+    trainer = tokenizers.trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=special_tokens,
+        initial_alphabet=list("ACGTN"),
+        show_progress=False,
+    )
+    seqs = ("".join(random_bases(seq_len, rng)) for _ in range(num_seqs))
+    tokenizer.train_from_iterator(seqs, trainer)
+
+    return tokenizer
+
+
+def tiny_tokenizer(family, vocab_size=512, seed=0):
+    """
+    Offline stand-in for a family's tokenizer: single bases (HyenaDNA,
+    Caduceus), non-overlapping 6-mers (Nucleotide Transformer) or BPE with
+    vocab_size tokens trained on random sequences, with the family's special
+    tokens around each sequence
+    """
+    kind = TINY_FAMILIES[family][0]
+    if kind == "char":
+        tokenizer = _word_level(CHAR_VOCAB, ".", "[UNK]")
+        template = "$A [SEP]"
+        special = {
+            "cls_token": "[CLS]",
+            "sep_token": "[SEP]",
+            "bos_token": "[BOS]",
+            "mask_token": "[MASK]",
+            "pad_token": "[PAD]",
+            "unk_token": "[UNK]",
+        }
+    elif kind == "kmer":
+        special = {
+            "unk_token": "<unk>",
+            "pad_token": "<pad>",
+            "mask_token": "<mask>",
+            "cls_token": "<cls>",
+            "eos_token": "<eos>",
+            "bos_token": "<bos>",
+        }
+        kmers = ["".join(kmer) for kmer in itertools.product("ACGT", repeat=6)]
+        vocab = list(special.values()) + kmers + list("ACGTN")
+        tokenizer = _word_level(vocab, "[ACGT]{6}|.", "<unk>")
+        template = "<cls> $A"
+    elif family == "mistral_dna":
+        special = {
+            "unk_token": "<unk>",
+            "bos_token": "<s>",
+            "eos_token": "</s>",
+            "pad_token": "<pad>",
+        }
+        rng = np.random.default_rng(seed)
+        tokenizer = _bpe(list(special.values()), vocab_size, rng)
+        template = "<s> $A </s>"
+    else:
+        special = {
+            "unk_token": "[UNK]",
+            "cls_token": "[CLS]",
+            "sep_token": "[SEP]",
+            "pad_token": "[PAD]",
+            "mask_token": "[MASK]",
+        }
+        rng = np.random.default_rng(seed)
+        tokenizer = _bpe(list(special.values()), vocab_size, rng)
+        template = "[CLS] $A [SEP]"
+
+    tokenizer.post_processor = tokenizers.processors.TemplateProcessing(
+        single=template,
+        special_tokens=[
+            (token, tokenizer.token_to_id(token))
+            for token in template.split()
+            if token != "$A"
+        ],
+    )
+
+    return transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer, padding_side="right", **special
+    )
+
+
+def tiny_model(family, tokenizer, max_len=1024, seed=0):
+    """
+    Randomly initialized LM with the head the family's evaluators use and a
+    few small layers (TINY_CONFIG), for inputs of up to max_len tokens
+    """
+    arch = TINY_FAMILIES[family][1]
+    kwargs = dict(
+        TINY_CONFIG,
+        vocab_size=len(tokenizer),
+        max_position_embeddings=max_len,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(seed)
+        if arch == "bert":
+            model = transformers.BertForMaskedLM(transformers.BertConfig(**kwargs))
+        elif arch == "esm":
+            config = transformers.EsmConfig(
+                position_embedding_type="rotary",
+                mask_token_id=tokenizer.mask_token_id,
+                **kwargs,
+            )
+            model = transformers.EsmForMaskedLM(config)
+        else:
+            config = transformers.MistralConfig(
+                num_key_value_heads=TINY_CONFIG["num_attention_heads"], **kwargs
+            )
+            model = transformers.MistralForCausalLM(config)
+
+    return model.eval()
@@ -4,13 +4,14 @@ import os
 
 import numpy as np
 import polars as pl
-import pyfaidx
 import torch
 from torch.utils.data import Dataset
 
 # from scipy.stats import wilcoxon
 # from tqdm import tqdm
-from ..utils import copy_if_not_exists, one_hot_encode
+from ..utils import copy_if_not_exists, lazy_import, one_hot_encode
+
+pyfaidx = lazy_import("pyfaidx")
 
 
 class PairedControlDataset(Dataset):
@@ -29,10 +30,19 @@ class PairedControlDataset(Dataset):
 
     _seed_upper = 2**128
 
-    def __init__(self, genome_fa, elements_tsv, chroms, seed, cache_dir=None):
+    def __init__(
+        self,
+        genome_fa,
+        elements_tsv,
+        chroms,
+        seed,
+        cache_dir=None,
+        return_element_span=False,
+    ):
         super().__init__()
 
         self.seed = seed
+        self.return_element_span = return_element_span
 
         self.elements_df = self._load_elements(elements_tsv, chroms)
 
@@ -112,7 +122,7 @@ class PairedControlDataset(Dataset):
         return self.elements_df.height
 
     def __getitem__(self, idx):
-        idx_orig, chrom, start, end, elem_start, elem_end, _, _, rc = (
+        idx_orig, chrom, start, end, elem_start, elem_end, rel_start, rel_end, rc = (
             self.elements_df.row(idx)
         )
 
@@ -151,4 +161,18 @@ class PairedControlDataset(Dataset):
             seq = seq[::-1, ::-1].copy()
             ctrl = ctrl[::-1, ::-1].copy()
 
-        return torch.from_numpy(seq), torch.from_numpy(ctrl), torch.tensor(idx_orig)
+        if not self.return_element_span:
+            return torch.from_numpy(seq), torch.from_numpy(ctrl), torch.tensor(idx_orig)
+
+        # Base coordinates of the element within the returned sequence
+        span_start = min(max(rel_start, 0), window)
+        span_end = min(max(rel_end, 0), window)
+        if rc:
+            span_start, span_end = window - span_end, window - span_start
+
+        return (
+            torch.from_numpy(seq),
+            torch.from_numpy(ctrl),
+            torch.tensor(idx_orig),
+            torch.tensor([span_start, span_end]),
+        )
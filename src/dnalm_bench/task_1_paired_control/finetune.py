@@ -1,22 +1,20 @@
-import importlib
 import json
 import os
 import warnings
 
+import polars as pl
 import torch
 import torch.nn.functional as F
-from sklearn.metrics import average_precision_score, matthews_corrcoef, roc_auc_score
 from torch.utils.data import DataLoader
 from tqdm import tqdm
-from transformers import (
-    AutoModel,
-    AutoModelForSequenceClassification,
-    AutoTokenizer,
-    BertConfig,
-)
 
+from ..devices import resolve_device
 from ..finetune import HFClassifierModel, LoRAModule
-from ..utils import NoModule, onehot_to_chars
+from ..microbatch import MicroBatchCache, MicroBatcher
+from ..models import load_native_tokenizer, load_pretrained
+from ..utils import lazy_import
+
+skmetrics = lazy_import("sklearn.metrics")
 
 
 def train_finetuned_classifier(
@@ -34,12 +32,14 @@ def train_finetuned_classifier(
     device,
     progress_bar=False,
     resume_from=None,
+    micro_batch_size=None,
 ):
+    device = resolve_device(device, num_workers)
     train_dataloader = DataLoader(
         train_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=True,
     )
@@ -47,7 +47,7 @@ def train_finetuned_classifier(
         val_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=True,
     )
@@ -66,10 +66,10 @@ def train_finetuned_classifier(
         resume_checkpoint_path = os.path.join(out_dir, f"checkpoint_{resume_from}.pt")
         optimizer_checkpoint_path = os.path.join(out_dir, f"optimizer_{resume_from}.pt")
         start_epoch = resume_from + 1
-        checkpoint_resume = torch.load(resume_checkpoint_path)
+        checkpoint_resume = torch.load(resume_checkpoint_path, map_location="cpu")
         model.load_state_dict(checkpoint_resume, strict=False)
         try:
-            optimizer_resume = torch.load(optimizer_checkpoint_path)
+            optimizer_resume = torch.load(optimizer_checkpoint_path, map_location="cpu")
             optimizer.load_state_dict(optimizer_resume)
         except FileNotFoundError:
             warnings.warn(
@@ -84,6 +84,18 @@ def train_finetuned_classifier(
 
         criterion = torch.nn.CrossEntropyLoss()
 
+        def seq_loss(seq):
+            out_seq = model(seq)
+            return criterion(out_seq, one.expand(out_seq.shape[0])) / accumulate
+
+        def ctrl_loss(ctrl):
+            out_ctrl = model(ctrl)
+            return criterion(out_ctrl, zero.expand(out_ctrl.shape[0])) / accumulate
+
+        micro_batcher = MicroBatcher(
+            device, micro_batch_size, model, mode="train", cache=MicroBatchCache()
+        )
+
         for epoch in range(start_epoch, num_epochs):
             optimizer.zero_grad()
             model.train()
@@ -98,14 +110,8 @@ def train_finetuned_classifier(
                 # seq = seq.to(device)
                 # ctrl = ctrl.to(device)
 
-                out_seq = model(seq)
-                loss_seq = criterion(out_seq, one.expand(out_seq.shape[0])) / accumulate
-                loss_seq.backward()
-                out_ctrl = model(ctrl)
-                loss_ctrl = (
-                    criterion(out_ctrl, zero.expand(out_ctrl.shape[0])) / accumulate
-                )
-                loss_ctrl.backward()
+                micro_batcher.backward(seq_loss, seq)
+                micro_batcher.backward(ctrl_loss, ctrl)
 
                 if (i + 1) % accumulate == 0:
                     optimizer.step()
@@ -165,11 +171,12 @@ def evaluate_finetuned_classifier(
     device,
     progress_bar=False,
 ):
+    device = resolve_device(device, num_workers)
     test_dataloader = DataLoader(
         test_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
     )
 
@@ -193,14 +200,18 @@ def evaluate_finetuned_classifier(
     test_acc_paired = 0
     pred_log_probs = []
     labels = []
+    seq_logits = []
+    ctrl_logits = []
     for i, (seq, ctrl, inds) in enumerate(
         tqdm(test_dataloader, disable=(not progress_bar), desc="train", ncols=120)
     ):
-        with torch.no_grad():
+        with torch.inference_mode():
             out_seq = model(seq)
             out_ctrl = model(ctrl)
             pred_log_probs.append(F.log_softmax(out_seq, dim=1))
             pred_log_probs.append(F.log_softmax(out_ctrl, dim=1))
+            seq_logits.append(out_seq[:, 1] - out_seq[:, 0])
+            ctrl_logits.append(out_ctrl[:, 1] - out_ctrl[:, 0])
             labels.append(one.expand(out_seq.shape[0]))
             labels.append(zero.expand(out_ctrl.shape[0]))
             loss_seq = criterion(out_seq, one.expand(out_seq.shape[0]))
@@ -219,9 +230,9 @@ def evaluate_finetuned_classifier(
     test_acc = (pred_log_probs.argmax(axis=1) == labels).sum().item() / (
         len(test_dataloader.dataset) * 2
     )
-    test_auroc = roc_auc_score(labels, pred_logits)
-    test_auprc = average_precision_score(labels, pred_logits)
-    test_mcc = matthews_corrcoef(labels, pred_log_probs.argmax(axis=1))
+    test_auroc = skmetrics.roc_auc_score(labels, pred_logits)
+    test_auprc = skmetrics.average_precision_score(labels, pred_logits)
+    test_mcc = skmetrics.matthews_corrcoef(labels, pred_log_probs.argmax(axis=1))
 
     metrics["test_loss"] = test_loss
     metrics["test_acc"] = test_acc
@@ -233,37 +244,46 @@ def evaluate_finetuned_classifier(
     with open(out_path, "w") as f:
         json.dump(metrics, f, indent=4)
 
+    # Per-pair scores for bootstrap confidence intervals
+    scores_path = os.path.splitext(out_path)[0] + "_scores.tsv"
+    scores = pl.DataFrame(
+        {
+            "seq_logit": torch.cat(seq_logits).numpy(force=True),
+            "ctrl_logit": torch.cat(ctrl_logits).numpy(force=True),
+        }
+    )
+    scores.write_csv(scores_path, separator="\t")
+
     return metrics
 
 
 class DNABERT2LoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name)
-            config.num_labels = num_labels
-            model = AutoModelForSequenceClassification.from_pretrained(
-                model_name, trust_remote_code=True, config=config
-            )
-            model.bert.embeddings = LoRAModule(
-                model.bert.embeddings, lora_rank, lora_alpha, lora_dropout
-            )
-            model.bert.encoder = LoRAModule(
-                model.bert.encoder, lora_rank, lora_alpha, lora_dropout
-            )
+        tokenizer, model = load_pretrained(
+            "dnabert2",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
+        )
+        model.bert.embeddings = LoRAModule(
+            model.bert.embeddings, lora_rank, lora_alpha, lora_dropout
+        )
+        model.bert.encoder = LoRAModule(
+            model.bert.encoder, lora_rank, lora_alpha, lora_dropout
+        )
 
         super().__init__(tokenizer, model)
 
 
 class MistralDNALoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "mistral_dna",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.config.pad_token_id = tokenizer.pad_token_id
         model.model = LoRAModule(model.model, lora_rank, lora_alpha, lora_dropout)
@@ -273,14 +293,13 @@ class MistralDNALoRAModel(HFClassifierModel):
 
 class GENALMLoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model_base = AutoModel.from_pretrained(model_name, trust_remote_code=True)
-        gena_module_name = model_base.__class__.__module__
-        cls = getattr(
-            importlib.import_module(gena_module_name), "BertForSequenceClassification"
+        tokenizer, model = load_pretrained(
+            "gena_lm",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
-        model = cls.from_pretrained(model_name, num_labels=num_labels)
 
         model.bert.embeddings = LoRAModule(
             model.bert.embeddings, lora_rank, lora_alpha, lora_dropout
@@ -294,40 +313,42 @@ class GENALMLoRAModel(HFClassifierModel):
 
 class NucleotideTransformerLoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.esm = LoRAModule(model.esm, lora_rank, lora_alpha, lora_dropout)
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
 
 class HyenaDNALoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "hyenadna",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.hyena = LoRAModule(model.hyena, lora_rank, lora_alpha, lora_dropout)
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
@@ -342,21 +363,20 @@ class HyenaDNALoRAModel(HFClassifierModel):
 
 class CaduceusLoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "caduceus",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.caduceus = LoRAModule(model.caduceus, lora_rank, lora_alpha, lora_dropout)
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
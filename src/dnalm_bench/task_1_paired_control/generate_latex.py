@@ -1,47 +1,53 @@
-import json
+import os
 import sys
 
 from statsmodels.stats.proportion import proportion_confint
 
+from ..results import ResultsWarehouse
+
 # Sample JSON file paths for each model (replace these paths with actual paths)
 
-WORK_DIR = "/oak/stanford/groups/akundaje/arpitas/dart-eval/"
+WORK_DIR = os.environ.get(
+    "DART_WORK_DIR", "/oak/stanford/groups/akundaje/arpitas/dart-eval/"
+)
 
 
-def get_confidence_interval(json_file, num_ccres, metric):
-    print("json file", json_file)
-    with open(json_file, "r") as f:
-        data = json.load(f)
+def get_confidence_interval(metrics, num_ccres, metric):
+    result = metrics[metric]
+    if result["ci_lower"] is not None:
+        # Bootstrap interval from confidence_intervals.py
+        error = (result["ci_upper"] - result["ci_lower"]) / 2
+        return result["value"], f"{result['value']:.4f} $\\pm$ {error:.4e}"
     if metric == "test_auroc" or metric == "test_auprc":
-        return data[metric], f"{data[metric]:.4f}"
-    conf_int = proportion_confint(data[metric] * num_ccres, num_ccres, method="normal")
+        return result["value"], f"{result['value']:.4f}"
+    conf_int = proportion_confint(
+        result["value"] * num_ccres, num_ccres, method="normal"
+    )
     interval = conf_int[1] - conf_int[0]
     error = interval / 2
     mean = (conf_int[1] + conf_int[0]) / 2
-    return mean, f"{mean:.4f} $\pm$ {error:.4e}"
+    return mean, f"{mean:.4f} $\\pm$ {error:.4e}"
 
 
-def underline_max_values(model_json_files, num_ccres):
+def underline_max_values(model_metrics, num_ccres):
     """Underline the maximum values for Accuracy, AUROC, and AUPRC."""
-    print(model_json_files)
+    print(model_metrics)
     accuracies = dict()
     paired_accuracies = dict()
     aurocs = dict()
     auprcs = dict()
-    for model in model_json_files.keys():
-        mean, _ = get_confidence_interval(
-            model_json_files[model], num_ccres, "test_acc"
-        )
+    for model in model_metrics.keys():
+        mean, _ = get_confidence_interval(model_metrics[model], num_ccres, "test_acc")
         mean_paired, _ = get_confidence_interval(
-            model_json_files[model], num_ccres, "test_acc_paired"
+            model_metrics[model], num_ccres, "test_acc_paired"
         )
         accuracies[model] = mean
         paired_accuracies[model] = mean_paired
         aurocs[model] = get_confidence_interval(
-            model_json_files[model], num_ccres, "test_auroc"
+            model_metrics[model], num_ccres, "test_auroc"
         )
         auprcs[model] = get_confidence_interval(
-            model_json_files[model], num_ccres, "test_auprc"
+            model_metrics[model], num_ccres, "test_auprc"
         )
         # Find the models with maximum values
     max_accuracy_model = max(accuracies, key=accuracies.get)
@@ -52,7 +58,7 @@ def underline_max_values(model_json_files, num_ccres):
     return max_accuracy_model, max_acc_paired_model, max_auroc_model, max_auprc_model
 
 
-def generate_latex_table_per_cell_type(model_json_files, num_ccres):
+def generate_latex_table_per_cell_type(model_metrics, num_ccres):
     """Generate a LaTeX table for a specific cell type with the largest values underlined."""
     # Find the models with maximum Accuracy, AUROC, and AUPRC
     max_values = dict()
@@ -61,7 +67,7 @@ def generate_latex_table_per_cell_type(model_json_files, num_ccres):
         max_values["test_acc_paired"],
         max_values["test_auroc"],
         max_values["test_auprc"],
-    ) = underline_max_values(model_json_files, num_ccres)
+    ) = underline_max_values(model_metrics, num_ccres)
 
     latex = """
 \\begin{table}[ht]
@@ -71,11 +77,11 @@ def generate_latex_table_per_cell_type(model_json_files, num_ccres):
 Model & Accuracy \\\\ \\hline
 """
     # Add metrics for each model for the specific cell type
-    for model in model_json_files.keys():
+    for model in model_metrics.keys():
         latex += f"& {model} "
         for metric in ["test_acc", "test_acc_paired", "test_auroc", "test_auprc"]:
             _, latex_model = get_confidence_interval(
-                model_json_files[model], num_ccres, metric
+                model_metrics[model], num_ccres, metric
             )
             metric_str = (
                 f"\\underline{{{latex_model}}}"
@@ -102,18 +108,28 @@ Model & Accuracy \\\\ \\hline
 
 def main():
     setting_type = sys.argv[1] if len(sys.argv) > 1 else "probed"
-    model_json_files = {
-        "DNABERT-2": f"{WORK_DIR}/task_1_ccre/supervised_model_outputs/{setting_type}/DNABERT-2-117M/eval_test.json",
-        "GENA-LM": f"{WORK_DIR}/task_1_ccre/supervised_model_outputs/{setting_type}/gena-lm-bert-large-t2t/eval_test.json",
-        "HyenaDNA": f"{WORK_DIR}/task_1_ccre/supervised_model_outputs/{setting_type}/hyenadna-large-1m-seqlen-hf/eval_test.json",
-        "Nucleotide Transformer": f"{WORK_DIR}/task_1_ccre/supervised_model_outputs/{setting_type}/nucleotide-transformer-v2-500m-multi-species/eval_test.json",
-        "Caduceus": f"{WORK_DIR}/task_1_ccre/supervised_model_outputs/{setting_type}/caduceus-ps_seqlen-131k_d_model-256_n_layer-16/eval_test.json",
-        "Mistral-DNA": f"{WORK_DIR}/task_1_ccre/supervised_model_outputs/{setting_type}/Mistral-DNA-v1-1.6B-hg38/eval_test.json",
+    model_names = {
+        "DNABERT-2": "DNABERT-2-117M",
+        "GENA-LM": "gena-lm-bert-large-t2t",
+        "HyenaDNA": "hyenadna-large-1m-seqlen-hf",
+        "Nucleotide Transformer": "nucleotide-transformer-v2-500m-multi-species",
+        "Caduceus": "caduceus-ps_seqlen-131k_d_model-256_n_layer-16",
+        "Mistral-DNA": "Mistral-DNA-v1-1.6B-hg38",
     }
 
+    warehouse = ResultsWarehouse(WORK_DIR)
+    warehouse.ingest()
+    results = warehouse.metrics_by_model("task_1_ccre", mode=setting_type, split="test")
+    model_metrics = {}
+    for name, model_name in model_names.items():
+        if model_name not in results:
+            print(f"No {setting_type} test metrics for {model_name}, skipping")
+            continue
+        model_metrics[name] = results[model_name]
+
     num_ccres = (2348855 - 1) * 2
 
-    latex_table = generate_latex_table_per_cell_type(model_json_files, num_ccres)
+    latex_table = generate_latex_table_per_cell_type(model_metrics, num_ccres)
 
     # Print or save the LaTeX table for the specific cell type
     print("\nLaTeX Table:\n")
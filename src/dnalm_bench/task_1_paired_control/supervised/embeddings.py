@@ -1,19 +1,20 @@
+import contextlib
 import os
 
-import h5py
 import numpy as np
 from torch.utils.data import DataLoader
 from tqdm import tqdm
-from transformers import (
-    AutoModel,
-    AutoModelForCausalLM,
-    AutoModelForMaskedLM,
-    AutoTokenizer,
-    BertConfig,
+
+from ...embedding_store import EmbeddingWriter
+from ...embeddings import (
+    HFEmbeddingExtractor,
+    SequenceBaselineEmbeddingExtractor,
+    layer_path,
 )
+from ...models import load_native_tokenizer, load_pretrained
+from ...utils import lazy_import
 
-from ...embeddings import HFEmbeddingExtractor, SequenceBaselineEmbeddingExtractor
-from ...utils import onehot_to_chars
+h5py = lazy_import("h5py")
 
 
 class PairedControlEmbeddingExtractor:
@@ -36,9 +37,19 @@ class PairedControlEmbeddingExtractor:
             num_workers=self.num_workers,
         )
 
-        with h5py.File(out_path + ".tmp", "w") as out_f:
-            seq_grp = out_f.create_group("seq")
-            ctrl_grp = out_f.create_group("ctrl")
+        with contextlib.ExitStack() as stack:
+            writers = {}
+            seq_grps = {}
+            ctrl_grps = {}
+            for layer in self.layers:
+                out_f = stack.enter_context(
+                    h5py.File(layer_path(out_path, layer) + ".tmp", "w")
+                )
+                writers[layer] = EmbeddingWriter(
+                    out_f, self.store_dtype, self.store_dim, self.store_projection
+                )
+                seq_grps[layer] = out_f.create_group("seq")
+                ctrl_grps[layer] = out_f.create_group("ctrl")
 
             start = 0
             for seqs, ctrls, idx_orig in tqdm(dataloader, disable=(not progress_bar)):
@@ -47,44 +58,53 @@ class PairedControlEmbeddingExtractor:
                 seq_tokens, seq_offsets = self.tokenize(seqs)
                 ctrl_tokens, ctrl_offsets = self.tokenize(ctrls)
 
-                seq_token_emb = self.model_fwd(seq_tokens)
-                ctrl_token_emb = self.model_fwd(ctrl_tokens)
+                seq_token_embs = self.micro_batcher.map(self.model_fwd, seq_tokens)
+                ctrl_token_embs = self.micro_batcher.map(self.model_fwd, ctrl_tokens)
 
-                if self._idx_mode == "variable":
+                if self._idx_mode == "variable" or start == 0:
                     seq_indices = self._offsets_to_indices(seq_offsets, seqs)
-                    seq_indices_dset = seq_grp.require_dataset(
-                        "idx_var", (len(dataset), seq_indices.shape[1]), dtype=np.uint32
-                    )
-                    seq_indices_dset[start:end] = seq_indices
-
                     ctrl_indices = self._offsets_to_indices(ctrl_offsets, ctrls)
-                    ctrl_indices_dset = ctrl_grp.require_dataset(
-                        "idx_var",
-                        (len(dataset), ctrl_indices.shape[1]),
-                        dtype=np.uint32,
-                    )
-                    ctrl_indices_dset[start:end] = ctrl_indices
 
-                elif (start == 0) and (self._idx_mode == "fixed"):
-                    seq_indices = self._offsets_to_indices(seq_offsets, seqs)
-                    seq_indices_dset = seq_grp.create_dataset(
-                        "idx_fix", data=seq_indices, dtype=np.uint32
+                for layer in self.layers:
+                    seq_grp = seq_grps[layer]
+                    ctrl_grp = ctrl_grps[layer]
+                    if self._idx_mode == "variable":
+                        seq_indices_dset = seq_grp.require_dataset(
+                            "idx_var",
+                            (len(dataset), seq_indices.shape[1]),
+                            dtype=np.uint32,
+                        )
+                        seq_indices_dset[start:end] = seq_indices
+
+                        ctrl_indices_dset = ctrl_grp.require_dataset(
+                            "idx_var",
+                            (len(dataset), ctrl_indices.shape[1]),
+                            dtype=np.uint32,
+                        )
+                        ctrl_indices_dset[start:end] = ctrl_indices
+
+                    elif (start == 0) and (self._idx_mode == "fixed"):
+                        seq_indices_dset = seq_grp.create_dataset(
+                            "idx_fix", data=seq_indices, dtype=np.uint32
+                        )
+                        ctrl_indices_dset = ctrl_grp.create_dataset(
+                            "idx_fix", data=ctrl_indices, dtype=np.uint32
+                        )
+
+                    writers[layer].write(
+                        seq_grp, f"emb_{start}_{end}", seq_token_embs[layer]
                     )
-                    ctrl_indices = self._offsets_to_indices(ctrl_offsets, ctrls)
-                    ctrl_indices_dset = ctrl_grp.create_dataset(
-                        "idx_fix", data=ctrl_indices, dtype=np.uint32
+                    writers[layer].write(
+                        ctrl_grp, f"emb_{start}_{end}", ctrl_token_embs[layer]
                     )
 
-                seq_grp.create_dataset(
-                    f"emb_{start}_{end}", data=seq_token_emb.numpy(force=True)
-                )
-                ctrl_grp.create_dataset(
-                    f"emb_{start}_{end}", data=ctrl_token_emb.numpy(force=True)
-                )
-
                 start = end
 
-        os.rename(out_path + ".tmp", out_path)
+            for writer in writers.values():
+                writer.close()
+
+        for layer in self.layers:
+            os.rename(layer_path(out_path, layer) + ".tmp", layer_path(out_path, layer))
 
 
 class SequenceBaselinePairedControlEmbeddingExtractor(
@@ -101,21 +121,14 @@ class SequenceBaselinePairedControlEmbeddingExtractor(
 
 class DNABERT2EmbeddingExtractor(HFEmbeddingExtractor, PairedControlEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"zhihan1996/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(
-            model_name, config=config, trust_remote_code=True
-        )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
         # model = AutoModelForMaskedLM.from_config(config)
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
 class GenaLMEmbeddingExtractor(HFEmbeddingExtractor, PairedControlEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
@@ -123,17 +136,12 @@ class HyenaDNAEmbeddingExtractor(HFEmbeddingExtractor, PairedControlEmbeddingExt
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -148,9 +156,7 @@ class MistralDNAEmbeddingExtractor(
     HFEmbeddingExtractor, PairedControlEmbeddingExtractor
 ):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
@@ -160,15 +166,16 @@ class NucleotideTransformerEmbeddingExtractor(
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -188,17 +195,12 @@ class CaduceusEmbeddingExtractor(HFEmbeddingExtractor, PairedControlEmbeddingExt
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("caduceus", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -29,7 +29,7 @@ if __name__ == "__main__":
     num_workers = 4
     prefetch_factor = 2
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
@@ -82,7 +82,7 @@ if __name__ == "__main__":
     test_dataset = PairedControlDataset(genome_fa, elements_tsv, modes[eval_mode], seed)
 
     model = GENALMLoRAModel(model_name, lora_rank, lora_alpha, lora_dropout, 2)
-    checkpoint_resume = torch.load(checkpoint_path)
+    checkpoint_resume = torch.load(checkpoint_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume, strict=False)
     metrics = evaluate_finetuned_classifier(
         test_dataset,
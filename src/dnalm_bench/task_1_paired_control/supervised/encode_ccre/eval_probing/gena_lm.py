@@ -28,7 +28,7 @@ if __name__ == "__main__":
     num_workers = 0
     prefetch_factor = None
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
@@ -79,7 +79,7 @@ if __name__ == "__main__":
     test_dataset = EmbeddingsDataset(embeddings_h5, elements_tsv, modes[eval_mode])
 
     model = CNNEmbeddingsClassifier(input_channels, hidden_channels, kernel_size)
-    checkpoint_resume = torch.load(checkpoint_path)
+    checkpoint_resume = torch.load(checkpoint_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume, strict=False)
     metrics = evaluate_probing_classifier(
         test_dataset,
@@ -17,7 +17,7 @@ if __name__ == "__main__":
     batch_size = 512
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     out_dir = os.path.join(work_dir, "task_1_ccre/embeddings")
     os.makedirs(out_dir, exist_ok=True)
@@ -0,0 +1,45 @@
+import os
+
+from .....multi_output import MistralDNAMultiOutputExtractor
+from ....components import PairedControlDataset
+from ....zero_shot.evaluators import ZeroShotPairedControlEvaluator
+
+os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+work_dir = os.environ.get("DART_WORK_DIR", "")
+
+if __name__ == "__main__":
+    model_name = "Mistral-DNA-v1-1.6B-hg38"
+    genome_fa = os.path.join(
+        work_dir, "refs/GRCh38_no_alt_analysis_set_GCA_000001405.15.fasta"
+    )
+    elements_tsv = os.path.join(
+        work_dir, "task_1_ccre/processed_inputs/ENCFF420VPZ_processed.tsv"
+    )
+    zero_shot_chroms = ["chr5", "chr10", "chr14", "chr18", "chr20", "chr22"]
+    batch_size = 512
+    num_workers = 0
+    seed = 0
+    device = os.environ.get("DART_DEVICE", "auto")
+
+    # The store doubles as the probing embeddings file
+    out_dir = os.path.join(work_dir, "task_1_ccre/embeddings")
+    os.makedirs(out_dir, exist_ok=True)
+    out_path = os.path.join(out_dir, f"{model_name}.h5")
+
+    dataset = PairedControlDataset(genome_fa, elements_tsv, None, seed)
+    extractor = MistralDNAMultiOutputExtractor(
+        model_name, batch_size, num_workers, device
+    )
+    extractor.extract(dataset, out_path, groups=("seq", "ctrl"), progress_bar=True)
+
+    zero_shot_dir = os.path.join(
+        work_dir, f"task_1_ccre/zero_shot_outputs/likelihoods/{model_name}"
+    )
+    test_dataset = PairedControlDataset(genome_fa, elements_tsv, zero_shot_chroms, seed)
+    metrics = ZeroShotPairedControlEvaluator.evaluate_store(
+        out_path, zero_shot_dir, indices=test_dataset.elements_df["index"].to_numpy()
+    )
+
+    for k, v in metrics.items():
+        print(f"{k}: {v}")
@@ -19,7 +19,7 @@ if __name__ == "__main__":
     num_workers = 0
     prefetch_factor = None
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
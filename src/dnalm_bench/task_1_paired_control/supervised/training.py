@@ -1,22 +1,28 @@
 # from abc import ABCMeta, abstractmethod
+import functools
 import hashlib
 import json
 import math
 import os
 import warnings
 
-import h5py
 import numpy as np
 import polars as pl
 import torch
 import torch.nn.functional as F
-from ncls import NCLS
-from sklearn.metrics import average_precision_score, matthews_corrcoef, roc_auc_score
 from torch.utils.data import DataLoader, IterableDataset, get_worker_info
 
 # from scipy.stats import wilcoxon
 from tqdm import tqdm
 
+from ...collate import BufferRing, collate_embeddings, stack
+from ...devices import resolve_device
+from ...embedding_store import read_embeddings
+from ...utils import lazy_import
+
+h5py = lazy_import("h5py")
+ncls = lazy_import("ncls")
+skmetrics = lazy_import("sklearn.metrics")
 
 
 class EmbeddingsDataset(IterableDataset):
@@ -80,7 +86,7 @@ class EmbeddingsDataset(IterableDataset):
 
         df_sub = self.elements_df.slice(start, end - start)
         valid_inds = df_sub.get_column("region_idx").to_numpy().astype(np.int32)
-        query_struct = NCLS(valid_inds, valid_inds + 1, valid_inds)
+        query_struct = ncls.NCLS(valid_inds, valid_inds + 1, valid_inds)
 
         chunk_start = 0
         with h5py.File(self.embeddings_h5) as h5:
@@ -109,8 +115,12 @@ class EmbeddingsDataset(IterableDataset):
                 if len(chunk_range) == 0:
                     continue
 
-                seq_chunk = h5[f"seq/emb_{chunk_start}_{chunk_end}"][:]
-                ctrl_chunk = h5[f"ctrl/emb_{chunk_start}_{chunk_end}"][:]
+                seq_chunk, seq_scales = read_embeddings(
+                    h5["seq"], f"emb_{chunk_start}_{chunk_end}"
+                )
+                ctrl_chunk, ctrl_scales = read_embeddings(
+                    h5["ctrl"], f"emb_{chunk_start}_{chunk_end}"
+                )
 
                 if not idx_seq_fixed:
                     idx_seq_chunk = h5["seq/idx_var"][chunk_start:chunk_end]
@@ -130,23 +140,26 @@ class EmbeddingsDataset(IterableDataset):
 
                     seq_emb = seq_chunk[i_rel]
                     ctrl_emb = ctrl_chunk[i_rel]
+                    seq_scale = None if seq_scales is None else seq_scales[i_rel]
+                    ctrl_scale = None if ctrl_scales is None else ctrl_scales[i_rel]
 
-                    yield torch.from_numpy(seq_emb), torch.from_numpy(
-                        ctrl_emb
-                    ), torch.from_numpy(seq_inds), torch.from_numpy(ctrl_inds)
+                    # Embeddings stay in their stored encoding until collated
+                    yield seq_emb, ctrl_emb, torch.from_numpy(
+                        seq_inds
+                    ), torch.from_numpy(ctrl_inds), seq_scale, ctrl_scale
 
 
-def _collate_batch(batch):
-    max_seq_len = max(seq_emb.shape[0] for seq_emb, _, _, _ in batch)
-    max_ctrl_len = max(ctrl_emb.shape[0] for _, ctrl_emb, _, _ in batch)
-    seq_embs = torch.zeros(len(batch), max_seq_len, batch[0][0].shape[1])
-    ctrl_embs = torch.zeros(len(batch), max_ctrl_len, batch[0][1].shape[1])
-    for i, (seq_emb, ctrl_emb, _, _) in enumerate(batch):
-        seq_embs[i, : seq_emb.shape[0]] = seq_emb
-        ctrl_embs[i, : ctrl_emb.shape[0]] = ctrl_emb
+def _collate_batch(batch, ring=None):
+    slot = None if ring is None else ring.acquire()
+    seq_embs = collate_embeddings(
+        [b[0] for b in batch], [b[4] for b in batch], ring, slot, "seq_embs"
+    )
+    ctrl_embs = collate_embeddings(
+        [b[1] for b in batch], [b[5] for b in batch], ring, slot, "ctrl_embs"
+    )
 
-    seq_inds = torch.stack([seq_inds for _, _, seq_inds, _ in batch])
-    ctrl_inds = torch.stack([ctrl_inds for _, _, _, ctrl_inds in batch])
+    seq_inds = stack([b[2] for b in batch], ring, slot, "seq_inds")
+    ctrl_inds = stack([b[3] for b in batch], ring, slot, "ctrl_inds")
 
     return seq_embs, ctrl_embs, seq_inds, ctrl_inds
 
@@ -172,15 +185,18 @@ def train_classifier(
     progress_bar=False,
     resume_from=None,
 ):
+    device = resolve_device(device, num_workers)
     persistent_workers = True
     if num_workers == 0:
         persistent_workers = False
+    train_ring = BufferRing(device)
+    val_ring = BufferRing(device)
     train_dataloader = DataLoader(
         train_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        collate_fn=_collate_batch,
-        pin_memory=True,
+        collate_fn=functools.partial(_collate_batch, ring=train_ring),
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=persistent_workers,
     )
@@ -188,8 +204,8 @@ def train_classifier(
         val_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        collate_fn=_collate_batch,
-        pin_memory=True,
+        collate_fn=functools.partial(_collate_batch, ring=val_ring),
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=persistent_workers,
     )
@@ -209,10 +225,10 @@ def train_classifier(
         resume_checkpoint_path = os.path.join(out_dir, f"checkpoint_{resume_from}.pt")
         optimizer_checkpoint_path = os.path.join(out_dir, f"optimizer_{resume_from}.pt")
         start_epoch = resume_from + 1
-        checkpoint_resume = torch.load(resume_checkpoint_path)
+        checkpoint_resume = torch.load(resume_checkpoint_path, map_location="cpu")
         model.load_state_dict(checkpoint_resume, strict=False)
         try:
-            optimizer_resume = torch.load(optimizer_checkpoint_path)
+            optimizer_resume = torch.load(optimizer_checkpoint_path, map_location="cpu")
             optimizer.load_state_dict(optimizer_resume)
         except FileNotFoundError:
             warnings.warn(
@@ -232,10 +248,9 @@ def train_classifier(
             for i, (seq_emb, ctrl_emb, seq_inds, ctrl_inds) in enumerate(
                 tqdm(train_dataloader, disable=(not progress_bar), desc="train")
             ):
-                seq_emb = seq_emb.to(device)
-                ctrl_emb = ctrl_emb.to(device)
-                seq_inds = seq_inds.to(device)
-                ctrl_inds = ctrl_inds.to(device)
+                seq_emb, ctrl_emb, seq_inds, ctrl_inds = train_ring.to_device(
+                    (seq_emb, ctrl_emb, seq_inds, ctrl_inds), device
+                )
 
                 # seq_emb = _detokenize(seq_emb, seq_inds, device)
                 # ctrl_emb = _detokenize(ctrl_emb, ctrl_inds, device)
@@ -258,10 +273,9 @@ def train_classifier(
                 for i, (seq_emb, ctrl_emb, seq_inds, ctrl_inds) in enumerate(
                     tqdm(val_dataloader, disable=(not progress_bar), desc="val")
                 ):
-                    seq_emb = seq_emb.to(device)
-                    ctrl_emb = ctrl_emb.to(device)
-                    seq_inds = seq_inds.to(device)
-                    ctrl_inds = ctrl_inds.to(device)
+                    seq_emb, ctrl_emb, seq_inds, ctrl_inds = val_ring.to_device(
+                        (seq_emb, ctrl_emb, seq_inds, ctrl_inds), device
+                    )
 
                     # seq_emb = _detokenize(seq_emb, seq_inds, device)
                     # ctrl_emb = _detokenize(ctrl_emb, ctrl_inds, device)
@@ -300,13 +314,15 @@ def evaluate_probing_classifier(
     device,
     progress_bar=False,
 ):
+    device = resolve_device(device, num_workers)
+    test_ring = BufferRing(device)
     test_dataloader = DataLoader(
         test_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
-        collate_fn=_collate_batch,
+        collate_fn=functools.partial(_collate_batch, ring=test_ring),
     )
 
     zero = torch.tensor(0, dtype=torch.long, device=device)[None]
@@ -329,20 +345,23 @@ def evaluate_probing_classifier(
     test_acc_paired = 0
     pred_log_probs = []
     labels = []
+    seq_logits = []
+    ctrl_logits = []
     for i, (seq_emb, ctrl_emb, seq_inds, ctrl_inds) in enumerate(
         tqdm(test_dataloader, disable=(not progress_bar), desc="train", ncols=120)
     ):
-        with torch.no_grad():
-            seq_emb = seq_emb.to(device)
-            ctrl_emb = ctrl_emb.to(device)
-            seq_inds = seq_inds.to(device)
-            ctrl_inds = ctrl_inds.to(device)
+        with torch.inference_mode():
+            seq_emb, ctrl_emb, seq_inds, ctrl_inds = test_ring.to_device(
+                (seq_emb, ctrl_emb, seq_inds, ctrl_inds), device
+            )
 
             out_seq = model(seq_emb, seq_inds)
             out_ctrl = model(ctrl_emb, ctrl_inds)
 
             pred_log_probs.append(F.log_softmax(out_seq, dim=1))
             pred_log_probs.append(F.log_softmax(out_ctrl, dim=1))
+            seq_logits.append(out_seq[:, 1] - out_seq[:, 0])
+            ctrl_logits.append(out_ctrl[:, 1] - out_ctrl[:, 0])
             labels.append(one.expand(out_seq.shape[0]))
             labels.append(zero.expand(out_ctrl.shape[0]))
             loss_seq = criterion(out_seq, one.expand(out_seq.shape[0]))
@@ -360,9 +379,9 @@ def evaluate_probing_classifier(
     test_acc = (pred_log_probs.argmax(axis=1) == labels).sum().item() / (
         len(test_dataloader.dataset) * 2
     )
-    test_auroc = roc_auc_score(labels, pred_logits)
-    test_auprc = average_precision_score(labels, pred_logits)
-    test_mcc = matthews_corrcoef(labels, pred_log_probs.argmax(axis=1))
+    test_auroc = skmetrics.roc_auc_score(labels, pred_logits)
+    test_auprc = skmetrics.average_precision_score(labels, pred_logits)
+    test_mcc = skmetrics.matthews_corrcoef(labels, pred_log_probs.argmax(axis=1))
 
     metrics["test_loss"] = test_loss
     metrics["test_acc"] = test_acc
@@ -374,6 +393,16 @@ def evaluate_probing_classifier(
     with open(out_path, "w") as f:
         json.dump(metrics, f, indent=4)
 
+    # Per-pair scores for bootstrap confidence intervals
+    scores_path = os.path.splitext(out_path)[0] + "_scores.tsv"
+    scores = pl.DataFrame(
+        {
+            "seq_logit": torch.cat(seq_logits).numpy(force=True),
+            "ctrl_logit": torch.cat(ctrl_logits).numpy(force=True),
+        }
+    )
+    scores.write_csv(scores_path, separator="\t")
+
     return metrics
 
 
@@ -435,7 +464,6 @@ class LargeCNNClassifierBase(torch.nn.Module):
         return embs
 
     def forward(self, embs, inds):
-        torch.cuda.synchronize()
         x = self._detokenize(embs, inds)
         x = x.swapaxes(1, 2)
 
@@ -5,6 +5,8 @@ from ..evaluators import CaduceusEvaluator, PairedControlDataset
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 work_dir = os.environ.get("DART_WORK_DIR", "")
+# Score only the tokens overlapping each element rather than whole windows
+element_only = os.environ.get("DART_ELEMENT_ONLY", "0") == "1"
 
 if __name__ == "__main__":
     model_name = "caduceus-ps_seqlen-131k_d_model-256_n_layer-16"
@@ -16,8 +18,9 @@ if __name__ == "__main__":
         work_dir, "task_1_ccre/processed_inputs/ENCFF420VPZ_processed.tsv"
     )
 
+    scores_dir = "likelihoods_element_only" if element_only else "likelihoods"
     out_dir = os.path.join(
-        work_dir, f"task_1_ccre/zero_shot_outputs/likelihoods/{model_name}"
+        work_dir, f"task_1_ccre/zero_shot_outputs/{scores_dir}/{model_name}"
     )
 
     chroms = ["chr5", "chr10", "chr14", "chr18", "chr20", "chr22"]
@@ -25,11 +28,13 @@ if __name__ == "__main__":
     batch_size = 2048
     num_workers = 4
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
-    dataset = PairedControlDataset(genome_fa, elements_tsv, chroms, seed)
+    dataset = PairedControlDataset(
+        genome_fa, elements_tsv, chroms, seed, return_element_span=element_only
+    )
     evaluator = CaduceusEvaluator(model_name, dataset, batch_size, num_workers, device)
-    metrics = evaluator.evaluate(out_dir, progress_bar=True)
+    metrics = evaluator.evaluate(out_dir, progress_bar=True, element_only=element_only)
 
     for k, v in metrics.items():
         print(f"{k}: {v}")
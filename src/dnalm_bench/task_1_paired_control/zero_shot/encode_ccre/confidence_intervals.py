@@ -1,49 +1,43 @@
-import json
 import os
 
-from statsmodels.stats.proportion import proportion_confint
+import polars as pl
 
-root_output_dir = os.environ.get("DART_WORK_DIR", "")
-
-hyena_table = os.path.join(
-    root_output_dir,
-    "task_1_ccre/zero_shot_outputs/likelihoods/hyenadna-large-1m-seqlen-hf/metrics.json",
-)
-with open(hyena_table, "r") as f:
-    hyena_data = json.load(f)
-
-gena_table = os.path.join(
-    root_output_dir,
-    "task_1_ccre/zero_shot_outputs/likelihoods/gena-lm-bert-large-t2t/metrics.json",
-)
-with open(gena_table, "r") as f:
-    gena_data = json.load(f)
-
-dnabert_table = os.path.join(
-    root_output_dir,
-    "task_1_ccre/zero_shot_outputs/likelihoods/DNABERT-2-117M/metrics.json",
+from ....bootstrap import (
+    bootstrap_ci,
+    format_interval,
+    paired_score_statistics,
+    write_intervals,
 )
-with open(dnabert_table, "r") as f:
-    dnabert_data = json.load(f)
-
-nt_table = os.path.join(
-    root_output_dir,
-    "task_1_ccre/zero_shot_outputs/likelihoods/nucleotide-transformer-v2-500m-multi-species/metrics.json",
-)
-with open(nt_table, "r") as f:
-    nt_data = json.load(f)
-
-
-def get_confidence_interval(data, num_ccres):
-    conf_int = proportion_confint(data["acc"] * num_ccres, num_ccres, method="normal")
-    interval = conf_int[1] - conf_int[0]
-    error = interval / 2
-    mean = (conf_int[1] + conf_int[0]) / 2
-    return f"{mean:.3f} \pm {error:.3f}"
 
+root_output_dir = os.environ.get("DART_WORK_DIR", "")
 
-num_ccres = (2348855 - 1) * 2
-print("DNABert2", get_confidence_interval(dnabert_data, num_ccres))
-print("Gena LM", get_confidence_interval(gena_data, num_ccres))
-print("Hyena DNA", get_confidence_interval(hyena_data, num_ccres))
-print("Nuc Transformer", get_confidence_interval(nt_data, num_ccres))
+num_replicates = 1000
+num_workers = 0
+seed = 0
+
+model_names = {
+    "DNABert2": "DNABERT-2-117M",
+    "Gena LM": "gena-lm-bert-large-t2t",
+    "Hyena DNA": "hyenadna-large-1m-seqlen-hf",
+    "Nuc Transformer": "nucleotide-transformer-v2-500m-multi-species",
+}
+
+for name, model_name in model_names.items():
+    out_dir = os.path.join(
+        root_output_dir, f"task_1_ccre/zero_shot_outputs/likelihoods/{model_name}"
+    )
+    scores = pl.read_csv(os.path.join(out_dir, "scores.tsv"), separator="\t")
+
+    statistics = paired_score_statistics(
+        scores["seq_score"].to_numpy(), scores["ctrl_score"].to_numpy()
+    )
+    intervals = bootstrap_ci(
+        statistics,
+        scores.height,
+        num_replicates=num_replicates,
+        seed=seed,
+        num_workers=num_workers,
+    )
+    write_intervals(intervals, os.path.join(out_dir, "metrics_ci.json"))
+
+    print(name, format_interval(intervals["acc"], precision=3))
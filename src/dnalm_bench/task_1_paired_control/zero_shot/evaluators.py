@@ -3,23 +3,26 @@ import os
 from abc import ABCMeta, abstractmethod
 
 import numpy as np
+import polars as pl
 import torch
 import torch.nn.functional as F
-from scipy.stats import wilcoxon
 from torch.utils.data import DataLoader
 from tqdm import tqdm
-from transformers import (
-    AutoModel,
-    AutoModelForCausalLM,
-    AutoModelForMaskedLM,
-    AutoTokenizer,
-    BertConfig,
-)
 
-from ...utils import NoModule, onehot_to_chars
+from ...devices import resolve_device
+from ...embeddings import HiddenStateCapture, find_lm_head
+from ...microbatch import MicroBatched
+from ...models import load_native_tokenizer, load_pretrained
+from ...multi_output import read_store
+from ...score_writer import ScoreWriter
+from ...utils import lazy_import, onehot_to_chars
+
+stats = lazy_import("scipy.stats")
 
 
 class MaskedZeroShotScore(metaclass=ABCMeta):
+    _use_attention_mask = True
+
     @property
     @abstractmethod
     def mask_token(self):
@@ -32,16 +35,38 @@ class MaskedZeroShotScore(metaclass=ABCMeta):
         lls = torch.zeros(tokens.shape[:2], device=self.device)
         for i in range(tokens.shape[1]):
             clip_mask = ((i >= starts) & (i < ends)).to(device=self.device)
+            if not clip_mask.any():
+                continue
             masked_tokens = tokens.clone()
             masked_tokens[:, i, ...] = self.mask_token
             lls[:, i] = (
-                self.model_fwd(masked_tokens, attention_mask, tokens)[:, i] * clip_mask
+                self.masked_position_fwd(masked_tokens, attention_mask, tokens, i)
+                * clip_mask
             )
 
         out = lls.sum(dim=1).numpy(force=True)
 
         return out
 
+    def masked_position_fwd(self, tokens_in, attention_mask, tokens_out, position):
+        """
+        Log-likelihoods of tokens_out at a single masked position. The LM head
+        is applied to the backbone output at that position only, rather than
+        projecting every position onto the vocabulary.
+        """
+        if not self._use_attention_mask:
+            attention_mask = None
+        capture = HiddenStateCapture(self.model)
+        with torch.inference_mode():
+            hidden = capture(tokens_in, attention_mask=attention_mask)[-1]
+            logits = find_lm_head(self.model)(hidden[:, position : position + 1])
+            lls = -F.cross_entropy(
+                logits.swapaxes(1, 2),
+                tokens_out[:, position : position + 1],
+                reduction="none",
+            )
+        return lls[:, 0]
+
 
 class CausalZeroShotScore(metaclass=ABCMeta):
     def score(self, tokens, starts, ends, attention_mask):
@@ -61,7 +86,7 @@ class CausalZeroShotScore(metaclass=ABCMeta):
         return out
 
 
-class ZeroShotPairedControlEvaluator(metaclass=ABCMeta):
+class ZeroShotPairedControlEvaluator(MicroBatched, metaclass=ABCMeta):
     @abstractmethod
     def __init__(self, dataset, batch_size, num_workers, device):
         self.dataset = dataset
@@ -69,10 +94,15 @@ class ZeroShotPairedControlEvaluator(metaclass=ABCMeta):
             self.dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers
         )
 
-        self.device = device
+        self.device = resolve_device(device, num_workers)
 
     @abstractmethod
-    def tokenize(self, seqs):
+    def tokenize(self, seqs, return_offsets=False):
+        """
+        Tokens, scored token ranges (starts, ends) and attention mask of
+        seqs, followed with return_offsets by the (batch, tokens, 2) base
+        ranges covered by each token, (0, 0) for special and padding tokens
+        """
         pass
 
     @abstractmethod
@@ -83,21 +113,67 @@ class ZeroShotPairedControlEvaluator(metaclass=ABCMeta):
     # def score(self, tokens, starts, ends, attention_mask):
     #     pass
 
-    def evaluate(self, out_dir, progress_bar=False):
+    @staticmethod
+    def element_token_spans(offsets, spans):
+        """
+        Token index ranges [start, end) of the tokens overlapping each
+        element's base span, as returned by a PairedControlDataset with
+        return_element_span=True, given the token offsets from tokenize.
+        Tokens overlapping a contiguous span are themselves contiguous.
+        """
+        overlap = (
+            (offsets[..., 0] < spans[:, 1:2])
+            & (offsets[..., 1] > spans[:, 0:1])
+            & (offsets[..., 1] > offsets[..., 0])
+        )
+        found = overlap.any(dim=1)
+        starts = overlap.int().argmax(dim=1)
+        ends = overlap.shape[1] - overlap.flip(1).int().argmax(dim=1)
+
+        return starts * found, ends * found
+
+    def evaluate(self, out_dir, progress_bar=False, resume=False, element_only=False):
+        """
+        Scores every sequence and its control and writes the scores and
+        summary metrics to out_dir. With element_only, only tokens overlapping
+        the element are scored instead of everything between the special
+        tokens, which skips the masked forwards over the shared flanks.
+        """
         os.makedirs(out_dir, exist_ok=True)
         scores_path = os.path.join(out_dir, "scores.tsv")
         metrics_path = os.path.join(out_dir, "metrics.json")
 
-        with open(scores_path, "w") as f:
-            f.write("idx\tseq_score\tctrl_score\n")
-
-            metrics = {}
-            diffs_lst = []
-            corrects_lst = []
+        writer = ScoreWriter(
+            scores_path,
+            {"idx": pl.Int64, "seq_score": pl.Float32, "ctrl_score": pl.Float32},
+            resume=resume,
+        )
+        dataloader = self.dataloader
+        if writer.rows_written > 0:
+            dataloader = DataLoader(
+                writer.remaining(self.dataset),
+                batch_size=self.dataloader.batch_size,
+                shuffle=False,
+                num_workers=self.dataloader.num_workers,
+            )
 
-            for seqs, ctrls, inds in tqdm(
-                self.dataloader, disable=(not progress_bar), ncols=120
-            ):
+        for batch in tqdm(dataloader, disable=(not progress_bar), ncols=120):
+            seqs, ctrls, inds = batch[:3]
+            if element_only:
+                if len(batch) < 4:
+                    raise ValueError(
+                        "element_only requires a dataset with return_element_span=True"
+                    )
+                spans = batch[3]
+                seq_tokens, _, _, seq_attention_mask, seq_offsets = self.tokenize(
+                    seqs, return_offsets=True
+                )
+                ctrl_tokens, _, _, ctrl_attention_mask, ctrl_offsets = self.tokenize(
+                    ctrls, return_offsets=True
+                )
+                seq_starts, seq_ends = self.element_token_spans(seq_offsets, spans)
+                ctrl_starts, ctrl_ends = self.element_token_spans(ctrl_offsets, spans)
+            else:
                 seq_tokens, seq_starts, seq_ends, seq_attention_mask = self.tokenize(
                     seqs
                 )
@@ -105,29 +181,31 @@ class ZeroShotPairedControlEvaluator(metaclass=ABCMeta):
                     self.tokenize(ctrls)
                 )
 
-                seq_scores = self.score(
-                    seq_tokens, seq_starts, seq_ends, seq_attention_mask
-                )
-                ctrl_scores = self.score(
-                    ctrl_tokens, ctrl_starts, ctrl_ends, ctrl_attention_mask
-                )
+            seq_scores = self.micro_batcher.map(
+                self.score, seq_tokens, seq_starts, seq_ends, seq_attention_mask
+            )
+            ctrl_scores = self.micro_batcher.map(
+                self.score, ctrl_tokens, ctrl_starts, ctrl_ends, ctrl_attention_mask
+            )
 
-                for ind, seq_score, ctrl_score in zip(inds, seq_scores, ctrl_scores):
-                    f.write(f"{ind}\t{seq_score}\t{ctrl_score}\n")
-                f.flush()
+            writer.append(
+                idx=inds.numpy(), seq_score=seq_scores, ctrl_score=ctrl_scores
+            )
 
-                diff_batch = seq_scores - ctrl_scores
-                correct_batch = diff_batch > 0
+        scores = writer.close()
 
-                diffs_lst.append(diff_batch)
-                corrects_lst.append(correct_batch)
+        return self._write_metrics(scores, metrics_path)
 
-            diffs = np.concatenate(diffs_lst)
-            corrects = np.concatenate(corrects_lst)
+    @staticmethod
+    def _write_metrics(scores, metrics_path):
+        metrics = {}
+
+        diffs = (scores["seq_score"] - scores["ctrl_score"]).to_numpy()
+        corrects = diffs > 0
 
         metrics["acc"] = corrects.mean()
 
-        wilcox = wilcoxon(diffs, alternative="greater")
+        wilcox = stats.wilcoxon(diffs, alternative="greater")
         metrics["pval"] = float(wilcox.pvalue)
         metrics["signed_rank_sum"] = float(wilcox.statistic)
         metrics["mean_diff"] = float(diffs.mean())
@@ -142,13 +220,47 @@ class ZeroShotPairedControlEvaluator(metaclass=ABCMeta):
 
         return metrics
 
+    @classmethod
+    def evaluate_store(cls, store_path, out_dir, indices=None):
+        """
+        Scores and metrics from the summed likelihoods of a multi-output
+        store of a causal model, restricted to the given element indices
+        (e.g. the rows of a PairedControlDataset over the test chromosomes)
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        scores_path = os.path.join(out_dir, "scores.tsv")
+        metrics_path = os.path.join(out_dir, "metrics.json")
+
+        idx = read_store(store_path, None, "idx")
+        seq_scores = read_store(store_path, "seq", "likelihood")
+        ctrl_scores = read_store(store_path, "ctrl", "likelihood")
+        if indices is not None:
+            keep = np.isin(idx, indices)
+            idx, seq_scores, ctrl_scores = (
+                idx[keep],
+                seq_scores[keep],
+                ctrl_scores[keep],
+            )
+
+        writer = ScoreWriter(
+            scores_path,
+            {"idx": pl.Int64, "seq_score": pl.Float32, "ctrl_score": pl.Float32},
+        )
+        writer.append(idx=idx, seq_score=seq_scores, ctrl_score=ctrl_scores)
+        scores = writer.close()
+
+        return cls._write_metrics(scores, metrics_path)
+
 
 class HFZeroShotEvaluator(ZeroShotPairedControlEvaluator, metaclass=ABCMeta):
+    # Vectorized tokenizer used instead of the HF one where available
+    native_tokenizer = None
+
     def __init__(self, tokenizer, model, dataset, batch_size, num_workers, device):
         self.tokenizer = tokenizer
         self.model = model
-        self.model.to(device)
         super().__init__(dataset, batch_size, num_workers, device)
+        self.model.to(self.device)
 
     @property
     @abstractmethod
@@ -164,13 +276,24 @@ class HFZeroShotEvaluator(ZeroShotPairedControlEvaluator, metaclass=ABCMeta):
     def mask_token(self):
         return self.tokenizer.mask_token_id
 
-    def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer.batch_encode_plus(
-            seqs_str, return_tensors="pt", padding=True
-        )
-        tokens = encoded["input_ids"]
-        attention_mask = encoded.get("attention_mask")
+    def tokenize(self, seqs, return_offsets=False):
+        offsets = None
+        if self.native_tokenizer is not None:
+            tokens = self.native_tokenizer(seqs)
+            attention_mask = torch.ones_like(tokens)
+            if return_offsets:
+                offsets = self.native_tokenizer.offsets(seqs)
+        else:
+            seqs_str = onehot_to_chars(seqs)
+            encoded = self.tokenizer(
+                seqs_str,
+                return_tensors="pt",
+                padding=True,
+                return_offsets_mapping=return_offsets,
+            )
+            tokens = encoded["input_ids"]
+            attention_mask = encoded.get("attention_mask")
+            offsets = encoded.get("offset_mapping")
         if self.start_token is not None:
             starts = torch.where(tokens == self.start_token)[1] + 1
         else:
@@ -180,10 +303,13 @@ class HFZeroShotEvaluator(ZeroShotPairedControlEvaluator, metaclass=ABCMeta):
         else:
             ends = attention_mask.sum(dim=1)
 
+        if return_offsets:
+            return tokens, starts, ends, attention_mask, offsets
+
         return tokens, starts, ends, attention_mask
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
                 attention_mask=attention_mask,
@@ -195,15 +321,7 @@ class HFZeroShotEvaluator(ZeroShotPairedControlEvaluator, metaclass=ABCMeta):
 
 class DNABERT2Evaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, dataset, batch_size, num_workers, device):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-            model = AutoModelForMaskedLM.from_pretrained(
-                model_name, config=config, trust_remote_code=True
-            )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
         super().__init__(tokenizer, model, dataset, batch_size, num_workers, device)
 
     @property
@@ -217,9 +335,7 @@ class DNABERT2Evaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
 
 class GenaLMEvaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, dataset, batch_size, num_workers, device):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         super().__init__(tokenizer, model, dataset, batch_size, num_workers, device)
 
     @property
@@ -233,12 +349,9 @@ class GenaLMEvaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
 
 class HDEvaluator(HFZeroShotEvaluator, CausalZeroShotScore):
     def __init__(self, model_name, dataset, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, dataset, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     @property
     def start_token(self):
@@ -249,7 +362,7 @@ class HDEvaluator(HFZeroShotEvaluator, CausalZeroShotScore):
         return 1
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
             )
@@ -262,13 +375,12 @@ class HDEvaluator(HFZeroShotEvaluator, CausalZeroShotScore):
 
 
 class CaduceusEvaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
+    _use_attention_mask = False
+
     def __init__(self, model_name, dataset, batch_size, num_workers, device):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("caduceus", model_name, "masked_lm")
         super().__init__(tokenizer, model, dataset, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     @property
     def start_token(self):
@@ -279,7 +391,7 @@ class CaduceusEvaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
         return 1
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(tokens_in)
             logits = torch_outs.logits.swapaxes(1, 2)
             lls = -F.cross_entropy(logits, tokens_out, reduction="none")
@@ -288,9 +400,7 @@ class CaduceusEvaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
 
 class MistralEvaluator(HFZeroShotEvaluator, CausalZeroShotScore):
     def __init__(self, model_name, dataset, batch_size, num_workers, device):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
         super().__init__(tokenizer, model, dataset, batch_size, num_workers, device)
 
     @property
@@ -302,7 +412,7 @@ class MistralEvaluator(HFZeroShotEvaluator, CausalZeroShotScore):
         return 2
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
                 attention_mask=attention_mask,
@@ -317,10 +427,13 @@ class MistralEvaluator(HFZeroShotEvaluator, CausalZeroShotScore):
 
 class NTEvaluator(HFZeroShotEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, dataset, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, dataset, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     @property
     def start_token(self):
@@ -3,15 +3,19 @@ import hashlib
 import os
 
 import numpy as np
-import pandas as pd
 import polars as pl
-import pyfaidx
 import torch
 from torch.utils.data import Dataset
 
 # from scipy.stats import wilcoxon
 # from tqdm import tqdm
-from ..utils import copy_if_not_exists, one_hot_encode
+from ..utils import copy_if_not_exists, lazy_import, one_hot_encode
+from .dataset_generators.transcription_factor_binding.motif_footprinting_dataset import (
+    read_meme,
+)
+
+pyfaidx = lazy_import("pyfaidx")
+pd = lazy_import("pandas")
 
 
 class SimpleSequence(Dataset):
@@ -103,6 +107,8 @@ class VariantDataset(Dataset):
 
     _seed_upper = 2**128
 
+    window = 2114
+
     def __init__(self, genome_fa, elements_tsv, chroms, seed):
         super().__init__()
 
@@ -136,7 +142,7 @@ class VariantDataset(Dataset):
         # 1-indexed position
         pos = int(pos) - 1
         # Extract the sequence
-        window = 2114
+        window = self.window
         sequence_extension = int(window / 2)
         allele1_seq = np.zeros((window, 4), dtype=np.int8)
         allele2_seq = np.zeros((window, 4), dtype=np.int8)
@@ -209,3 +215,111 @@ class FootprintingDataset(Dataset):
     def __getitem__(self, idx):
         seq = self.seq_table.loc[idx, 1]
         return torch.from_numpy(one_hot_encode(seq))
+
+
+class MotifFootprintingDataset(Dataset):
+    """
+    Lazy equivalent of FootprintingDataset. Only the base sequences and motif
+    consensus tokens are held in memory, and each raw, motif-inserted or
+    shuffled-motif sequence is built on the fly. Items are ordered as in the
+    file written by motif_footprinting_dataset.compile_seqs, with IDs given
+    by item_id.
+    """
+
+    _seq_tokens = np.array([0, 1, 2, 3], dtype=np.int8)
+
+    _seed_upper = 2**128
+
+    _variants = [
+        ("forward", "true"),
+        ("forward", "shuffled"),
+        ("reverse", "true"),
+        ("reverse", "shuffled"),
+    ]
+
+    def __init__(self, seqs, meme_file, seed):
+        super().__init__()
+
+        self.seed = seed
+
+        with open(seqs, "r") as f:
+            self.seq_tokens = np.stack(
+                [self._encode_tokens(line.strip()) for line in f if line.strip()]
+            )
+
+        motif_dict = read_meme(meme_file)
+        self.motif_names = list(motif_dict.keys())
+        self.motif_tokens = [
+            self._encode_tokens(motif_dict[m]) for m in self.motif_names
+        ]
+
+        self._items_per_seq = 2 + len(self._variants) * len(self.motif_names)
+
+    @classmethod
+    def _encode_tokens(cls, seq):
+        one_hot = one_hot_encode(seq)
+        # Non-ACGT bases are stored as token 4, which decodes to an all-zero row
+        tokens = np.where(one_hot.any(axis=1), one_hot.argmax(axis=1), 4)
+
+        return tokens.astype(np.int8)
+
+    def _shuffle_motif(self, row, motif_ind):
+        motif = self.motif_tokens[motif_ind]
+
+        item_bytes = (
+            (self.seed, row, self.motif_names[motif_ind]).__repr__().encode("utf-8")
+        )
+        item_seed = int(hashlib.sha256(item_bytes).hexdigest(), 16) % self._seed_upper
+        rng = np.random.default_rng(item_seed)
+
+        shuffled = motif
+        if np.unique(motif).size > 1:
+            while np.array_equal(shuffled, motif):
+                shuffled = motif[rng.permutation(len(motif))]
+
+        return shuffled
+
+    def _locate(self, idx):
+        row, offset = divmod(idx, self._items_per_seq)
+        if offset < 2:
+            return row, None, ("forward", "reverse")[offset], "raw"
+
+        motif_ind, variant = divmod(offset - 2, len(self._variants))
+        orientation, kind = self._variants[variant]
+
+        return row, motif_ind, orientation, kind
+
+    def item_id(self, idx):
+        row, motif_ind, orientation, kind = self._locate(idx)
+        if motif_ind is None:
+            return f"{row}_raw_{orientation}"
+
+        return f"{row}_{self.motif_names[motif_ind]}_{orientation}_{kind}"
+
+    def ids(self):
+        return [self.item_id(idx) for idx in range(len(self))]
+
+    def __len__(self):
+        return self.seq_tokens.shape[0] * self._items_per_seq
+
+    def __getitem__(self, idx):
+        row, motif_ind, orientation, kind = self._locate(idx)
+
+        tokens = self.seq_tokens[row]
+        if motif_ind is not None:
+            if kind == "true":
+                motif = self.motif_tokens[motif_ind]
+            else:
+                motif = self._shuffle_motif(row, motif_ind)
+
+            # Replace the middle of the sequence with the motif
+            insert_loc = len(tokens) // 2 - len(motif) // 2
+            tokens = tokens.copy()
+            tokens[insert_loc : insert_loc + len(motif)] = motif
+
+        seq = (tokens[:, None] == self._seq_tokens[None, :]).astype(np.int8)
+
+        if orientation == "reverse":
+            seq = seq[::-1, ::-1].copy()
+
+        return torch.from_numpy(seq)
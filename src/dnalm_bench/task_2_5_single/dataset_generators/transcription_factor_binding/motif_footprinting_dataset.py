@@ -3,9 +3,6 @@ import random
 
 import numpy as np
 
-np.random.seed(0)
-random.seed(0)
-
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Given a set of negative regions, ")
@@ -19,6 +16,11 @@ def parse_args():
     parser.add_argument(
         "--meme_file", type=str, required=True, help="Meme file containing motif PWMs"
     )
+    parser.add_argument(
+        "--ids_only",
+        action="store_true",
+        help="Only write the sequence IDs, for use with MotifFootprintingDataset",
+    )
     args = parser.parse_args()
     return args
 
@@ -130,6 +132,30 @@ def compile_seqs(seq_file, motif_dict):
     return overall_seq_dict
 
 
+def compile_ids(seq_file, motif_dict):
+    """
+    Obtains the IDs of all insertions for all sequences, in the same order as compile_seqs
+    """
+    ids = []
+    seq_file_obj = open(seq_file, "r")
+    for row, _ in enumerate(seq_file_obj):
+        ids.append(str(row) + "_" + "raw" + "_forward")
+        ids.append(str(row) + "_" + "raw" + "_reverse")
+        for motif in motif_dict:
+            ids.append(str(row) + "_" + motif + "_forward_true")
+            ids.append(str(row) + "_" + motif + "_forward_shuffled")
+            ids.append(str(row) + "_" + motif + "_reverse_true")
+            ids.append(str(row) + "_" + motif + "_reverse_shuffled")
+    return ids
+
+
+def write_ids_to_file(ids, out_file):
+    file_out = open(out_file, "w")
+    for seq_id in ids:
+        file_out.write(seq_id + "\n")
+    file_out.close()
+
+
 def write_to_file(overall_seq_dict, out_file):
     file_out = open(out_file, "w")
     for seq in overall_seq_dict:
@@ -138,8 +164,14 @@ def write_to_file(overall_seq_dict, out_file):
 
 
 def main():
+    np.random.seed(0)
+    random.seed(0)
+
     args = parse_args()
     motif_dict = read_meme(args.meme_file)
+    if args.ids_only:
+        write_ids_to_file(compile_ids(args.input_seqs, motif_dict), args.output_file)
+        return
     inserted_seqs_dict = compile_seqs(args.input_seqs, motif_dict)
     write_to_file(inserted_seqs_dict, args.output_file)
 
@@ -1,21 +1,21 @@
+import contextlib
 import os
 
-import h5py
 import numpy as np
 import torch
 from torch.utils.data import DataLoader
 from tqdm import tqdm
-from transformers import (
-    AutoConfig,
-    AutoModel,
-    AutoModelForCausalLM,
-    AutoModelForMaskedLM,
-    AutoTokenizer,
-    BertConfig,
+
+from ..embedding_store import EmbeddingWriter
+from ..embeddings import (
+    HFEmbeddingExtractor,
+    SequenceBaselineEmbeddingExtractor,
+    layer_path,
 )
+from ..models import load_native_tokenizer, load_pretrained
+from ..utils import lazy_import
 
-from ..embeddings import HFEmbeddingExtractor, SequenceBaselineEmbeddingExtractor
-from ..utils import NoModule, onehot_to_chars
+h5py = lazy_import("h5py")
 
 
 class SimpleEmbeddingExtractor:
@@ -38,8 +38,17 @@ class SimpleEmbeddingExtractor:
             num_workers=self.num_workers,
         )
 
-        with h5py.File(out_path + ".tmp", "w") as out_f:
-            seq_grp = out_f.create_group("seq")
+        with contextlib.ExitStack() as stack:
+            writers = {}
+            seq_grps = {}
+            for layer in self.layers:
+                out_f = stack.enter_context(
+                    h5py.File(layer_path(out_path, layer) + ".tmp", "w")
+                )
+                writers[layer] = EmbeddingWriter(
+                    out_f, self.store_dtype, self.store_dim, self.store_projection
+                )
+                seq_grps[layer] = out_f.create_group("seq")
 
             start = 0
             for seqs in tqdm(dataloader, disable=(not progress_bar)):
@@ -47,28 +56,36 @@ class SimpleEmbeddingExtractor:
 
                 seq_tokens, seq_offsets = self.tokenize(seqs)
 
-                seq_token_emb = self.model_fwd(seq_tokens)
+                seq_token_embs = self.micro_batcher.map(self.model_fwd, seq_tokens)
 
-                if self._idx_mode == "variable":
+                if self._idx_mode == "variable" or start == 0:
                     seq_indices = self._offsets_to_indices(seq_offsets, seqs)
-                    seq_indices_dset = seq_grp.require_dataset(
-                        "idx_var", (len(dataset), seq_indices.shape[1]), dtype=np.uint32
-                    )
-                    seq_indices_dset[start:end] = seq_indices
 
-                elif (start == 0) and (self._idx_mode == "fixed"):
-                    seq_indices = self._offsets_to_indices(seq_offsets, seqs)
-                    seq_indices_dset = seq_grp.create_dataset(
-                        "idx_fix", data=seq_indices, dtype=np.uint32
+                for layer, seq_grp in seq_grps.items():
+                    if self._idx_mode == "variable":
+                        seq_indices_dset = seq_grp.require_dataset(
+                            "idx_var",
+                            (len(dataset), seq_indices.shape[1]),
+                            dtype=np.uint32,
+                        )
+                        seq_indices_dset[start:end] = seq_indices
+
+                    elif (start == 0) and (self._idx_mode == "fixed"):
+                        seq_indices_dset = seq_grp.create_dataset(
+                            "idx_fix", data=seq_indices, dtype=np.uint32
+                        )
+
+                    writers[layer].write(
+                        seq_grp, f"emb_{start}_{end}", seq_token_embs[layer]
                     )
 
-                seq_grp.create_dataset(
-                    f"emb_{start}_{end}", data=seq_token_emb.numpy(force=True)
-                )
-
                 start = end
 
-        os.rename(out_path + ".tmp", out_path)
+            for writer in writers.values():
+                writer.close()
+
+        for layer in self.layers:
+            os.rename(layer_path(out_path, layer) + ".tmp", layer_path(out_path, layer))
 
 
 class HFVariantEmbeddingExtractor(HFEmbeddingExtractor):
@@ -93,9 +110,19 @@ class HFVariantEmbeddingExtractor(HFEmbeddingExtractor):
             num_workers=self.num_workers,
         )
 
-        with h5py.File(out_path + ".tmp", "w") as out_f:
-            allele1_grp = out_f.create_group("allele1")
-            allele2_grp = out_f.create_group("allele2")
+        with contextlib.ExitStack() as stack:
+            writers = {}
+            allele1_grps = {}
+            allele2_grps = {}
+            for layer in self.layers:
+                out_f = stack.enter_context(
+                    h5py.File(layer_path(out_path, layer) + ".tmp", "w")
+                )
+                writers[layer] = EmbeddingWriter(
+                    out_f, self.store_dtype, self.store_dim, self.store_projection
+                )
+                allele1_grps[layer] = out_f.create_group("allele1")
+                allele2_grps[layer] = out_f.create_group("allele2")
 
             start = 0
             for allele1, allele2 in tqdm(
@@ -108,44 +135,57 @@ class HFVariantEmbeddingExtractor(HFEmbeddingExtractor):
                 allele1_tokens, allele1_offsets = self.tokenize(allele1)
                 allele2_tokens, allele2_offsets = self.tokenize(allele2)
 
-                allele1_token_emb = self.model_fwd(allele1_tokens)
-                allele2_token_emb = self.model_fwd(allele2_tokens)
-                if self._idx_mode == "variable":
-                    allele1_indices = self._offsets_to_indices(allele1_offsets, allele1)
-                    allele1_indices_dset = allele1_grp.require_dataset(
-                        "idx_var",
-                        (len(dataset), allele1_indices.shape[1]),
-                        dtype=np.uint32,
-                    )
-                    allele1_indices_dset[start:end] = allele1_indices
+                allele1_token_embs = self.micro_batcher.map(
+                    self.model_fwd, allele1_tokens
+                )
+                allele2_token_embs = self.micro_batcher.map(
+                    self.model_fwd, allele2_tokens
+                )
 
+                if self._idx_mode == "variable" or start == 0:
+                    allele1_indices = self._offsets_to_indices(allele1_offsets, allele1)
                     allele2_indices = self._offsets_to_indices(allele2_offsets, allele2)
-                    allele2_indices_dset = allele2_grp.require_dataset(
-                        "idx_var",
-                        (len(dataset), allele2_indices.shape[1]),
-                        dtype=np.uint32,
-                    )
-                    allele2_indices_dset[start:end] = allele2_indices
 
-                elif (start == 0) and (self._idx_mode == "fixed"):
-                    allele1_indices = self._offsets_to_indices(allele1_offsets, allele1)
-                    allele1_indices_dset = allele1_grp.create_dataset(
-                        "idx_fix", data=allele1_indices, dtype=np.uint32
+                for layer in self.layers:
+                    allele1_grp = allele1_grps[layer]
+                    allele2_grp = allele2_grps[layer]
+                    if self._idx_mode == "variable":
+                        allele1_indices_dset = allele1_grp.require_dataset(
+                            "idx_var",
+                            (len(dataset), allele1_indices.shape[1]),
+                            dtype=np.uint32,
+                        )
+                        allele1_indices_dset[start:end] = allele1_indices
+
+                        allele2_indices_dset = allele2_grp.require_dataset(
+                            "idx_var",
+                            (len(dataset), allele2_indices.shape[1]),
+                            dtype=np.uint32,
+                        )
+                        allele2_indices_dset[start:end] = allele2_indices
+
+                    elif (start == 0) and (self._idx_mode == "fixed"):
+                        allele1_indices_dset = allele1_grp.create_dataset(
+                            "idx_fix", data=allele1_indices, dtype=np.uint32
+                        )
+                        allele2_indices_dset = allele2_grp.create_dataset(
+                            "idx_fix", data=allele2_indices, dtype=np.uint32
+                        )
+
+                    writers[layer].write(
+                        allele1_grp, f"emb_{start}_{end}", allele1_token_embs[layer]
                     )
-                    allele2_indices = self._offsets_to_indices(allele2_offsets, allele2)
-                    allele2_indices_dset = allele2_grp.create_dataset(
-                        "idx_fix", data=allele2_indices, dtype=np.uint32
+                    writers[layer].write(
+                        allele2_grp, f"emb_{start}_{end}", allele2_token_embs[layer]
                     )
 
-                allele1_grp.create_dataset(
-                    f"emb_{start}_{end}", data=allele1_token_emb.numpy(force=True)
-                )
-                allele2_grp.create_dataset(
-                    f"emb_{start}_{end}", data=allele2_token_emb.numpy(force=True)
-                )
-
                 start = end
-        os.rename(out_path + ".tmp", out_path)
+
+            for writer in writers.values():
+                writer.close()
+
+        for layer in self.layers:
+            os.rename(layer_path(out_path, layer) + ".tmp", layer_path(out_path, layer))
 
 
 class SequenceBaselineSimpleEmbeddingExtractor(
@@ -162,40 +202,20 @@ class SequenceBaselineSimpleEmbeddingExtractor(
 
 class DNABERT2EmbeddingExtractor(HFEmbeddingExtractor, SimpleEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-            model = AutoModelForMaskedLM.from_pretrained(
-                model_name, config=config, trust_remote_code=True
-            )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
 
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
-    def model_fwd(self, tokens):
-        tokens = tokens.to(device=self.device)
-        with torch.no_grad():
-            torch_outs = self.model(tokens, output_hidden_states=True)
-            embs = torch_outs.hidden_states
-
-        return embs
-
 
 class MistralDNAEmbeddingExtractor(HFEmbeddingExtractor, SimpleEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
 class GENALMEmbeddingExtractor(HFEmbeddingExtractor, SimpleEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         print(model)
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
@@ -206,15 +226,16 @@ class NucleotideTransformerEmbeddingExtractor(
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -234,17 +255,12 @@ class HyenaDNAEmbeddingExtractor(HFEmbeddingExtractor, SimpleEmbeddingExtractor)
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -259,17 +275,12 @@ class CaduceusEmbeddingExtractor(HFEmbeddingExtractor, SimpleEmbeddingExtractor)
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("caduceus", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
         return tokens, None
 
     @staticmethod
@@ -285,18 +296,14 @@ class HyenaDNAUntrainedEmbeddingExtractor(
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
+        tokenizer, model = load_pretrained(
+            "hyenadna", model_name, "causal_lm", pretrained=False
         )
-        config = AutoConfig.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_config(config, trust_remote_code=True)
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -309,32 +316,20 @@ class HyenaDNAUntrainedEmbeddingExtractor(
 
 class DNABERT2VariantEmbeddingExtractor(HFVariantEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-            model = AutoModelForMaskedLM.from_pretrained(
-                model_name, config=config, trust_remote_code=True
-            )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
 
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
 class MistralDNAVariantEmbeddingExtractor(HFVariantEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
 class GenaLMVariantEmbeddingExtractor(HFVariantEmbeddingExtractor):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
@@ -342,17 +337,12 @@ class HyenaDNAVariantEmbeddingExtractor(HFVariantEmbeddingExtractor):
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -372,15 +362,16 @@ class NucleotideTransformerVariantEmbeddingExtractor(HFVariantEmbeddingExtractor
     _idx_mode = "fixed"
 
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens, None
 
@@ -1,32 +1,34 @@
+import os
 from abc import ABCMeta, abstractmethod
 
 import numpy as np
 import polars as pl
 import torch
 import torch.nn.functional as F
-from scipy.spatial import distance
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Subset
 from tqdm import tqdm
-from transformers import (
-    AutoConfig,
-    AutoModel,
-    AutoModelForCausalLM,
-    AutoModelForMaskedLM,
-    AutoTokenizer,
-    BertConfig,
-)
 
-from ..utils import NoModule, onehot_to_chars
+from ..devices import resolve_device
+from ..embeddings import HiddenStateCapture, find_lm_head
+from ..microbatch import MicroBatched
+from ..models import load_native_tokenizer, load_pretrained
+from ..multi_output import read_store
+from ..score_writer import ScoreWriter
+from ..utils import onehot_to_chars
+from ..variant_cache import variant_keys
 
 
-class LikelihoodEvaluator(metaclass=ABCMeta):
+class LikelihoodEvaluator(MicroBatched, metaclass=ABCMeta):
+    # Vectorized tokenizer used instead of the HF one where available
+    native_tokenizer = None
+
     def __init__(self, tokenizer, model, batch_size, num_workers, device):
         self.tokenizer = tokenizer
         self.model = model
-        self.model.to(device)
         self.batch_size = batch_size
         self.num_workers = num_workers
-        self.device = device
+        self.device = resolve_device(device, num_workers)
+        self.model.to(self.device)
 
     @property
     @abstractmethod
@@ -43,15 +45,17 @@ class LikelihoodEvaluator(metaclass=ABCMeta):
         return self.tokenizer.mask_token_id
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer.batch_encode_plus(
-            seqs_str, return_tensors="pt", padding=True
-        )
-        tokens = encoded["input_ids"]
-        try:
-            attention_mask = encoded["attention_mask"]
-        except:
-            attention_mask = None
+        if self.native_tokenizer is not None:
+            tokens = self.native_tokenizer(seqs)
+            attention_mask = torch.ones_like(tokens)
+        else:
+            seqs_str = onehot_to_chars(seqs)
+            encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
+            tokens = encoded["input_ids"]
+            try:
+                attention_mask = encoded["attention_mask"]
+            except:
+                attention_mask = None
         if self.start_token is not None:
             starts = torch.where(tokens == self.start_token)[1] + 1
         else:
@@ -63,7 +67,7 @@ class LikelihoodEvaluator(metaclass=ABCMeta):
         return tokens, starts, ends, attention_mask
 
     # def model_fwd(self, tokens, attention_mask):
-    #     with torch.no_grad():
+    #     with torch.inference_mode():
     #         try:
     #             torch_outs = self.model(
     #                 tokens,
@@ -77,7 +81,7 @@ class LikelihoodEvaluator(metaclass=ABCMeta):
     #     return lls
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
                 attention_mask=attention_mask,
@@ -86,92 +90,123 @@ class LikelihoodEvaluator(metaclass=ABCMeta):
             lls = -F.cross_entropy(logits, tokens_out, reduction="none")
         return lls
 
-    def evaluate(self, dataset, output_file, progress_bar=True):
-        out_file_obj = open(output_file, "w")
+    def evaluate(self, dataset, output_file, progress_bar=True, resume=False):
+        writer = ScoreWriter(
+            output_file, {"likelihood": pl.Float32}, header=False, resume=resume
+        )
         dataloader = DataLoader(
-            dataset,
+            writer.remaining(dataset),
             batch_size=self.batch_size,
             shuffle=False,
             num_workers=self.num_workers,
         )
         for seqs in tqdm(dataloader, disable=(not progress_bar), ncols=120):
             tokens, starts, ends, attention_mask = self.tokenize(seqs)
-            lls = self.score(tokens, starts, ends, attention_mask)
-            for lhood in lls.flatten():
-                out_file_obj.write(f"{str(lhood)}\n")
-                out_file_obj.flush()
+            lls = self.micro_batcher.map(
+                self.score, tokens, starts, ends, attention_mask
+            )
+            writer.append(likelihood=lls.flatten())
+
+        return writer.close()
 
 
-class VariantLikelihoodEvaluator(LikelihoodEvaluator):
+class VariantScoreEvaluator(MicroBatched, metaclass=ABCMeta):
+    @abstractmethod
+    def score_variants(self, allele1, allele2):
+        """
+        Returns allele1 and allele2 scores for a batch of variants as numpy arrays
+        """
+        pass
+
+    def evaluate(
+        self, dataset, output_file, progress_bar=True, resume=False, cache=None
+    ):
+        writer = ScoreWriter(
+            output_file,
+            {"allele1_scores": pl.Float64, "allele2_scores": pl.Float64},
+            header=False,
+            resume=resume,
+        )
+        dataset = writer.remaining(dataset)
+
+        # Only variants missing from the cache are scored
+        if cache is not None:
+            keys = variant_keys(dataset)
+            found, cached_scores = cache.lookup(keys)
+            scores = np.zeros((len(dataset), 2), dtype=np.float32)
+            if found.any():
+                scores[found] = cached_scores
+            positions = np.flatnonzero(~found)
+            dataset = Subset(dataset, positions)
 
-    def evaluate(self, dataset, output_file, progress_bar=True):
         dataloader = DataLoader(
             dataset,
             batch_size=self.batch_size,
             shuffle=False,
             num_workers=self.num_workers,
         )
-        allele1_likelihoods = []
-        allele2_likelihoods = []
 
-        with open(output_file, "a") as f:
-            for allele1, allele2 in tqdm(
-                dataloader, disable=(not progress_bar), ncols=120
-            ):
-                torch.cuda.empty_cache()
-                (
-                    tokens_allele1,
-                    starts_allele1,
-                    ends_allele1,
-                    attention_mask_allele1,
-                    offsets_allele1,
-                ) = self.tokenize(allele1)
-                (
-                    tokens_allele2,
-                    starts_allele2,
-                    ends_allele2,
-                    attention_mask_allele2,
-                    offsets_allele2,
-                ) = self.tokenize(allele2)
-                lls_allele1 = self.score(
-                    tokens_allele1,
-                    starts_allele1,
-                    ends_allele1,
-                    attention_mask_allele1,
-                    offsets_allele1,
-                    allele1,
-                )
-                lls_allele2 = self.score(
-                    tokens_allele2,
-                    starts_allele2,
-                    ends_allele2,
-                    attention_mask_allele2,
-                    offsets_allele2,
-                    allele2,
+        start = 0
+        for allele1, allele2 in tqdm(dataloader, disable=(not progress_bar), ncols=120):
+            scores_allele1, scores_allele2 = self.micro_batcher.map(
+                self.score_variants, allele1, allele2
+            )
+            if cache is None:
+                writer.append(
+                    allele1_scores=scores_allele1, allele2_scores=scores_allele2
                 )
-                for lhood_allele1, lhood_allele2 in zip(
-                    lls_allele1.flatten(), lls_allele2.flatten()
-                ):
-                    allele1_likelihoods.append(lhood_allele1)
-                    allele2_likelihoods.append(lhood_allele2)
-                    f.write(f"{lhood_allele1}\t{lhood_allele2}\n")
-                    f.flush()
-                # tokens_allele1 = tokens_allele1.to("cpu")
-                # tokens_allele2 = tokens_allele2.to("cpu")
-
-        data = {
-            "allele1_scores": allele1_likelihoods,
-            "allele2_scores": allele2_likelihoods,
-        }
-        df = pl.DataFrame(
-            data, schema={"allele1_scores": pl.Float64, "allele2_scores": pl.Float64}
+                continue
+
+            end = start + len(scores_allele1)
+            batch_scores = np.stack([scores_allele1, scores_allele2], axis=1)
+            scores[positions[start:end]] = batch_scores
+            cache.store(keys[positions[start:end]], batch_scores)
+            start = end
+
+        if cache is not None:
+            writer.append(allele1_scores=scores[:, 0], allele2_scores=scores[:, 1])
+
+        return writer.close()
+
+
+class VariantLikelihoodEvaluator(VariantScoreEvaluator, LikelihoodEvaluator):
+    def score_variants(self, allele1, allele2):
+        (
+            tokens_allele1,
+            starts_allele1,
+            ends_allele1,
+            attention_mask_allele1,
+            offsets_allele1,
+        ) = self.tokenize(allele1)
+        (
+            tokens_allele2,
+            starts_allele2,
+            ends_allele2,
+            attention_mask_allele2,
+            offsets_allele2,
+        ) = self.tokenize(allele2)
+        lls_allele1 = self.score(
+            tokens_allele1,
+            starts_allele1,
+            ends_allele1,
+            attention_mask_allele1,
+            offsets_allele1,
+            allele1,
+        )
+        lls_allele2 = self.score(
+            tokens_allele2,
+            starts_allele2,
+            ends_allele2,
+            attention_mask_allele2,
+            offsets_allele2,
+            allele2,
         )
 
-        return df
+        return lls_allele1.flatten(), lls_allele2.flatten()
 
     def tokenize(self, seqs):
         seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer.batch_encode_plus(
+        encoded = self.tokenizer(
             seqs_str, return_tensors="pt", padding=True, return_offsets_mapping=True
         )
         tokens = encoded["input_ids"]
@@ -192,67 +227,37 @@ class VariantLikelihoodEvaluator(LikelihoodEvaluator):
         return tokens, starts, ends, attention_mask, offsets
 
 
-class VariantSingleTokenLikelihoodEvaluator(LikelihoodEvaluator):
-    def evaluate(self, dataset, output_file, progress_bar=True):
-        dataloader = DataLoader(
-            dataset,
-            batch_size=self.batch_size,
-            shuffle=False,
-            num_workers=self.num_workers,
+class VariantSingleTokenLikelihoodEvaluator(VariantScoreEvaluator, LikelihoodEvaluator):
+    def score_variants(self, allele1, allele2):
+        tokens_allele1, starts_allele1, ends_allele1, attention_mask_allele1 = (
+            self.tokenize(allele1)
+        )
+        tokens_allele2, starts_allele2, ends_allele2, attention_mask_allele2 = (
+            self.tokenize(allele2)
         )
-        allele1_likelihoods = []
-        allele2_likelihoods = []
-
-        with open(output_file, "a") as f:
-            for allele1, allele2 in tqdm(
-                dataloader, disable=(not progress_bar), ncols=120
-            ):
-                torch.cuda.empty_cache()
-                tokens_allele1, starts_allele1, ends_allele1, attention_mask_allele1 = (
-                    self.tokenize(allele1)
-                )
-                tokens_allele2, starts_allele2, ends_allele2, attention_mask_allele2 = (
-                    self.tokenize(allele2)
-                )
-
-                diffs = tokens_allele1 != tokens_allele2
-                tokens_masked = tokens_allele1.clone()
-                tokens_masked[diffs] = self.mask_token
-
-                lls_allele1 = self.score(
-                    tokens_masked,
-                    tokens_allele1,
-                    starts_allele1,
-                    ends_allele1,
-                    attention_mask_allele1,
-                    allele1,
-                )
-                lls_allele2 = self.score(
-                    tokens_masked,
-                    tokens_allele2,
-                    starts_allele2,
-                    ends_allele2,
-                    attention_mask_allele2,
-                    allele2,
-                )
-
-                for lhood_allele1, lhood_allele2 in zip(
-                    lls_allele1.flatten(), lls_allele2.flatten()
-                ):
-                    allele1_likelihoods.append(lhood_allele1)
-                    allele2_likelihoods.append(lhood_allele2)
-                    f.write(f"{lhood_allele1}\t{lhood_allele2}\n")
-                    f.flush()
 
-        data = {
-            "allele1_scores": allele1_likelihoods,
-            "allele2_scores": allele2_likelihoods,
-        }
-        df = pl.DataFrame(
-            data, schema={"allele1_scores": pl.Float64, "allele2_scores": pl.Float64}
+        diffs = tokens_allele1 != tokens_allele2
+        tokens_masked = tokens_allele1.clone()
+        tokens_masked[diffs] = self.mask_token
+
+        lls_allele1 = self.score(
+            tokens_masked,
+            tokens_allele1,
+            starts_allele1,
+            ends_allele1,
+            attention_mask_allele1,
+            allele1,
+        )
+        lls_allele2 = self.score(
+            tokens_masked,
+            tokens_allele2,
+            starts_allele2,
+            ends_allele2,
+            attention_mask_allele2,
+            allele2,
         )
 
-        return df
+        return lls_allele1.flatten(), lls_allele2.flatten()
 
     def score(self, tokens_in, tokens_out, starts, ends, attention_mask, seq):
         tokens_in = tokens_in.to(device=self.device)
@@ -274,55 +279,182 @@ class VariantSingleTokenLikelihoodEvaluator(LikelihoodEvaluator):
 
 
 class VariantEmbeddingEvaluator(LikelihoodEvaluator):
-    def evaluate(self, dataset, output_file, progress_bar=True):
+    def evaluate(
+        self,
+        dataset,
+        output_file,
+        progress_bar=True,
+        allele1_embeddings_path=None,
+        allele2_embeddings_path=None,
+        cache=None,
+        cache_embeddings=False,
+    ):
+        """
+        Cosine distances between the pooled embeddings of each variant's
+        alleles. Allele embeddings are streamed to .npy files and returned as
+        memmaps. With a cache, only the distance of each variant is cached by
+        default, and the embeddings of variants found in it are left as NaN;
+        with cache_embeddings, both allele embeddings are cached alongside it
+        (at 2 * hidden size floats per variant), so that they are filled in
+        for cached variants too. The two kinds of entries need caches of
+        different modes. No embeddings (None) are returned if every variant
+        was cached without them, or if the dataset is empty.
+        """
+        if len(dataset) == 0:
+            df = pl.DataFrame(schema={"cosine_distance": pl.Float64})
+            return df, None, None
+
+        out_prefix = os.path.splitext(output_file)[0]
+        if allele1_embeddings_path is None:
+            allele1_embeddings_path = f"{out_prefix}_allele1_embeddings.npy"
+        if allele2_embeddings_path is None:
+            allele2_embeddings_path = f"{out_prefix}_allele2_embeddings.npy"
+
+        dists = np.zeros(len(dataset), dtype=np.float64)
+        allele1_embeddings = None
+        allele2_embeddings = None
+
+        def open_embeddings(dim, dtype):
+            shape = (len(dists), dim)
+            return (
+                np.lib.format.open_memmap(
+                    allele1_embeddings_path, mode="w+", dtype=dtype, shape=shape
+                ),
+                np.lib.format.open_memmap(
+                    allele2_embeddings_path, mode="w+", dtype=dtype, shape=shape
+                ),
+            )
+
+        # Cached entries hold the distance, followed by both allele
+        # embeddings with cache_embeddings
+        positions = np.arange(len(dataset))
+        found = np.zeros(len(dataset), dtype=bool)
+        if cache is not None:
+            keys = variant_keys(dataset)
+            found, cached = cache.lookup(keys)
+            if found.any():
+                if (cached.shape[1] > 1) != cache_embeddings:
+                    raise ValueError(
+                        f"Entries of cache mode {cache.mode} "
+                        f"{'do not ' if cache_embeddings else ''}hold embeddings"
+                    )
+                dists[found] = cached[:, 0]
+                if cache_embeddings:
+                    dim = (cached.shape[1] - 1) // 2
+                    allele1_embeddings, allele2_embeddings = open_embeddings(
+                        dim, cached.dtype
+                    )
+                    allele1_embeddings[found] = cached[:, 1 : dim + 1]
+                    allele2_embeddings[found] = cached[:, dim + 1 :]
+            positions = np.flatnonzero(~found)
+            dataset = Subset(dataset, positions)
+
         dataloader = DataLoader(
             dataset,
             batch_size=self.batch_size,
             shuffle=False,
             num_workers=self.num_workers,
         )
-        allele1_embeddings = []
-        allele2_embeddings = []
-        dists = []
 
         with open(output_file, "a") as f:
+            start = 0
             for allele1, allele2 in tqdm(
                 dataloader, disable=(not progress_bar), ncols=120
             ):
-                torch.cuda.empty_cache()
                 tokens_allele1, starts_allele1, ends_allele1, attention_mask_allele1 = (
                     self.tokenize(allele1)
                 )
                 tokens_allele2, starts_allele2, ends_allele2, attention_mask_allele2 = (
                     self.tokenize(allele2)
                 )
-                embs_allele1 = self.embed(
+                embs_allele1 = self.micro_batcher.map(
+                    self.embed,
                     tokens_allele1,
                     starts_allele1,
                     ends_allele1,
                     attention_mask_allele1,
                     allele1,
                 )
-                embs_allele2 = self.embed(
+                embs_allele2 = self.micro_batcher.map(
+                    self.embed,
                     tokens_allele2,
                     starts_allele2,
                     ends_allele2,
                     attention_mask_allele2,
                     allele2,
                 )
-                for emb_allele1, emb_allele2 in zip(embs_allele1, embs_allele2):
-                    dist = distance.cosine(emb_allele1, emb_allele2)
-                    allele1_embeddings.append(emb_allele1)
-                    allele2_embeddings.append(emb_allele2)
-                    dists.append(dist)
-                    f.write(f"{dist}\n")
+                end = start + embs_allele1.shape[0]
+                batch_positions = positions[start:end]
+
+                batch_dists = 1 - F.cosine_similarity(embs_allele1, embs_allele2, dim=1)
+                batch_dists = batch_dists.numpy(force=True)
+                dists[batch_positions] = batch_dists
+
+                embs_allele1 = embs_allele1.numpy(force=True)
+                embs_allele2 = embs_allele2.numpy(force=True)
+                if allele1_embeddings is None:
+                    allele1_embeddings, allele2_embeddings = open_embeddings(
+                        embs_allele1.shape[1], embs_allele1.dtype
+                    )
+                    allele1_embeddings[found] = np.nan
+                    allele2_embeddings[found] = np.nan
+                allele1_embeddings[batch_positions] = embs_allele1
+                allele2_embeddings[batch_positions] = embs_allele2
+
+                if cache is None:
+                    f.write("".join(f"{dist}\n" for dist in dists[start:end]))
                     f.flush()
+                elif cache_embeddings:
+                    cache.store(
+                        keys[batch_positions],
+                        np.concatenate(
+                            [batch_dists[:, None], embs_allele1, embs_allele2], axis=1
+                        ),
+                    )
+                else:
+                    cache.store(keys[batch_positions], batch_dists[:, None])
+
+                start = end
+
+            if cache is not None:
+                f.write("".join(f"{dist}\n" for dist in dists))
 
         data = {"cosine_distance": dists}
         df = pl.DataFrame(data, schema={"cosine_distance": pl.Float64})
 
-        allele1_embeddings = np.stack(allele1_embeddings)
-        allele2_embeddings = np.stack(allele2_embeddings)
+        if allele1_embeddings is None:
+            # Every variant was cached without its embeddings
+            return df, None, None
+
+        allele1_embeddings.flush()
+        allele2_embeddings.flush()
+        del allele1_embeddings, allele2_embeddings
+        allele1_embeddings = np.load(allele1_embeddings_path, mmap_mode="r")
+        allele2_embeddings = np.load(allele2_embeddings_path, mmap_mode="r")
+
+        return df, allele1_embeddings, allele2_embeddings
+
+    @staticmethod
+    def evaluate_store(store_path, output_file):
+        """
+        Cosine distances between the pooled allele embeddings of a
+        multi-output store written over the same variants
+        """
+        allele1_embeddings = read_store(store_path, "allele1", "pooled")
+        allele2_embeddings = read_store(store_path, "allele2", "pooled")
+
+        dists = 1 - F.cosine_similarity(
+            torch.from_numpy(allele1_embeddings),
+            torch.from_numpy(allele2_embeddings),
+            dim=1,
+        )
+        dists = dists.numpy().astype(np.float64)
+        with open(output_file, "w") as f:
+            f.write("".join(f"{dist}\n" for dist in dists))
+
+        df = pl.DataFrame(
+            {"cosine_distance": dists}, schema={"cosine_distance": pl.Float64}
+        )
 
         return df, allele1_embeddings, allele2_embeddings
 
@@ -331,26 +463,22 @@ class VariantEmbeddingEvaluator(LikelihoodEvaluator):
         if attention_mask is not None:
             attention_mask = attention_mask.to(device=self.device)
 
-        with torch.no_grad():
+        capture = HiddenStateCapture(self.model)
+        with torch.inference_mode():
             try:
-                torch_outs = self.model(
-                    tokens, attention_mask=attention_mask, output_hidden_states=True
-                )
-                print("getting hidden states")
-            except:
-                torch_outs = self.model(tokens, output_hidden_states=True)
+                last_hidden_state = capture(tokens, attention_mask=attention_mask)[-1]
+            except TypeError:
+                # Models whose forward takes no attention_mask
+                last_hidden_state = capture(tokens)[-1]
 
-            if self._hidden_states == "all":
-                last_hidden_state = torch_outs.hidden_states[-1]
-            else:
-                last_hidden_state = torch_outs.hidden_states
-
-        embeddings = last_hidden_state.mean(dim=1).numpy(force=True)
+        embeddings = last_hidden_state.mean(dim=1)
 
         return embeddings
 
 
 class MaskedZeroShotScore(metaclass=ABCMeta):
+    _use_attention_mask = True
+
     @property
     @abstractmethod
     def mask_token(self):
@@ -358,20 +486,43 @@ class MaskedZeroShotScore(metaclass=ABCMeta):
 
     def score(self, tokens, starts, ends, attention_mask):
         tokens = tokens.to(device=self.device)
-        attention_mask = attention_mask.to(device=self.device)
+        if attention_mask is not None:
+            attention_mask = attention_mask.to(device=self.device)
         lls = torch.zeros(tokens.shape[:2], device=self.device)
         for i in range(tokens.shape[1]):
             clip_mask = ((i >= starts) & (i < ends)).to(device=self.device)
+            if not clip_mask.any():
+                continue
             masked_tokens = tokens.clone()
             masked_tokens[:, i, ...] = self.mask_token
             lls[:, i] = (
-                self.model_fwd(masked_tokens, attention_mask, tokens)[:, i] * clip_mask
+                self.masked_position_fwd(masked_tokens, attention_mask, tokens, i)
+                * clip_mask
             )
 
         out = lls.sum(dim=1).numpy(force=True)
 
         return out
 
+    def masked_position_fwd(self, tokens_in, attention_mask, tokens_out, position):
+        """
+        Log-likelihoods of tokens_out at a single masked position. The LM head
+        is applied to the backbone output at that position only, rather than
+        projecting every position onto the vocabulary.
+        """
+        if not self._use_attention_mask:
+            attention_mask = None
+        capture = HiddenStateCapture(self.model)
+        with torch.inference_mode():
+            hidden = capture(tokens_in, attention_mask=attention_mask)[-1]
+            logits = find_lm_head(self.model)(hidden[:, position : position + 1])
+            lls = -F.cross_entropy(
+                logits.swapaxes(1, 2),
+                tokens_out[:, position : position + 1],
+                reduction="none",
+            )
+        return lls[:, 0]
+
 
 class CausalZeroShotScore(metaclass=ABCMeta):
     def score(self, tokens, starts, ends, attention_mask):
@@ -402,83 +553,41 @@ class ProbingScore(metaclass=ABCMeta):
             offsets = offsets.to(device=self.device)
             indices = self._offsets_to_indices(offsets, tokens)
             indices = torch.from_numpy(indices).to(device=self.device)
-        with torch.no_grad():
+        capture = HiddenStateCapture(self.model)
+        with torch.inference_mode():
             try:
-                torch_outs = self.model(
+                last_hidden_state = capture(
                     tokens,
                     attention_mask=attention_mask,
                     encoder_attention_mask=attention_mask,
-                    output_hidden_states=True,
-                )
+                )[-1]
             except:
-                torch_outs = self.model(tokens, output_hidden_states=True)
+                last_hidden_state = capture(tokens)[-1]
 
-            if self._hidden_states == "all":
-                last_hidden_state = torch_outs.hidden_states[-1]
-            else:
-                last_hidden_state = torch_outs.hidden_states
             if offsets is not None:
                 probed_outs = self.probed_model(last_hidden_state, indices)
             else:
                 probed_outs = self.probed_model(last_hidden_state, None)
 
-        return probed_outs
+        return probed_outs.numpy(force=True)
 
 
-class FinetunedScore(metaclass=ABCMeta):
-    def evaluate(self, dataset, output_file, progress_bar=True):
-        dataloader = DataLoader(
-            dataset,
-            batch_size=self.batch_size,
-            shuffle=False,
-            num_workers=self.num_workers,
-        )
-        allele1_likelihoods = []
-        allele2_likelihoods = []
+class FinetunedScore(VariantScoreEvaluator):
+    def score_variants(self, allele1, allele2):
+        lls_allele1 = self.score(None, None, None, None, None, allele1)
+        lls_allele2 = self.score(None, None, None, None, None, allele2)
 
-        with open(output_file, "a") as f:
-            for allele1, allele2 in tqdm(
-                dataloader, disable=(not progress_bar), ncols=120
-            ):
-                lls_allele1 = self.score(None, None, None, None, None, allele1)
-                lls_allele2 = self.score(None, None, None, None, None, allele2)
-                for lhood_allele1, lhood_allele2 in zip(
-                    lls_allele1.flatten(), lls_allele2.flatten()
-                ):
-                    allele1_likelihoods.append(lhood_allele1)
-                    allele2_likelihoods.append(lhood_allele2)
-                    data = {
-                        "allele1_scores": allele1_likelihoods,
-                        "allele2_scores": allele2_likelihoods,
-                    }
-                    df = pl.DataFrame(
-                        data,
-                        schema={
-                            "allele1_scores": pl.Float64,
-                            "allele2_scores": pl.Float64,
-                        },
-                    )
-                    f.write(f"{lhood_allele1}\t{lhood_allele2}\n")
-                    f.flush()
-            return df
+        return lls_allele1.flatten(), lls_allele2.flatten()
 
     def score(self, tokens, starts, ends, attention_mask, offsets, seq):
-        with torch.no_grad():
+        with torch.inference_mode():
             log1p_counts = self.model(seq).squeeze(1)
         return log1p_counts.numpy(force=True)
 
 
 class DNABERT2Evaluator(LikelihoodEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-            model = AutoModelForMaskedLM.from_pretrained(
-                model_name, config=config, trust_remote_code=True
-            )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -492,9 +601,7 @@ class DNABERT2Evaluator(LikelihoodEvaluator, MaskedZeroShotScore):
 
 class GenaLMEvaluator(LikelihoodEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -508,15 +615,12 @@ class GenaLMEvaluator(LikelihoodEvaluator, MaskedZeroShotScore):
 
 class HDEvaluator(LikelihoodEvaluator, CausalZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
             )
@@ -538,16 +642,14 @@ class HDEvaluator(LikelihoodEvaluator, CausalZeroShotScore):
 
 class HDUntrainedEvaluator(LikelihoodEvaluator, CausalZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
+        tokenizer, model = load_pretrained(
+            "hyenadna", model_name, "causal_lm", pretrained=False
         )
-        config = AutoConfig.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_config(config, trust_remote_code=True)
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
             )
@@ -569,9 +671,7 @@ class HDUntrainedEvaluator(LikelihoodEvaluator, CausalZeroShotScore):
 
 class MistralEvaluator(LikelihoodEvaluator, CausalZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -583,7 +683,7 @@ class MistralEvaluator(LikelihoodEvaluator, CausalZeroShotScore):
         return 2
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
                 attention_mask=attention_mask,
@@ -597,13 +697,12 @@ class MistralEvaluator(LikelihoodEvaluator, CausalZeroShotScore):
 
 
 class CaduceusEvaluator(LikelihoodEvaluator, MaskedZeroShotScore):
+    _use_attention_mask = False
+
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("caduceus", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     @property
     def start_token(self):
@@ -613,23 +712,8 @@ class CaduceusEvaluator(LikelihoodEvaluator, MaskedZeroShotScore):
     def end_token(self):
         return 1
 
-    def score(self, tokens, starts, ends, attention_mask):
-        tokens = tokens.to(device=self.device)
-        lls = torch.zeros(tokens.shape[:2], device=self.device)
-        for i in range(tokens.shape[1]):
-            clip_mask = ((i >= starts) & (i < ends)).to(device=self.device)
-            masked_tokens = tokens.clone()
-            masked_tokens[:, i, ...] = self.mask_token
-            lls[:, i] = (
-                self.model_fwd(masked_tokens, attention_mask, tokens)[:, i] * clip_mask
-            )
-
-        out = lls.sum(dim=1).numpy(force=True)
-
-        return out
-
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(tokens_in)
             logits = torch_outs.logits.swapaxes(1, 2)
             lls = -F.cross_entropy(logits, tokens_out, reduction="none")
@@ -638,10 +722,13 @@ class CaduceusEvaluator(LikelihoodEvaluator, MaskedZeroShotScore):
 
 class NTEvaluator(LikelihoodEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     @property
     def start_token(self):
@@ -653,8 +740,6 @@ class NTEvaluator(LikelihoodEvaluator, MaskedZeroShotScore):
 
 
 class DNABERT2VariantEvaluator(VariantLikelihoodEvaluator):
-    _hidden_states = "last"
-
     def __init__(self, tokenizer, model, batch_size, num_workers, device):
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
@@ -677,15 +762,7 @@ class DNABERT2VariantEvaluator(VariantLikelihoodEvaluator):
 
 class DNABERT2ZeroShotVariantEvaluator(DNABERT2VariantEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-            model = AutoModelForMaskedLM.from_pretrained(
-                model_name, config=config, trust_remote_code=True
-            )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
@@ -693,27 +770,17 @@ class DNABERT2ProbingVariantEvaluator(DNABERT2VariantEvaluator, ProbingScore):
     def __init__(
         self, probed_model, model_path, model_name, batch_size, num_workers, device
     ):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-            model = AutoModelForMaskedLM.from_pretrained(
-                model_name, config=config, trust_remote_code=True
-            )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
 
-        model_checkpoint = torch.load(model_path)
+        model_checkpoint = torch.load(model_path, map_location="cpu")
         probed_model.load_state_dict(model_checkpoint)
         self.probed_model = probed_model
-        self.probed_model.to(device)
 
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.probed_model.to(self.device)
 
 
 class GenaLMVariantEvaluator(VariantLikelihoodEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, tokenizer, model, batch_size, num_workers, device):
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
@@ -736,9 +803,7 @@ class GenaLMVariantEvaluator(VariantLikelihoodEvaluator):
 
 class GenaLMZeroShotVariantEvaluator(GenaLMVariantEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
 
@@ -746,39 +811,26 @@ class GenaLMProbingVariantEvaluator(GenaLMVariantEvaluator, ProbingScore):
     def __init__(
         self, probed_model, model_path, model_name, batch_size, num_workers, device
     ):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
 
-        model_checkpoint = torch.load(model_path)
+        model_checkpoint = torch.load(model_path, map_location="cpu")
         probed_model.load_state_dict(model_checkpoint)
         self.probed_model = probed_model
-        self.probed_model.to(device)
 
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.probed_model.to(self.device)
 
 
 class HDVariantEvaluator(VariantLikelihoodEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
-        try:
-            attention_mask = encoded["attention_mask"]
-            ends = attention_mask.sum(dim=1)
-        except:
-            attention_mask = None
-            ends = None
+        tokens = self.native_tokenizer(seqs)
+        attention_mask = torch.ones_like(tokens)
+        ends = attention_mask.sum(dim=1)
         if self.start_token is not None:
             starts = torch.where(tokens == self.start_token)[1] + 1
         else:
@@ -789,7 +841,7 @@ class HDVariantEvaluator(VariantLikelihoodEvaluator):
         return tokens, starts, ends, attention_mask, None
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
             )
@@ -818,12 +870,12 @@ class HDProbingVariantEvaluator(HDVariantEvaluator, ProbingScore):
     def __init__(
         self, probed_model, model_path, model_name, batch_size, num_workers, device
     ):
-        model_checkpoint = torch.load(model_path)
+        model_checkpoint = torch.load(model_path, map_location="cpu")
         probed_model.load_state_dict(model_checkpoint)
         self.probed_model = probed_model
-        self.probed_model.to(device)
 
         super().__init__(model_name, batch_size, num_workers, device)
+        self.probed_model.to(self.device)
 
     @staticmethod
     def _offsets_to_indices(offsets, seqs):
@@ -833,12 +885,8 @@ class HDProbingVariantEvaluator(HDVariantEvaluator, ProbingScore):
 
 
 class MistralVariantEvaluator(VariantLikelihoodEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -867,23 +915,17 @@ class MistralProbingVariantEvaluator(MistralVariantEvaluator, ProbingScore):
     def __init__(
         self, probed_model, model_path, model_name, batch_size, num_workers, device
     ):
-        model_checkpoint = torch.load(model_path)
+        model_checkpoint = torch.load(model_path, map_location="cpu")
         probed_model.load_state_dict(model_checkpoint)
         self.probed_model = probed_model
-        self.probed_model.to(device)
 
         super().__init__(model_name, batch_size, num_workers, device)
+        self.probed_model.to(self.device)
 
 
 class CaduceusVariantEvaluator(VariantLikelihoodEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("caduceus", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -912,24 +954,17 @@ class CaduceusProbingVariantEvaluator(CaduceusVariantEvaluator, ProbingScore):
     def __init__(
         self, probed_model, model_path, model_name, batch_size, num_workers, device
     ):
-        model_checkpoint = torch.load(model_path)
+        model_checkpoint = torch.load(model_path, map_location="cpu")
         probed_model.load_state_dict(model_checkpoint)
         self.probed_model = probed_model
-        self.probed_model.to(device)
 
         super().__init__(model_name, batch_size, num_workers, device)
+        self.probed_model.to(self.device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer.batch_encode_plus(
-            seqs_str, return_tensors="pt", padding=True
-        )
-        tokens = encoded["input_ids"]
-        attention_mask = encoded.get("attention_mask")
-        # try:
-        #     attention_mask = encoded["attention_mask"]
-        # except:
-        #     attention_mask = None
+        tokens = self.native_tokenizer(seqs)
+        attention_mask = torch.ones_like(tokens)
         if self.start_token is not None:
             starts = torch.where(tokens == self.start_token)[1] + 1
         else:
@@ -942,8 +977,6 @@ class CaduceusProbingVariantEvaluator(CaduceusVariantEvaluator, ProbingScore):
 
 
 class NTVariantEvaluator(VariantLikelihoodEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, tokenizer, model, batch_size, num_workers, device):
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
@@ -966,13 +999,8 @@ class NTVariantEvaluator(VariantLikelihoodEvaluator):
         return np.array([inds] * seqs.shape[0])
 
     def tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
-        try:
-            attention_mask = encoded["attention_mask"]
-        except:
-            attention_mask = None
+        tokens = self.native_tokenizer(seqs)
+        attention_mask = torch.ones_like(tokens)
         if self.start_token is not None:
             starts = torch.where(tokens == self.start_token)[1] + 1
         else:
@@ -986,91 +1014,64 @@ class NTVariantEvaluator(VariantLikelihoodEvaluator):
 
 class NTZeroShotVariantEvaluator(NTVariantEvaluator, MaskedZeroShotScore):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
 
 class NTProbingVariantEvaluator(NTVariantEvaluator, ProbingScore):
     def __init__(
         self, probed_model, model_path, model_name, batch_size, num_workers, device
     ):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
 
-        model_checkpoint = torch.load(model_path)
+        model_checkpoint = torch.load(model_path, map_location="cpu")
         probed_model.load_state_dict(model_checkpoint)
         self.probed_model = probed_model
-        self.probed_model.to(device)
 
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.probed_model.to(self.device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
 
 # class FinetunedVariantEvaluator(FinetunedScore):
-class FinetunedVariantEvaluator:
+class FinetunedVariantEvaluator(VariantScoreEvaluator):
     def __init__(self, model, batch_size, num_workers, device):
         self.model = model
         # super().__init__(None, model, batch_size, num_workers, device)
         self.batch_size = batch_size
         self.num_workers = num_workers
-        self.device = device
+        self.device = resolve_device(device, num_workers)
         self.model.to(self.device)
 
-    def evaluate(self, dataset, output_file, progress_bar=True):
-        dataloader = DataLoader(
-            dataset,
-            batch_size=self.batch_size,
-            shuffle=False,
-            num_workers=self.num_workers,
-        )
-        allele1_likelihoods = []
-        allele2_likelihoods = []
+    def score_variants(self, allele1, allele2):
+        lls_allele1 = self.score(None, None, None, None, None, allele1)
+        lls_allele2 = self.score(None, None, None, None, None, allele2)
 
-        with open(output_file, "a") as f:
-            for allele1, allele2 in tqdm(
-                dataloader, disable=(not progress_bar), ncols=120
-            ):
-                lls_allele1 = self.score(None, None, None, None, None, allele1)
-                lls_allele2 = self.score(None, None, None, None, None, allele2)
-                for lhood_allele1, lhood_allele2 in zip(
-                    lls_allele1.flatten(), lls_allele2.flatten()
-                ):
-                    allele1_likelihoods.append(lhood_allele1)
-                    allele2_likelihoods.append(lhood_allele2)
-                    data = {
-                        "allele1_scores": allele1_likelihoods,
-                        "allele2_scores": allele2_likelihoods,
-                    }
-                    df = pl.DataFrame(
-                        data,
-                        schema={
-                            "allele1_scores": pl.Float64,
-                            "allele2_scores": pl.Float64,
-                        },
-                    )
-                    f.write(f"{lhood_allele1}\t{lhood_allele2}\n")
-                    f.flush()
-            return df
+        return lls_allele1.flatten(), lls_allele2.flatten()
 
     def score(self, tokens, starts, ends, attention_mask, offsets, seq):
-        with torch.no_grad():
+        with torch.inference_mode():
             log1p_counts = self.model(seq).squeeze(1)
         return log1p_counts.numpy(force=True)
 
 
 class HDVariantSingleTokenEvaluator(VariantSingleTokenLikelihoodEvaluator):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
             )
@@ -1092,10 +1093,13 @@ class HDVariantSingleTokenEvaluator(VariantSingleTokenLikelihoodEvaluator):
 
 class NTVariantSingleTokenEvaluator(VariantSingleTokenLikelihoodEvaluator):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     @property
     def start_token(self):
@@ -1108,12 +1112,9 @@ class NTVariantSingleTokenEvaluator(VariantSingleTokenLikelihoodEvaluator):
 
 class CaduceusVariantSingleTokenEvaluator(VariantSingleTokenLikelihoodEvaluator):
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("caduceus", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     @property
     def start_token(self):
@@ -1124,7 +1125,7 @@ class CaduceusVariantSingleTokenEvaluator(VariantSingleTokenLikelihoodEvaluator)
         return 1
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(tokens_in)
             logits = torch_outs.logits.swapaxes(1, 2)
             lls = -F.cross_entropy(logits, tokens_out, reduction="none")
@@ -1132,13 +1133,14 @@ class CaduceusVariantSingleTokenEvaluator(VariantSingleTokenLikelihoodEvaluator)
 
 
 class NTVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     @property
     def start_token(self):
@@ -1150,18 +1152,13 @@ class NTVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
 
 
 class HDVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def model_fwd(self, tokens_in, attention_mask, tokens_out):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens_in,
             )
@@ -1182,12 +1179,8 @@ class HDVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
 
 
 class GenaLMVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -1200,18 +1193,8 @@ class GenaLMVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
 
 
 class DNABERT2VariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
-    _hidden_states = "last"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name, trust_remote_code=True)
-            model = AutoModelForMaskedLM.from_pretrained(
-                model_name, config=config, trust_remote_code=True
-            )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -1224,12 +1207,8 @@ class DNABERT2VariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
 
 
 class MistralVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "base")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
 
     @property
@@ -1242,15 +1221,10 @@ class MistralVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
 
 
 class CaduceusVariantEmbeddingEvaluator(VariantEmbeddingEvaluator):
-    _hidden_states = "all"
-
     def __init__(self, model_name, batch_size, num_workers, device):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("caduceus", model_name, "base")
         super().__init__(tokenizer, model, batch_size, num_workers, device)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     @property
     def start_token(self):
@@ -1,20 +1,22 @@
 import os
 
-from ....components import FootprintingDataset
+from ....components import MotifFootprintingDataset
 from ....embeddings import CaduceusEmbeddingExtractor
 
 root_output_dir = os.environ.get("DART_WORK_DIR", "")
 
 if __name__ == "__main__":
     model_name = "caduceus-ps_seqlen-131k_d_model-256_n_layer-16"
-    seq_table = os.path.join(
-        root_output_dir,
-        "task_2_footprinting/processed_data/footprint_dataset_350_v1.txt",
+    seqs = os.path.join(
+        root_output_dir, "task_2_footprinting/processed_data/raw_seqs_350.txt"
+    )
+    meme_file = os.path.join(
+        root_output_dir, "task_2_footprinting/input_data/H12CORE_meme_format.meme"
     )
     batch_size = 64
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     out_dir = os.path.join(root_output_dir, "task_2_footprinting/outputs/embeddings/")
     os.makedirs(out_dir, exist_ok=True)
@@ -22,6 +24,6 @@ if __name__ == "__main__":
         root_output_dir, f"task_2_footprinting/outputs/embeddings/{model_name}.h5"
     )
 
-    dataset = FootprintingDataset(seq_table, seed)
+    dataset = MotifFootprintingDataset(seqs, meme_file, seed)
     extractor = CaduceusEmbeddingExtractor(model_name, batch_size, num_workers, device)
     extractor.extract_embeddings(dataset, out_path, progress_bar=True)
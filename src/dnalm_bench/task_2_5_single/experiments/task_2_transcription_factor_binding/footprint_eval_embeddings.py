@@ -4,8 +4,8 @@ import os
 import h5py
 import numpy as np
 import pandas as pd
-from scipy.spatial.distance import cosine
-from scipy.stats import wilcoxon
+
+from .footprint_metrics import embedding_metrics
 
 os.environ["HDF5_USE_FILE_LOCKING"] = "FALSE"
 
@@ -18,7 +18,7 @@ def parse_args():
         "--input_seqs",
         type=str,
         required=True,
-        help="Text file containing input negative elements which were footprinted",
+        help="Text file containing IDs (first column) of the footprinted sequences",
     )
     parser.add_argument(
         "--embeddings",
@@ -65,89 +65,15 @@ def load_embeddings(emb_h5):
     return embedding_array
 
 
-def relate_embeddings_to_motifs(embedding_array, seq_data):
-    embeddings_dict = {}
-    for seq_ind in range(len(embedding_array)):
-        seq_key = seq_data.loc[seq_ind, 0].split("_")
-        if seq_key[0] not in embeddings_dict:
-            embeddings_dict[seq_key[0]] = {}
-        curr_subdict = embeddings_dict[seq_key[0]].get(seq_key[1], {})
-        if seq_key[1] == "raw":
-            curr_subdict[seq_key[2]] = embedding_array[seq_ind]
-            embeddings_dict[seq_key[0]][seq_key[1]] = curr_subdict
-            continue
-        if len(curr_subdict) == 0:
-            curr_subdict["forward"] = {}
-            curr_subdict["reverse"] = {}
-        curr_subdict[seq_key[2]][seq_key[3]] = embedding_array[seq_ind]
-        embeddings_dict[seq_key[0]][seq_key[1]] = curr_subdict
-    return embeddings_dict
-
-
-def get_distances(embeddings_dict):
-    distances_dict = {
-        x: {"true": [], "shuffled": []}
-        for x in embeddings_dict["0"].keys()
-        if x != "raw"
-    }
-    for seq in embeddings_dict:
-        seq_dict = embeddings_dict[seq]
-        for motif in seq_dict:
-            if motif == "raw":
-                continue
-            distances_dict[motif]["true"].append(
-                cosine(seq_dict["raw"]["forward"], seq_dict[motif]["forward"]["true"])
-            )
-            distances_dict[motif]["true"].append(
-                cosine(seq_dict["raw"]["reverse"], seq_dict[motif]["reverse"]["true"])
-            )
-            distances_dict[motif]["shuffled"].append(
-                cosine(
-                    seq_dict["raw"]["forward"], seq_dict[motif]["forward"]["shuffled"]
-                )
-            )
-            distances_dict[motif]["shuffled"].append(
-                cosine(
-                    seq_dict["raw"]["reverse"], seq_dict[motif]["reverse"]["shuffled"]
-                )
-            )
-    return distances_dict
-
-
-def get_accuracies(distances_dict):
-    accuracy_dict = {}
-    for seq in distances_dict:
-        true_distances = distances_dict[seq]["true"]
-        shuffled_distances = distances_dict[seq]["shuffled"]
-        accuracy_dict[seq] = sum(
-            [
-                true_distances[x] > shuffled_distances[x]
-                for x in range(len(true_distances))
-            ]
-        ) / len(true_distances)
-    return accuracy_dict
-
-
-def get_pvals(distances_dict):
-    pval_dict = {}
-    for seq in distances_dict:
-        true_distances = distances_dict[seq]["true"]
-        shuffled_distances = distances_dict[seq]["shuffled"]
-        pval_dict[seq] = wilcoxon(
-            true_distances, shuffled_distances, alternative="greater"
-        )[1]
-    return pval_dict
-
-
 def main():
     args = parse_args()
-    seq_data = pd.read_csv(args.input_seqs, sep="\t", header=None)
+    # Only the ID column is used, so either the full sequence table or an ID index works
+    seq_ids = pd.read_csv(args.input_seqs, sep="\t", header=None, usecols=[0])[0]
     emb_h5 = h5py.File(args.embeddings, "r")
     embedding_array = load_embeddings(emb_h5)
-    motif_embedding_dict = relate_embeddings_to_motifs(embedding_array, seq_data)
-    distances_dict = get_distances(motif_embedding_dict)
-    accuracies, pvals = get_accuracies(distances_dict), get_pvals(distances_dict)
-    final_df = pd.DataFrame([accuracies, pvals], index=["Accuracy", "P-Value"]).T
+    final_df = embedding_metrics(
+        seq_ids.to_numpy()[: len(embedding_array)], embedding_array
+    )
     final_df.to_csv(args.output_file, sep="\t", index=True, header=True)
 
 
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+from scipy.stats import wilcoxon
+
+_ID_PATTERN = (
+    r"^(?P<row>\d+)_(?P<motif>.+?)_(?P<orientation>forward|reverse)"
+    r"(?:_(?P<kind>true|shuffled))?$"
+)
+
+
+def parse_ids(ids):
+    """
+    Splits row_motif_orientation_kind sequence IDs into typed columns.
+    Raw sequences (row_raw_orientation) get the kind "raw".
+    """
+    parts = pd.Series(ids, dtype=str).str.extract(_ID_PATTERN)
+    if parts["row"].isna().any():
+        bad = parts.index[parts["row"].isna()][0]
+        raise ValueError(f"Malformed footprinting sequence ID: {ids[bad]}")
+
+    kind = parts["kind"].fillna("raw")
+    motif = parts["motif"].where(kind != "raw")
+    motif_names = pd.unique(motif.dropna())
+
+    ids_df = pd.DataFrame(
+        {
+            "row": parts["row"].astype(np.int64),
+            "motif": pd.Categorical(motif, categories=motif_names),
+            "orientation": parts["orientation"],
+            "kind": kind,
+        }
+    )
+
+    return ids_df
+
+
+def pair_indices(ids_df):
+    """
+    Returns the positions of the raw sequences, ordered by (row, orientation),
+    and of the true and shuffled insertions as (motif, row * orientation) arrays
+    aligned to the raw positions.
+    """
+    order = ids_df.sort_values(["motif", "row", "orientation"], kind="stable").index
+
+    is_raw = ids_df["kind"].to_numpy()[order] == "raw"
+    raw_idx = order[is_raw].to_numpy()
+    kinds = ids_df["kind"].to_numpy()[order[~is_raw]]
+    true_idx = order[~is_raw][kinds == "true"].to_numpy()
+    shuf_idx = order[~is_raw][kinds == "shuffled"].to_numpy()
+
+    motifs = ids_df["motif"].cat.categories
+    num_pairs = len(raw_idx)
+    if len(true_idx) != len(motifs) * num_pairs or len(shuf_idx) != len(true_idx):
+        raise ValueError(
+            "Each motif must have a true and shuffled insertion per raw sequence"
+        )
+
+    true_idx = true_idx.reshape(len(motifs), num_pairs)
+    shuf_idx = shuf_idx.reshape(len(motifs), num_pairs)
+
+    return motifs, raw_idx, true_idx, shuf_idx
+
+
+def _rowwise_dot(u, v):
+    # Batched matmul reduces each row the same way as np.dot on a single pair
+    return (u[:, None, :] @ v[:, :, None])[:, 0, 0]
+
+
+def cosine_distances(embeddings, idx_a, idx_b, chunk_size=65536):
+    """
+    Cosine distances between embeddings[idx_a] and embeddings[idx_b], matching
+    scipy.spatial.distance.cosine for each pair.
+    """
+    idx_a, idx_b = np.broadcast_arrays(idx_a, idx_b)
+    flat_a, flat_b = idx_a.ravel(), idx_b.ravel()
+
+    sq_norms = np.empty(embeddings.shape[0], dtype=embeddings.dtype)
+    for start in range(0, embeddings.shape[0], chunk_size):
+        chunk = embeddings[start : start + chunk_size]
+        sq_norms[start : start + chunk_size] = _rowwise_dot(chunk, chunk)
+
+    uv = np.empty(flat_a.shape[0], dtype=embeddings.dtype)
+    for start in range(0, flat_a.shape[0], chunk_size):
+        end = start + chunk_size
+        uv[start:end] = _rowwise_dot(
+            embeddings[flat_a[start:end]], embeddings[flat_b[start:end]]
+        )
+
+    denom = np.sqrt((sq_norms[flat_a] * sq_norms[flat_b]).astype(np.float64))
+    dists = np.abs(1.0 - uv.astype(np.float64) / denom)
+
+    return dists.reshape(idx_a.shape)
+
+
+def likelihood_metrics(ids, likelihoods):
+    """
+    Per-motif accuracy, Wilcoxon p-value and accuracy vs background for
+    likelihoods ordered like ids.
+    """
+    likelihoods = np.asarray(likelihoods, dtype=np.float64)
+    motifs, raw_idx, true_idx, shuf_idx = pair_indices(parse_ids(ids))
+
+    raw = likelihoods[raw_idx][None, :]
+    true = likelihoods[true_idx]
+    shuffled = likelihoods[shuf_idx]
+
+    accuracies = np.mean((true - shuffled) >= 0, axis=1)
+    pvals = wilcoxon(true, shuffled, alternative="greater", axis=1)[1]
+    background_accs = np.mean(np.abs(raw - true) > np.abs(raw - shuffled), axis=1)
+
+    metrics = pd.DataFrame(
+        {
+            "Accuracy": accuracies,
+            "P-Value": pvals,
+            "Accuracy vs Background": background_accs,
+        },
+        index=motifs,
+    )
+
+    return metrics
+
+
+def embedding_metrics(ids, embeddings):
+    """
+    Per-motif accuracy and Wilcoxon p-value for the cosine distances of true
+    and shuffled insertions from their raw sequence, for embeddings ordered like ids.
+    """
+    motifs, raw_idx, true_idx, shuf_idx = pair_indices(parse_ids(ids))
+
+    true_dists = cosine_distances(embeddings, raw_idx[None, :], true_idx)
+    shuf_dists = cosine_distances(embeddings, raw_idx[None, :], shuf_idx)
+
+    accuracies = np.mean(true_dists > shuf_dists, axis=1)
+    pvals = wilcoxon(true_dists, shuf_dists, alternative="greater", axis=1)[1]
+
+    metrics = pd.DataFrame({"Accuracy": accuracies, "P-Value": pvals}, index=motifs)
+
+    return metrics
@@ -1,141 +1,73 @@
-import json
 import os
 
-from statsmodels.stats.proportion import proportion_confint
+import numpy as np
+import polars as pl
 
-root_output_dir = os.environ.get("DART_WORK_DIR", "")
-print(root_output_dir)
-
-hyena_table_probed = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/probed/hyenadna-large-1m-seqlen-hf/eval_test.json",
-)
-with open(hyena_table_probed, "r") as f:
-    hyena_probed = json.load(f)
-
-hyena_table_finetuned = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/fine_tuned/hyenadna-large-1m-seqlen-hf/eval_test.json",
-)
-with open(hyena_table_finetuned, "r") as f:
-    hyena_finetuned = json.load(f)
-
-gena_table_probed = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/probed/gena-lm-bert-large-t2t/eval_test.json",
-)
-with open(gena_table_probed, "r") as f:
-    gena_probed = json.load(f)
-
-gena_table_finetuned = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/fine_tuned/gena-lm-bert-large-t2t/eval_test.json",
+from ....bootstrap import (
+    bootstrap_ci,
+    format_interval,
+    multiclass_statistics,
+    write_intervals,
 )
-with open(gena_table_finetuned, "r") as f:
-    gena_finetuned = json.load(f)
-
-dnabert_table_probed = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/probed/DNABERT-2-117M/eval_test.json",
-)
-with open(dnabert_table_probed, "r") as f:
-    dnabert_probed = json.load(f)
-
-dnabert_table_finetuned = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/fine_tuned/DNABERT-2-117M/eval_test.json",
-)
-with open(dnabert_table_finetuned, "r") as f:
-    dnabert_finetuned = json.load(f)
-
-nt_table_probed = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/probed/nucleotide-transformer-v2-500m-multi-species/eval_test.json",
-)
-with open(nt_table_probed, "r") as f:
-    nt_probed = json.load(f)
-
-nt_table_finetuned = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/fine_tuned/nucleotide-transformer-v2-500m-multi-species/eval_test.json",
-)
-with open(nt_table_finetuned, "r") as f:
-    nt_finetuned = json.load(f)
-
-mistral_table_probed = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/probed/Mistral-DNA-v1-1.6B-hg38/eval_test.json",
-)
-with open(mistral_table_probed, "r") as f:
-    mistral_probed = json.load(f)
-
-mistral_table_finetuned = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/fine_tuned/Mistral-DNA-v1-1.6B-hg38/eval_test.json",
-)
-with open(mistral_table_finetuned, "r") as f:
-    mistral_finetuned = json.load(f)
-
-caduceus_table_probed = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/probed/caduceus-ps_seqlen-131k_d_model-256_n_layer-16/eval_test.json",
-)
-with open(caduceus_table_probed, "r") as f:
-    caduceus_probed = json.load(f)
-
-caduceus_table_finetuned = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/fine_tuned/caduceus-ps_seqlen-131k_d_model-256_n_layer-16/eval_test.json",
-)
-with open(caduceus_table_finetuned, "r") as f:
-    caduceus_finetuned = json.load(f)
-
-ab_initio_table_probed = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/ab_initio/probing_head_like/eval_test.json",
-)
-with open(ab_initio_table_probed, "r") as f:
-    ab_initio_probed = json.load(f)
-
-ab_initio_table_chrombpnet = os.path.join(
-    root_output_dir,
-    "task_3_peak_classification/supervised_model_outputs/ab_initio/chrombpnet_like/eval_test.json",
-)
-with open(ab_initio_table_chrombpnet, "r") as f:
-    ab_initio_chrombpnet = json.load(f)
 
+root_output_dir = os.environ.get("DART_WORK_DIR", "")
+print(root_output_dir)
 
-def get_confidence_interval(data, num_ccres):
-    conf_int = proportion_confint(
-        data["test_acc"] * num_ccres, num_ccres, method="normal"
+num_replicates = 1000
+num_workers = 0
+seed = 0
+
+model_dirs = {
+    "PROBED": {
+        "DNABert2": "probed/DNABERT-2-117M",
+        "Gena LM": "probed/gena-lm-bert-large-t2t",
+        "Hyena DNA": "probed/hyenadna-large-1m-seqlen-hf",
+        "Mistral DNA": "probed/Mistral-DNA-v1-1.6B-hg38",
+        "Nucleotide Transformer": "probed/nucleotide-transformer-v2-500m-multi-species",
+        "Caduceus": "probed/caduceus-ps_seqlen-131k_d_model-256_n_layer-16",
+    },
+    "FINETUNED": {
+        "Caduceus": "fine_tuned/caduceus-ps_seqlen-131k_d_model-256_n_layer-16",
+        "DNABert2": "fine_tuned/DNABERT-2-117M",
+        "Gena LM": "fine_tuned/gena-lm-bert-large-t2t",
+        "Hyena DNA": "fine_tuned/hyenadna-large-1m-seqlen-hf",
+        "Mistral DNA": "fine_tuned/Mistral-DNA-v1-1.6B-hg38",
+        "Nucleotide Transformer": "fine_tuned/nucleotide-transformer-v2-500m-multi-species",
+    },
+    "AB INITIO": {
+        "Ab Initio (probed-like)": "ab_initio/probing_head_like",
+        "Ab Initio (chrombpnet-like)": "ab_initio/chrombpnet_like",
+    },
+}
+
+
+def peak_classifier_intervals(model_dir):
+    out_dir = os.path.join(
+        root_output_dir,
+        f"task_3_peak_classification/supervised_model_outputs/{model_dir}",
     )
-    interval = conf_int[1] - conf_int[0]
-    error = interval / 2
-    mean = (conf_int[1] + conf_int[0]) / 2
-    return f"{mean:.3f} $\pm$ {error:.3e}"
-
-
-num_peaks = 216747 - 1
+    scores = pl.read_csv(os.path.join(out_dir, "eval_test_scores.tsv"), separator="\t")
+
+    # Log-odds columns are written in class index order
+    log_odds_cols = [col for col in scores.columns if col.endswith("_log_odds")]
+    classes = {col[: -len("_log_odds")]: i for i, col in enumerate(log_odds_cols)}
+    log_odds = np.stack([scores[col].to_numpy() for col in log_odds_cols], axis=1)
+
+    statistics = multiclass_statistics(scores["label"].to_numpy(), log_odds, classes)
+    intervals = bootstrap_ci(
+        statistics,
+        scores.height,
+        num_replicates=num_replicates,
+        seed=seed,
+        num_workers=num_workers,
+    )
+    write_intervals(intervals, os.path.join(out_dir, "eval_test_ci.json"))
 
-print("PROBED")
-print("DNABert2", get_confidence_interval(dnabert_probed, num_peaks))
-print("Gena LM", get_confidence_interval(gena_probed, num_peaks))
-print("Hyena DNA", get_confidence_interval(hyena_probed, num_peaks))
-print("Mistral DNA", get_confidence_interval(mistral_probed, num_peaks))
-print("Nucleotide Transformer", get_confidence_interval(nt_probed, num_peaks))
-print("Caduceus", get_confidence_interval(caduceus_probed, num_peaks))
+    return intervals
 
-print("\nFINETUNED")
-print("Caduceus", get_confidence_interval(caduceus_finetuned, num_peaks))
-print("DNABert2", get_confidence_interval(dnabert_finetuned, num_peaks))
-print("Gena LM", get_confidence_interval(gena_finetuned, num_peaks))
-print("Hyena DNA", get_confidence_interval(hyena_finetuned, num_peaks))
-print("Mistral DNA", get_confidence_interval(mistral_finetuned, num_peaks))
-print("Nucleotide Transformer", get_confidence_interval(nt_finetuned, num_peaks))
 
-print("\nAB INITIO")
-print("Ab Initio (probed-like)", get_confidence_interval(ab_initio_probed, num_peaks))
-print(
-    "Ab Initio (chrombpnet-like)",
-    get_confidence_interval(ab_initio_chrombpnet, num_peaks),
-)
+for setting, models in model_dirs.items():
+    print(f"\n{setting}")
+    for name, model_dir in models.items():
+        intervals = peak_classifier_intervals(model_dir)
+        print(name, format_interval(intervals["test_acc"]))
@@ -31,7 +31,7 @@ if __name__ == "__main__":
     num_workers = 0
     prefetch_factor = None
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
@@ -91,7 +91,7 @@ if __name__ == "__main__":
     )
 
     model = LargeCNNClassifier(4, n_filters, n_residual_convs, len(classes), seq_len)
-    checkpoint_resume = torch.load(checkpoint_path)
+    checkpoint_resume = torch.load(checkpoint_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume, strict=False)
 
     metrics = eval_finetuned_peak_classifier(
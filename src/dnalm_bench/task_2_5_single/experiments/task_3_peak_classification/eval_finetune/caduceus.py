@@ -31,7 +31,7 @@ if __name__ == "__main__":
     num_workers = 4
     prefetch_factor = 2
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
@@ -95,7 +95,7 @@ if __name__ == "__main__":
     model = CaduceusLoRAModel(
         model_name, lora_rank, lora_alpha, lora_dropout, len(classes)
     )
-    checkpoint_resume = torch.load(checkpoint_path)
+    checkpoint_resume = torch.load(checkpoint_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume, strict=False)
 
     metrics = eval_finetuned_peak_classifier(
@@ -29,7 +29,7 @@ if __name__ == "__main__":
     num_workers = 0
     prefetch_factor = None
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
@@ -89,7 +89,7 @@ if __name__ == "__main__":
     model = CNNEmbeddingsPredictor(
         input_channels, hidden_channels, kernel_size, out_channels=len(classes)
     )
-    checkpoint_resume = torch.load(checkpoint_path)
+    checkpoint_resume = torch.load(checkpoint_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume)
 
     metrics = eval_peak_classifier(
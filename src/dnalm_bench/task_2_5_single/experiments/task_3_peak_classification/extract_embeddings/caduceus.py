@@ -18,7 +18,7 @@ if __name__ == "__main__":
     batch_size = 64
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     out_path = os.path.join(
         root_output_dir, f"task_3_peak_classification/embeddings/{model_name}.h5"
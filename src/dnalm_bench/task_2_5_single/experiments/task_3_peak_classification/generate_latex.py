@@ -1,73 +1,61 @@
-import json
+import os
 import sys
 
 from statsmodels.stats.proportion import proportion_confint
 
+from ....results import ResultsWarehouse
+
 # Sample JSON file paths for each model (replace these paths with actual paths)
 
-WORK_DIR = "/oak/stanford/groups/akundaje/arpitas/dart-eval/"
+WORK_DIR = os.environ.get(
+    "DART_WORK_DIR", "/oak/stanford/groups/akundaje/arpitas/dart-eval/"
+)
 
 setting_type = sys.argv[1] if len(sys.argv) > 1 else "probed"
-model_json_files = {
-    "Caduceus": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/{setting_type}/caduceus-ps_seqlen-131k_d_model-256_n_layer-16/eval_test.json",
-    "DNABERT-2": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/{setting_type}/DNABERT-2-117M/eval_test.json",
-    "GENA-LM": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/{setting_type}/gena-lm-bert-large-t2t/eval_test.json",
-    "HyenaDNA": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/{setting_type}/hyenadna-large-1m-seqlen-hf/eval_test.json",
-    "Mistral-DNA": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/{setting_type}/Mistral-DNA-v1-1.6B-hg38/eval_test.json",
-    "Nucleotide Transformer": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/{setting_type}/nucleotide-transformer-v2-500m-multi-species/eval_test.json",
-    "Probing-head-like": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/ab_initio/probing_head_like/eval_test.json",
-    "ChromBPNet-like": f"{WORK_DIR}/task_3_peak_classification/supervised_model_outputs/ab_initio/chrombpnet_like/eval_test.json",
+model_names = {
+    "Caduceus": (setting_type, "caduceus-ps_seqlen-131k_d_model-256_n_layer-16"),
+    "DNABERT-2": (setting_type, "DNABERT-2-117M"),
+    "GENA-LM": (setting_type, "gena-lm-bert-large-t2t"),
+    "HyenaDNA": (setting_type, "hyenadna-large-1m-seqlen-hf"),
+    "Mistral-DNA": (setting_type, "Mistral-DNA-v1-1.6B-hg38"),
+    "Nucleotide Transformer": (
+        setting_type,
+        "nucleotide-transformer-v2-500m-multi-species",
+    ),
+    "Probing-head-like": ("ab_initio", "probing_head_like"),
+    "ChromBPNet-like": ("ab_initio", "chrombpnet_like"),
 }
 
 num_peaks = 216747 - 1
 
 
-def get_confidence_interval(acc):
+def get_confidence_interval(result):
+    if result["ci_lower"] is not None:
+        # Bootstrap interval from confidence_intervals.py
+        error = (result["ci_upper"] - result["ci_lower"]) / 2
+        return result["value"], f"{result['value']:.4f} $\\pm$ {error:.4e}"
+    acc = result["value"]
     conf_int = proportion_confint(acc * num_peaks, num_peaks, method="normal")
     interval = conf_int[1] - conf_int[0]
     error = interval / 2
     mean = (conf_int[1] + conf_int[0]) / 2
-    return mean, f"{mean:.4f} $\pm$ {error:.4e}"
-
+    return mean, f"{mean:.4f} $\\pm$ {error:.4e}"
 
-def parse_model_metrics(json_file):
-    """Parse the model's metrics from the JSON file."""
-    with open(json_file, "r") as f:
-        data = json.load(f)
 
+def parse_model_metrics(data):
+    """Parse the model's metrics from its warehouse results."""
     # Extract accuracy, AUROC, and AUPRC for each class
-    metrics = {
-        "GM12878": {
-            "Accuracy": get_confidence_interval(data["class_GM12878_acc"])[0],
-            "Accuracy_Latex": get_confidence_interval(data["class_GM12878_acc"])[1],
-            "AUROC": data["class_GM12878_auroc"],
-            "AUPRC": data["class_GM12878_auprc"],
-        },
-        "H1ESC": {
-            "Accuracy": get_confidence_interval(data["class_H1ESC_acc"])[0],
-            "Accuracy_Latex": get_confidence_interval(data["class_H1ESC_acc"])[1],
-            "AUROC": data["class_H1ESC_auroc"],
-            "AUPRC": data["class_H1ESC_auprc"],
-        },
-        "HEPG2": {
-            "Accuracy": get_confidence_interval(data["class_HEPG2_acc"])[0],
-            "Accuracy_Latex": get_confidence_interval(data["class_HEPG2_acc"])[1],
-            "AUROC": data["class_HEPG2_auroc"],
-            "AUPRC": data["class_HEPG2_auprc"],
-        },
-        "IMR90": {
-            "Accuracy": get_confidence_interval(data["class_IMR90_acc"])[0],
-            "Accuracy_Latex": get_confidence_interval(data["class_IMR90_acc"])[1],
-            "AUROC": data["class_IMR90_auroc"],
-            "AUPRC": data["class_IMR90_auprc"],
-        },
-        "K562": {
-            "Accuracy": get_confidence_interval(data["class_K562_acc"])[0],
-            "Accuracy_Latex": get_confidence_interval(data["class_K562_acc"])[1],
-            "AUROC": data["class_K562_auroc"],
-            "AUPRC": data["class_K562_auprc"],
-        },
-    }
+    metrics = {}
+    for cell_type in ["GM12878", "H1ESC", "HEPG2", "IMR90", "K562"]:
+        accuracy, accuracy_latex = get_confidence_interval(
+            data[f"class_{cell_type}_acc"]
+        )
+        metrics[cell_type] = {
+            "Accuracy": accuracy,
+            "Accuracy_Latex": accuracy_latex,
+            "AUROC": data[f"class_{cell_type}_auroc"]["value"],
+            "AUPRC": data[f"class_{cell_type}_auprc"]["value"],
+        }
 
     return metrics
 
@@ -147,9 +135,16 @@ def main():
     model_metrics = {}
 
     # Parse the metrics for each model
-    for model_name, json_file in model_json_files.items():
-        metrics = parse_model_metrics(json_file)
-        model_metrics[model_name] = metrics
+    warehouse = ResultsWarehouse(WORK_DIR)
+    warehouse.ingest()
+    for name, (mode, model_name) in model_names.items():
+        results = warehouse.metrics_by_model(
+            "task_3_peak_classification", mode=mode, split="test", models=[model_name]
+        )
+        if model_name not in results:
+            print(f"No {mode} test metrics for {model_name}, skipping")
+            continue
+        model_metrics[name] = parse_model_metrics(results[model_name])
 
     # Generate and print a LaTeX table for each cell type
     cell_types = ["GM12878", "H1ESC", "HEPG2", "IMR90", "K562"]
@@ -2,7 +2,7 @@ import os
 import sys
 
 
-from ....chrombpnet_utils import *
+from ....tf_baselines.chrombpnet_utils import *
 
 root_output_dir = os.environ.get("DART_WORK_DIR", "")
 
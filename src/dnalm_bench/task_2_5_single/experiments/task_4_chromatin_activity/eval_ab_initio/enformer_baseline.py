@@ -2,7 +2,7 @@ import os
 import sys
 
 
-from ....enformer_utils import *
+from ....tf_baselines.enformer_utils import *
 
 root_output_dir = os.environ.get("DART_WORK_DIR", "")
 
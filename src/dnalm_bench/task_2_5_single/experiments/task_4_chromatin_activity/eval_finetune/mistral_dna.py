@@ -47,7 +47,7 @@ if __name__ == "__main__":
     num_workers = 4
     prefetch_factor = 2
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
@@ -111,7 +111,7 @@ if __name__ == "__main__":
     )
 
     model = MistralDNALoRAModel(model_name, lora_rank, lora_alpha, lora_dropout, 1)
-    checkpoint_resume = torch.load(checkpoint_path)
+    checkpoint_resume = torch.load(checkpoint_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume, strict=False)
 
     metrics = evaluate_finetuned_chromatin_model(
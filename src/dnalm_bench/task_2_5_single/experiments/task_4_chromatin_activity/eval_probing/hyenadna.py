@@ -53,7 +53,7 @@ if __name__ == "__main__":
     num_workers = 0
     prefetch_factor = None
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     chroms_train = [
         "chr1",
@@ -115,7 +115,7 @@ if __name__ == "__main__":
     )
 
     model = CNNSlicedEmbeddingsPredictor(input_channels, hidden_channels, kernel_size)
-    checkpoint_resume = torch.load(checkpoint_path)
+    checkpoint_resume = torch.load(checkpoint_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume, strict=False)
 
     metrics = evaluate_chromatin_model(
@@ -28,7 +28,7 @@ if __name__ == "__main__":
     batch_size = 256
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
 
     out_dir = os.path.join(
         root_output_dir, f"task_4_chromatin_activity/embeddings/{model_name}/"
@@ -1,11 +1,15 @@
-import json
+import os
 import sys
 
 from statsmodels.stats.proportion import proportion_confint
 
+from ....results import ResultsWarehouse
+
 # Sample JSON file paths for each model (replace these paths with actual paths)
 
-WORK_DIR = "/oak/stanford/groups/akundaje/arpitas/dart-eval/"
+WORK_DIR = os.environ.get(
+    "DART_WORK_DIR", "/oak/stanford/groups/akundaje/arpitas/dart-eval/"
+)
 
 setting_type = sys.argv[1] if len(sys.argv) > 1 else "probed"
 
@@ -20,19 +24,16 @@ def get_confidence_interval(acc):
     return mean, f"{mean:.4f} $\pm$ {error:.4e}"
 
 
-def parse_model_metrics(json_file):
-    """Parse the model's metrics from the JSON file."""
-    with open(json_file, "r") as f:
-        data = json.load(f)
-
+def parse_model_metrics(data):
+    """Parse the model's metrics from its warehouse results."""
     # Extract accuracy, AUROC, and AUPRC for each class
     metrics = {
-        "Spearman r Peaks": data["test_spearman_pos"],
-        "Pearson r Peaks": data["test_pearson_pos"],
-        "Spearman r All": data["test_spearman_all"],
-        "Pearson r All": data["test_pearson_all"],
-        "AUROC": data["test_auroc"],
-        "AUPRC": data["test_auprc"],
+        "Spearman r Peaks": data["test_spearman_pos"]["value"],
+        "Pearson r Peaks": data["test_pearson_pos"]["value"],
+        "Spearman r All": data["test_spearman_all"]["value"],
+        "Pearson r All": data["test_pearson_all"]["value"],
+        "AUROC": data["test_auroc"]["value"],
+        "AUPRC": data["test_auprc"]["value"],
     }
 
     return metrics
@@ -145,25 +146,37 @@ Model                   & Accuracy & AUROC  & AUPRC  \\\\ \\hline
 
 
 def main():
-    # Dictionary to store model metrics
-    model_metrics = {}
     cell_types = ["GM12878", "H1ESC", "HEPG2", "IMR90", "K562"]
 
+    model_names = {
+        "Caduceus": "caduceus-ps_seqlen-131k_d_model-256_n_layer-16",
+        "DNABERT-2": "DNABERT-2-117M",
+        "GENA-LM": "gena-lm-bert-large-t2t",
+        "HyenaDNA": "hyenadna-large-1m-seqlen-hf",
+        "Mistral-DNA": "Mistral-DNA-v1-1.6B-hg38",
+        "Nucleotide Transformer": "nucleotide-transformer-v2-500m-multi-species",
+    }
+
+    warehouse = ResultsWarehouse(WORK_DIR)
+    warehouse.ingest()
+
     for cell_type in cell_types:
-        model_json_files = {
-            "Caduceus": f"{WORK_DIR}/task_4_chromatin_activity/supervised_model_outputs/{setting_type}/caduceus-ps_seqlen-131k_d_model-256_n_layer-16/{cell_type}/eval_test.json",
-            "DNABERT-2": f"{WORK_DIR}/task_4_chromatin_activity/supervised_model_outputs/{setting_type}/DNABERT-2-117M/{cell_type}/eval_test.json",
-            "GENA-LM": f"{WORK_DIR}/task_4_chromatin_activity/supervised_model_outputs/{setting_type}/gena-lm-bert-large-t2t/{cell_type}/eval_test.json",
-            "HyenaDNA": f"{WORK_DIR}/task_4_chromatin_activity/supervised_model_outputs/{setting_type}/hyenadna-large-1m-seqlen-hf/{cell_type}/eval_test.json",
-            "Mistral-DNA": f"{WORK_DIR}/task_4_chromatin_activity/supervised_model_outputs/{setting_type}/Mistral-DNA-v1-1.6B-hg38/{cell_type}/eval_test.json",
-            "Nucleotide Transformer": f"{WORK_DIR}/task_4_chromatin_activity/supervised_model_outputs/{setting_type}/nucleotide-transformer-v2-500m-multi-species/{cell_type}/eval_test.json",
-            # "ChromBPNet": f"{WORK_DIR}/task_4_chromatin_activity/supervised_model_outputs/ab_initio/chrombpnet_like/{cell_type}/eval_test.json"
-        }
+        model_metrics = {}
+        results = warehouse.metrics_by_model(
+            "task_4_chromatin_activity",
+            mode=setting_type,
+            split="test",
+            cell_line=cell_type,
+        )
 
         # Parse the metrics for each model
-        for model_name, json_file in model_json_files.items():
-            metrics = parse_model_metrics(json_file)
-            model_metrics[model_name] = metrics
+        for name, model_name in model_names.items():
+            if model_name not in results:
+                print(
+                    f"No {setting_type} {cell_type} metrics for {model_name}, skipping"
+                )
+                continue
+            model_metrics[name] = parse_model_metrics(results[model_name])
 
         latex_table = generate_latex_table_per_cell_type(model_metrics, cell_type)
 
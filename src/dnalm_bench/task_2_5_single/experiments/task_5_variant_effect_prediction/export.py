@@ -14,7 +14,7 @@ if __name__ == "__main__":
     batch_size = 256
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
     chroms = None
 
     out_path = os.path.join(work_dir, "task_5_variant_effect_prediction/data.h5")
@@ -6,6 +6,7 @@ import pandas as pd
 import polars as pl
 import torch
 
+from .....variant_cache import VariantScoreCache, file_hash
 from ....components import VariantDataset
 from ....evaluators import FinetunedVariantEvaluator
 from ....finetune import GENALMLoRAModel
@@ -17,7 +18,7 @@ if __name__ == "__main__":
     batch_size = 512
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
     chroms = None
 
     variants_bed = sys.argv[1]
@@ -48,11 +49,21 @@ if __name__ == "__main__":
     out_path = os.path.join(out_dir, f"{output_prefix}.tsv")
 
     model = GENALMLoRAModel(model_name, lora_rank, lora_alpha, lora_dropout, 1)
-    checkpoint_resume = torch.load(model_path)
+    checkpoint_resume = torch.load(model_path, map_location="cpu")
     model.load_state_dict(checkpoint_resume, strict=False)
     dataset = VariantDataset(genome_fa, variants_bed, chroms, seed)
     evaluator = FinetunedVariantEvaluator(model, batch_size, num_workers, device)
-    counts_df = evaluator.evaluate(dataset, out_path, progress_bar=True)
+    cache = VariantScoreCache(
+        os.path.join(
+            root_output_dir, "task_5_variant_effect_prediction/score_cache.sqlite"
+        ),
+        f"{model_name}:{file_hash(model_path)}",
+        "finetuned",
+        genome_fa,
+        dataset.window,
+    )
+    counts_df = evaluator.evaluate(dataset, out_path, progress_bar=True, cache=cache)
+    print(cache.report())
 
     df = dataset.elements_df
     scored_df = pl.concat([df, counts_df], how="horizontal")
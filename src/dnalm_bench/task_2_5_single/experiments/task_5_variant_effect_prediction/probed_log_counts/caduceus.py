@@ -5,6 +5,7 @@ import numpy as np
 import pandas as pd
 import polars as pl
 
+from .....variant_cache import VariantScoreCache, file_hash
 from ....components import VariantDataset
 from ....evaluators import CaduceusProbingVariantEvaluator
 from ....training import CNNEmbeddingsPredictorBase
@@ -17,7 +18,7 @@ if __name__ == "__main__":
     batch_size = 256
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
     chroms = None
 
     variants_bed = sys.argv[1]
@@ -52,7 +53,17 @@ if __name__ == "__main__":
     evaluator = CaduceusProbingVariantEvaluator(
         model, model_path, model_name, batch_size, num_workers, device
     )
-    counts_df = evaluator.evaluate(dataset, out_path, progress_bar=True)
+    cache = VariantScoreCache(
+        os.path.join(
+            root_output_dir, "task_5_variant_effect_prediction/score_cache.sqlite"
+        ),
+        f"{model_name}:{file_hash(model_path)}",
+        "probed",
+        genome_fa,
+        dataset.window,
+    )
+    counts_df = evaluator.evaluate(dataset, out_path, progress_bar=True, cache=cache)
+    print(cache.report())
 
     df = dataset.elements_df
     scored_df = pl.concat([df, counts_df], how="horizontal")
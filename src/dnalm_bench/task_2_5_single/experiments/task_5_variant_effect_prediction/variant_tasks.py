@@ -1,10 +1,12 @@
 import os
+from functools import lru_cache
 
 import numpy as np
 
 os.environ["HDF5_USE_FILE_LOCKING"] = "FALSE"
 import matplotlib.pyplot as plt
 import pandas as pd
+import polars as pl
 import seaborn as sns
 from scipy.stats import mannwhitneyu, pearsonr, spearmanr
 from sklearn.metrics import (
@@ -12,6 +14,16 @@ from sklearn.metrics import (
     roc_auc_score,
 )
 
+from ....bootstrap import (
+    auroc,
+    average_precision,
+    bootstrap_indices,
+    bootstrap_weights,
+    pearson,
+    percentile_interval,
+    spearman,
+)
+
 os.environ["DART_WORK_DIR"] = "/oak/stanford/groups/akundaje/arpitas/dart-eval"
 work_dir = os.environ.get("DART_WORK_DIR", "")
 
@@ -30,33 +42,16 @@ def compute_precision_recall(labels, llm_scores):
 
     sorted_indices = np.argsort(llm_scores)[::-1]
     sorted_indices = sorted_indices.astype(int)
-    llm_scores = llm_scores[sorted_indices]
     labels = labels[sorted_indices]
 
-    precisions = []
-    recalls = []
-    thresholds = []
-
-    tp = 0
-    fp = 0
-    fn = np.sum(labels)
-
-    for i in range(len(labels)):
-        if labels[i] == 1:
-            tp += 1
-            fn -= 1
-        else:
-            fp += 1
-
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 1
-        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+    tp = np.cumsum(labels == 1)
+    num_pos = tp[-1] if len(tp) > 0 else 0
 
-        precisions.append(precision)
-        recalls.append(recall)
-        thresholds.append(llm_scores[i])
-
-    precisions = np.array(precisions)
-    recalls = np.array(recalls)
+    precisions = tp / np.arange(1, len(labels) + 1)
+    if num_pos > 0:
+        recalls = tp / num_pos
+    else:
+        recalls = np.zeros(len(labels))
 
     return precisions, recalls
 
@@ -75,11 +70,16 @@ def compute_change(filtered_variants_df, switch=False):
     return filtered_variants_df, np.abs(filtered_variants_df["llm_logfc"])
 
 
+@lru_cache(maxsize=None)
+def _read_benchmark_tsv(path):
+    return pd.read_csv(path, sep="\t")
+
+
 def sig_ctrl_variants_Afr_CaQTLs(scores_data_path):
     afr_caqtls_data_path = os.path.join(
         work_dir, "task_5_variant_effect_prediction/input_data/Afr.CaQTLS.tsv"
     )
-    afr_caQTLs_df = pd.read_csv(afr_caqtls_data_path, sep="\t")
+    afr_caQTLs_df = _read_benchmark_tsv(afr_caqtls_data_path)
     likelihoods = pd.read_csv(scores_data_path, sep="\t")
 
     if "allele1_scores" in likelihoods.columns:
@@ -116,7 +116,7 @@ def variants_Yoruba_LCL_dsQTLs(scores_data_path):
         work_dir,
         "task_5_variant_effect_prediction/input_data/yoruban.dsqtls.benchmarking.tsv",
     )
-    yoruba_dsQTLs_df = pd.read_csv(yoruba_dsqtls_data_path, sep="\t")
+    yoruba_dsQTLs_df = _read_benchmark_tsv(yoruba_dsqtls_data_path)
     likelihoods = pd.read_csv(scores_data_path, sep="\t")
 
     if "allele1_scores" in likelihoods.columns:
@@ -267,3 +267,192 @@ def est_size_logfc(filtered_df, title, ylabel="LogFC Scores", yaxis="llm_logfc")
     plt.grid()
     plt.show()
     return pearson_corr, spearman_corr
+
+
+# Benchmarks as (input table, variant key columns, filter columns, label column,
+# control label, effect size columns, whether logFC is allele1 - allele2)
+VARIANT_BENCHMARKS = {
+    "afr_caqtls": (
+        "task_5_variant_effect_prediction/input_data/Afr.CaQTLS.tsv",
+        ["chr_hg38", "pos_hg38", "allele1", "allele2"],
+        ["IsUsed", "in_peaks"],
+        "label",
+        0,
+        ["Beta", "beta"],
+        False,
+    ),
+    "yoruba_dsqtls": (
+        "task_5_variant_effect_prediction/input_data/yoruban.dsqtls.benchmarking.tsv",
+        ["var.chrom", "var.pos", "var.allele1", "var.allele2"],
+        ["var.isused"],
+        "var.label",
+        -1,
+        ["obs.estimate"],
+        True,
+    ),
+}
+
+_BOOTSTRAP_CHUNK_ELEMENTS = 2**24
+
+
+def _key_dtypes(keys):
+    return dict(zip(keys, [pl.Utf8, pl.Int64, pl.Utf8, pl.Utf8]))
+
+
+def _as_bool(col):
+    if col.dtype == pl.Boolean:
+        return col
+    return col.cast(pl.Utf8).str.to_lowercase().is_in(["true", "1"])
+
+
+@lru_cache(maxsize=None)
+def load_benchmark(benchmark):
+    """
+    Loads a variant benchmark once as a typed table of the used variants, with a
+    boolean "label" (significant vs. control) and a float "effect" column.
+    """
+    path, keys, used_cols, label_col, ctrl_label, effect_cols, _ = VARIANT_BENCHMARKS[
+        benchmark
+    ]
+    df = pl.read_csv(
+        os.path.join(work_dir, path),
+        separator="\t",
+        dtypes=_key_dtypes(keys),
+        infer_schema_length=None,
+    )
+
+    used = pl.lit(True)
+    for col in used_cols:
+        used = used & _as_bool(df[col])
+    effect_col = next(col for col in effect_cols if col in df.columns)
+
+    df = (
+        df.filter(used & pl.col(label_col).is_in([1, ctrl_label]))
+        .with_columns(
+            (pl.col(label_col) == 1).alias("label"),
+            pl.col(effect_col).cast(pl.Float64).alias("effect"),
+        )
+        .select(keys + ["label", "effect"])
+    )
+
+    return df
+
+
+def load_variant_scores(benchmark, score_paths):
+    """
+    Joins each model's variant scores onto the benchmark. Returns the table,
+    with one column per model holding its logFC (or cosine distance for
+    embedding scores), and the set of models scored by embedding distance.
+    """
+    _, keys, _, _, _, _, switch = VARIANT_BENCHMARKS[benchmark]
+    table = load_benchmark(benchmark)
+
+    distance_models = set()
+    for model, path in score_paths.items():
+        header = pl.read_csv(path, separator="\t", n_rows=0).columns
+        if "allele1_scores" in header:
+            score_cols = ["allele1_scores", "allele2_scores"]
+        else:
+            score_cols = ["cosine_distance"]
+            distance_models.add(model)
+
+        scores = pl.read_csv(
+            path,
+            separator="\t",
+            columns=keys + score_cols,
+            dtypes=_key_dtypes(keys),
+        )
+        if model in distance_models:
+            score = pl.col("cosine_distance")
+        elif switch:
+            score = pl.col("allele1_scores") - pl.col("allele2_scores")
+        else:
+            score = pl.col("allele2_scores") - pl.col("allele1_scores")
+
+        scores = scores.select(keys + [score.cast(pl.Float64).alias(model)])
+        table = table.join(scores, on=keys, how="inner")
+
+    return table, distance_models
+
+
+def _bootstrap(statistic, arrays, indices):
+    # Evaluates statistic on (models, replicates) chunks, weighting the
+    # original samples by their multiplicity in each replicate
+    num_models, num_samples = arrays[0].shape
+    chunk_size = max(1, _BOOTSTRAP_CHUNK_ELEMENTS // (num_models * num_samples))
+
+    replicates = []
+    for start in range(0, indices.shape[0], chunk_size):
+        weights = bootstrap_weights(indices[start : start + chunk_size], num_samples)
+        replicates.append(statistic(*arrays, weights=weights))
+
+    return np.concatenate(replicates, axis=-1).T
+
+
+def benchmark_metrics(benchmark, score_paths, num_bootstrap=1000, alpha=0.05, seed=0):
+    """
+    AUROC and AUPRC of |logFC| for significant vs. control variants, Pearson
+    and Spearman correlation of logFC with the measured effect size over the
+    significant variants, and the Mann-Whitney p-value, for all models at once.
+    Confidence intervals come from a shared (paired) bootstrap over variants,
+    stratified by label for AUROC and AUPRC.
+    """
+    table, distance_models = load_variant_scores(benchmark, score_paths)
+    models = list(score_paths)
+
+    labels = table["label"].to_numpy()
+    effects = table["effect"].to_numpy()
+    logfc = np.stack([table[model].to_numpy() for model in models])
+    scores = np.abs(logfc)
+
+    rng = np.random.default_rng(seed)
+    metrics = {}
+
+    metrics["AUROC"] = (
+        auroc(scores, labels),
+        _bootstrap(
+            auroc,
+            [scores, labels[None, :]],
+            bootstrap_indices(len(labels), num_bootstrap, rng, strata=labels),
+        ),
+    )
+    metrics["AUPRC"] = (
+        average_precision(scores, labels),
+        _bootstrap(
+            average_precision,
+            [scores, labels[None, :]],
+            bootstrap_indices(len(labels), num_bootstrap, rng, strata=labels),
+        ),
+    )
+
+    sig_logfc = logfc[:, labels]
+    sig_effects = effects[None, labels]
+    sig_indices = bootstrap_indices(sig_logfc.shape[1], num_bootstrap, rng)
+    metrics["Pearson"] = (
+        pearson(sig_logfc, sig_effects),
+        _bootstrap(pearson, [sig_logfc, sig_effects], sig_indices),
+    )
+    metrics["Spearman"] = (
+        spearman(sig_logfc, sig_effects),
+        _bootstrap(spearman, [sig_logfc, sig_effects], sig_indices),
+    )
+
+    pvals = mannwhitneyu(
+        scores[:, ~labels], scores[:, labels], alternative="less", axis=1
+    )[1]
+
+    rows = []
+    for metric, (estimates, replicates) in metrics.items():
+        lower, upper = percentile_interval(replicates, alpha)
+        for i, model in enumerate(models):
+            if metric in ("Pearson", "Spearman") and model in distance_models:
+                continue
+            rows.append([model, metric, estimates[i], lower[i], upper[i]])
+    for i, model in enumerate(models):
+        rows.append([model, "Mann-Whitney P-Value", pvals[i], np.nan, np.nan])
+
+    results = pd.DataFrame(
+        rows, columns=["model", "metric", "estimate", "ci_lower", "ci_upper"]
+    )
+
+    return results
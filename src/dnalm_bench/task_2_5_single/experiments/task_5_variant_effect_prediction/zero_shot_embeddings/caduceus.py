@@ -1,9 +1,9 @@
 import os
 import sys
 
-import numpy as np
 import polars as pl
 
+from .....variant_cache import VariantScoreCache, pretrained_model_id
 from ....components import VariantDataset
 from ....evaluators import CaduceusVariantEmbeddingEvaluator
 
@@ -15,7 +15,7 @@ if __name__ == "__main__":
     batch_size = 256
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
     chroms = None
 
     variants_bed = sys.argv[1]
@@ -43,15 +43,26 @@ if __name__ == "__main__":
         model_name, batch_size, num_workers, device
     )
 
+    cache = VariantScoreCache(
+        os.path.join(
+            root_output_dir, "task_5_variant_effect_prediction/score_cache.sqlite"
+        ),
+        pretrained_model_id(model_name, evaluator),
+        "zero_shot_embedding",
+        genome_fa,
+        dataset.window,
+    )
     score_df, allele1_embeddings, allele2_embeddings = evaluator.evaluate(
-        dataset, out_path, progress_bar=True
+        dataset,
+        out_path,
+        progress_bar=True,
+        allele1_embeddings_path=allele1_embeddings_path,
+        allele2_embeddings_path=allele2_embeddings_path,
+        cache=cache,
     )
+    print(cache.report())
 
     df = dataset.elements_df
     scored_df = pl.concat([df, score_df], how="horizontal")
     print(out_path)
     scored_df.write_csv(out_path, separator="\t")
-
-    # Save embeddings
-    np.save(allele1_embeddings_path, allele1_embeddings)
-    np.save(allele2_embeddings_path, allele2_embeddings)
@@ -3,6 +3,7 @@ import sys
 
 import polars as pl
 
+from .....variant_cache import VariantScoreCache, pretrained_model_id
 from ....components import VariantDataset
 from ....evaluators import NTVariantSingleTokenEvaluator
 
@@ -15,7 +16,7 @@ if __name__ == "__main__":
     batch_size = 128
     num_workers = 0
     seed = 0
-    device = "cuda"
+    device = os.environ.get("DART_DEVICE", "auto")
     chroms = None
 
     variants_bed = sys.argv[1]
@@ -34,7 +35,17 @@ if __name__ == "__main__":
     evaluator = NTVariantSingleTokenEvaluator(
         model_name, batch_size, num_workers, device
     )
-    score_df = evaluator.evaluate(dataset, out_path, progress_bar=True)
+    cache = VariantScoreCache(
+        os.path.join(
+            root_output_dir, "task_5_variant_effect_prediction/score_cache.sqlite"
+        ),
+        pretrained_model_id(model_name, evaluator),
+        "zero_shot_likelihood",
+        genome_fa,
+        dataset.window,
+    )
+    score_df = evaluator.evaluate(dataset, out_path, progress_bar=True, cache=cache)
+    print(cache.report())
 
     df = dataset.elements_df
     scored_df = pl.concat([df, score_df], how="horizontal")
@@ -1,28 +1,28 @@
 import hashlib
-import importlib
 import json
 import os
 import shutil
+import sys
+import time
 import warnings
 
 import numpy as np
 import polars as pl
-import pyBigWig
-import pyfaidx
 import torch
 import torch.nn.functional as F
-from sklearn.metrics import average_precision_score, matthews_corrcoef, roc_auc_score
-from torch.utils.data import ConcatDataset, DataLoader, Dataset
+from torch.utils.data import ConcatDataset, DataLoader, Dataset, Sampler, Subset
 from tqdm import tqdm
-from transformers import (
-    AutoModel,
-    AutoModelForSequenceClassification,
-    AutoTokenizer,
-    BertConfig,
-)
 
+from ..devices import resolve_device
 from ..finetune import HFClassifierModel, LoRAModule
-from ..utils import NoModule, log1mexp, one_hot_encode, onehot_to_chars
+from ..microbatch import MicroBatchCache, MicroBatcher
+from ..models import load_native_tokenizer, load_pretrained
+from ..synthetic import write_bigwig, write_genome_fasta
+from ..utils import lazy_import, log1mexp, one_hot_encode
+
+pyBigWig = lazy_import("pyBigWig")
+pyfaidx = lazy_import("pyfaidx")
+skmetrics = lazy_import("sklearn.metrics")
 
 
 class ChromatinEndToEndDataset(Dataset):
@@ -80,8 +80,7 @@ class ChromatinEndToEndDataset(Dataset):
         self.bw = bigwig
 
         self.downsample_ratio = downsample_ratio
-        if downsample_ratio is None:
-            self.elements_df = self.elements_df_all
+        self.elements_df = self.elements_df_all
 
     @classmethod
     def _load_elements(cls, elements_file, chroms):
@@ -104,14 +103,16 @@ class ChromatinEndToEndDataset(Dataset):
         except FileExistsError:
             pass
 
-    def set_epoch(self, epoch):
+    def epoch_indices(self, epoch):
+        """
+        Indices of the elements to train on in an epoch: every
+        downsample_ratio-th element, starting from a different one each epoch
+        """
         if self.downsample_ratio is None:
-            return
+            return np.arange(len(self))
 
         offset = epoch % self.downsample_ratio
-        self.elements_df = self.elements_df_all.take_every(
-            n=self.downsample_ratio, offset=offset
-        )
+        return np.arange(offset, len(self), self.downsample_ratio)
 
     def __len__(self):
         return self.elements_df.height
@@ -161,6 +162,48 @@ class ChromatinEndToEndDataset(Dataset):
         return torch.from_numpy(seq), torch.from_numpy(signal)
 
 
+class EpochSubsetSampler(Sampler):
+    """
+    Samples the concatenation of datasets (as ConcatDataset orders them),
+    taking from each the subset given by its epoch_indices(epoch), or all of
+    it, in an order shuffled anew each epoch. Since only the sampler changes
+    between epochs and it lives in the main process, one DataLoader with
+    persistent workers can serve every epoch.
+    """
+
+    def __init__(self, datasets, shuffle=True, seed=0):
+        self.datasets = datasets
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _indices(self):
+        indices = []
+        offset = 0
+        for d in self.datasets:
+            if hasattr(d, "epoch_indices"):
+                indices.append(d.epoch_indices(self.epoch) + offset)
+            else:
+                indices.append(np.arange(len(d)) + offset)
+            offset += len(d)
+
+        indices = np.concatenate(indices)
+        if self.shuffle:
+            rng = np.random.default_rng((self.seed, self.epoch))
+            indices = rng.permutation(indices)
+
+        return indices
+
+    def __len__(self):
+        return len(self._indices())
+
+    def __iter__(self):
+        return iter(self._indices().tolist())
+
+
 class PeaksEndToEndDataset(Dataset):
     _elements_dtypes = {
         "chr": pl.Utf8,
@@ -315,13 +358,15 @@ def train_finetuned_chromatin_model(
     progress_bar=False,
     resume_from=None,
     seed=0,
+    micro_batch_size=None,
 ):
+    device = resolve_device(device, num_workers)
 
     val_pos_dataloader = DataLoader(
         val_pos_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=True,
     )
@@ -329,7 +374,19 @@ def train_finetuned_chromatin_model(
         val_neg_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
+        prefetch_factor=prefetch_factor,
+        persistent_workers=True,
+    )
+
+    train_datasets = [train_pos_dataset, train_neg_dataset]
+    train_sampler = EpochSubsetSampler(train_datasets, seed=seed)
+    train_dataloader = DataLoader(
+        ConcatDataset(train_datasets),
+        batch_size=batch_size,
+        sampler=train_sampler,
+        num_workers=num_workers,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=True,
     )
@@ -350,15 +407,23 @@ def train_finetuned_chromatin_model(
     model.to(device)
     optimizer = torch.optim.AdamW(model.parameters(), lr=lr, weight_decay=wd)
 
+    def train_loss(seq, true_counts):
+        log1p_counts = model(seq).squeeze(1)
+        return log1pMSELoss(log1p_counts, true_counts) / accumulate
+
+    micro_batcher = MicroBatcher(
+        device, micro_batch_size, model, mode="train", cache=MicroBatchCache()
+    )
+
     if resume_from is not None:
         # start_epoch = int(resume_from.split("_")[-1].split(".")[0]) + 1
         resume_checkpoint_path = os.path.join(out_dir, f"checkpoint_{resume_from}.pt")
         optimizer_checkpoint_path = os.path.join(out_dir, f"optimizer_{resume_from}.pt")
         start_epoch = resume_from + 1
-        checkpoint_resume = torch.load(resume_checkpoint_path)
+        checkpoint_resume = torch.load(resume_checkpoint_path, map_location="cpu")
         model.load_state_dict(checkpoint_resume, strict=False)
         try:
-            optimizer_resume = torch.load(optimizer_checkpoint_path)
+            optimizer_resume = torch.load(optimizer_checkpoint_path, map_location="cpu")
             optimizer.load_state_dict(optimizer_resume)
         except FileNotFoundError:
             warnings.warn(
@@ -374,18 +439,7 @@ def train_finetuned_chromatin_model(
 
         for epoch in range(start_epoch, num_epochs):
             model.train()
-            train_pos_dataset.set_epoch(epoch)
-            train_neg_dataset.set_epoch(epoch)
-            train_dataset = ConcatDataset([train_pos_dataset, train_neg_dataset])
-            train_dataloader = DataLoader(
-                train_dataset,
-                batch_size=batch_size,
-                num_workers=num_workers,
-                shuffle=True,
-                pin_memory=True,
-                prefetch_factor=prefetch_factor,
-                persistent_workers=True,
-            )
+            train_sampler.set_epoch(epoch)
 
             optimizer.zero_grad()
             for i, (seq, track) in enumerate(
@@ -400,33 +454,7 @@ def train_finetuned_chromatin_model(
                 track = track.to(device)
                 true_counts = track.sum(dim=1)
 
-                fallback = False
-                try:
-                    log1p_counts = model(seq).squeeze(1)
-                    loss = log1pMSELoss(log1p_counts, true_counts) / accumulate
-                    loss.backward()
-                except torch.cuda.OutOfMemoryError:
-                    fallback = True
-                    warnings.warn(
-                        f"Batch {i} does not fit in memory, falling back to single sequence processing"
-                    )
-
-                if fallback:
-                    for j in range(seq.shape[0]):
-                        try:
-                            seq_j = seq[j : j + 1]
-                            true_counts_j = true_counts[j : j + 1]
-
-                            log1p_counts_j = model(seq_j).squeeze(1)
-                            loss_j = log1pMSELoss(log1p_counts_j, true_counts_j) / (
-                                accumulate * seq.shape[0]
-                            )
-                            loss_j.backward()
-
-                        except torch.cuda.OutOfMemoryError:
-                            warnings.warn(
-                                f"Failed to process sequence {i*j} due to OOM"
-                            )
+                micro_batcher.backward(train_loss, seq, true_counts)
 
                 if (i + 1) % accumulate == 0:
                     optimizer.step()
@@ -521,6 +549,7 @@ def evaluate_finetuned_chromatin_model(
     progress_bar=False,
     seed=0,
 ):
+    device = resolve_device(device, num_workers)
     # val_loss = 0
     # val_counts_pred = []
     # val_counts_true = []
@@ -530,7 +559,7 @@ def evaluate_finetuned_chromatin_model(
 
     model.eval()
 
-    with torch.no_grad():
+    with torch.inference_mode():
         test_loss_pos = 0
         test_counts_pred_pos = []
         test_counts_true_pos = []
@@ -538,7 +567,7 @@ def evaluate_finetuned_chromatin_model(
             pos_dataset,
             batch_size=batch_size,
             num_workers=num_workers,
-            pin_memory=True,
+            pin_memory=device.type == "cuda",
             prefetch_factor=prefetch_factor,
         )
         for i, (seq, track) in enumerate(
@@ -572,7 +601,7 @@ def evaluate_finetuned_chromatin_model(
             idr_dataset,
             batch_size=batch_size,
             num_workers=num_workers,
-            pin_memory=True,
+            pin_memory=device.type == "cuda",
             prefetch_factor=prefetch_factor,
         )
         for i, (seq, track) in enumerate(
@@ -606,7 +635,7 @@ def evaluate_finetuned_chromatin_model(
             neg_dataset,
             batch_size=batch_size,
             num_workers=num_workers,
-            pin_memory=True,
+            pin_memory=device.type == "cuda",
             prefetch_factor=prefetch_factor,
         )
         for i, (seq, track) in enumerate(
@@ -653,10 +682,10 @@ def evaluate_finetuned_chromatin_model(
             ],
             dim=0,
         )
-        test_auroc = roc_auc_score(
+        test_auroc = skmetrics.roc_auc_score(
             test_labels.numpy(force=True), test_counts_pred_cls.numpy(force=True)
         )
-        test_auprc = average_precision_score(
+        test_auprc = skmetrics.average_precision_score(
             test_labels.numpy(force=True), test_counts_pred_cls.numpy(force=True)
         )
 
@@ -699,13 +728,15 @@ def train_finetuned_peak_classifier(
     progress_bar=False,
     resume_from=None,
     seed=0,
+    micro_batch_size=None,
 ):
+    device = resolve_device(device, num_workers)
 
     train_dataloader = DataLoader(
         train_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=True,
     )
@@ -713,7 +744,7 @@ def train_finetuned_peak_classifier(
         val_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=True,
     )
@@ -731,10 +762,10 @@ def train_finetuned_peak_classifier(
         resume_checkpoint_path = os.path.join(out_dir, f"checkpoint_{resume_from}.pt")
         optimizer_checkpoint_path = os.path.join(out_dir, f"optimizer_{resume_from}.pt")
         start_epoch = resume_from + 1
-        checkpoint_resume = torch.load(resume_checkpoint_path)
+        checkpoint_resume = torch.load(resume_checkpoint_path, map_location="cpu")
         model.load_state_dict(checkpoint_resume, strict=False)
         try:
-            optimizer_resume = torch.load(optimizer_checkpoint_path)
+            optimizer_resume = torch.load(optimizer_checkpoint_path, map_location="cpu")
             optimizer.load_state_dict(optimizer_resume)
         except FileNotFoundError:
             warnings.warn(
@@ -745,6 +776,14 @@ def train_finetuned_peak_classifier(
 
     criterion = torch.nn.CrossEntropyLoss()
 
+    def train_loss(seq, labels):
+        pred = model(seq).squeeze(1)
+        return criterion(pred, labels) / accumulate
+
+    micro_batcher = MicroBatcher(
+        device, micro_batch_size, model, mode="train", cache=MicroBatchCache()
+    )
+
     with open(log_file, "a") as f:
         if resume_from is None:
             f.write("\t".join(log_cols) + "\n")
@@ -765,33 +804,7 @@ def train_finetuned_peak_classifier(
                 # seq = seq.to(device)
                 labels = labels.to(device)
 
-                fallback = False
-                try:
-                    pred = model(seq).squeeze(1)
-                    loss = criterion(pred, labels) / accumulate
-                    loss.backward()
-                except torch.cuda.OutOfMemoryError:
-                    fallback = True
-                    warnings.warn(
-                        f"Batch {i} does not fit in memory, falling back to single sequence processing"
-                    )
-
-                if fallback:
-                    for j in range(seq.shape[0]):
-                        try:
-                            seq_j = seq[j : j + 1]
-                            labels_j = labels[j : j + 1]
-
-                            pred_j = model(seq_j).squeeze(1)
-                            loss_j = criterion(pred_j, labels_j) / (
-                                accumulate * seq.shape[0]
-                            )
-                            loss_j.backward()
-
-                        except torch.cuda.OutOfMemoryError:
-                            warnings.warn(
-                                f"Failed to process sequence {i*j} due to OOM"
-                            )
+                micro_batcher.backward(train_loss, seq, labels)
 
                 if (i + 1) % accumulate == 0:
                     optimizer.step()
@@ -843,12 +856,13 @@ def eval_finetuned_peak_classifier(
     progress_bar=False,
     seed=0,
 ):
+    device = resolve_device(device, num_workers)
 
     test_dataloader = DataLoader(
         test_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=True,
     )
@@ -863,7 +877,7 @@ def eval_finetuned_peak_classifier(
     pred_log_probs = []
     labels = []
     model.eval()
-    with torch.no_grad():
+    with torch.inference_mode():
         for i, (seq, labels_batch) in enumerate(
             tqdm(test_dataloader, disable=(not progress_bar), desc="test", ncols=120)
         ):
@@ -897,9 +911,9 @@ def eval_finetuned_peak_classifier(
         class_preds = class_preds.numpy(force=True)
         class_labels = class_labels.numpy(force=True)
 
-        class_auroc = roc_auc_score(class_labels, class_log_odds)
-        class_auprc = average_precision_score(class_labels, class_log_odds)
-        class_mcc = matthews_corrcoef(class_labels, class_preds)
+        class_auroc = skmetrics.roc_auc_score(class_labels, class_log_odds)
+        class_auprc = skmetrics.average_precision_score(class_labels, class_log_odds)
+        class_mcc = skmetrics.matthews_corrcoef(class_labels, class_preds)
         class_acc = (class_preds == class_labels).sum().item() / len(class_labels)
 
         metrics[f"class_{class_name}_auroc"] = class_auroc
@@ -910,37 +924,44 @@ def eval_finetuned_peak_classifier(
     with open(out_path, "w") as f:
         json.dump(metrics, f, indent=4)
 
+    # Per-example labels and class log-odds for bootstrap confidence intervals
+    scores_path = os.path.splitext(out_path)[0] + "_scores.tsv"
+    pred_log_odds = pred_log_odds.numpy(force=True)
+    scores = {"label": labels.numpy(force=True)}
+    for class_name, class_idx in test_dataloader.dataset.classes.items():
+        scores[f"{class_name}_log_odds"] = pred_log_odds[:, class_idx]
+    pl.DataFrame(scores).write_csv(scores_path, separator="\t")
+
     return metrics
 
 
 class DNABERT2LoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
-            )
-            config = BertConfig.from_pretrained(model_name)
-            config.num_labels = num_labels
-            model = AutoModelForSequenceClassification.from_pretrained(
-                model_name, trust_remote_code=True, config=config
-            )
-            model.bert.embeddings = LoRAModule(
-                model.bert.embeddings, lora_rank, lora_alpha, lora_dropout
-            )
-            model.bert.encoder = LoRAModule(
-                model.bert.encoder, lora_rank, lora_alpha, lora_dropout
-            )
+        tokenizer, model = load_pretrained(
+            "dnabert2",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
+        )
+        model.bert.embeddings = LoRAModule(
+            model.bert.embeddings, lora_rank, lora_alpha, lora_dropout
+        )
+        model.bert.encoder = LoRAModule(
+            model.bert.encoder, lora_rank, lora_alpha, lora_dropout
+        )
 
         super().__init__(tokenizer, model)
 
 
 class MistralDNALoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "mistral_dna",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.config.pad_token_id = tokenizer.pad_token_id
         model.model = LoRAModule(model.model, lora_rank, lora_alpha, lora_dropout)
@@ -950,14 +971,13 @@ class MistralDNALoRAModel(HFClassifierModel):
 
 class GENALMLoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model_base = AutoModel.from_pretrained(model_name, trust_remote_code=True)
-        gena_module_name = model_base.__class__.__module__
-        cls = getattr(
-            importlib.import_module(gena_module_name), "BertForSequenceClassification"
+        tokenizer, model = load_pretrained(
+            "gena_lm",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
-        model = cls.from_pretrained(model_name, num_labels=num_labels)
 
         model.bert.embeddings = LoRAModule(
             model.bert.embeddings, lora_rank, lora_alpha, lora_dropout
@@ -971,40 +991,42 @@ class GENALMLoRAModel(HFClassifierModel):
 
 class NucleotideTransformerLoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.esm = LoRAModule(model.esm, lora_rank, lora_alpha, lora_dropout)
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
 
 class HyenaDNALoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "hyenadna",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.hyena = LoRAModule(model.hyena, lora_rank, lora_alpha, lora_dropout)
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
@@ -1019,21 +1041,20 @@ class HyenaDNALoRAModel(HFClassifierModel):
 
 class CaduceusLoRAModel(HFClassifierModel):
     def __init__(self, model_name, lora_rank, lora_alpha, lora_dropout, num_labels):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "caduceus",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.caduceus = LoRAModule(model.caduceus, lora_rank, lora_alpha, lora_dropout)
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
@@ -1114,3 +1135,111 @@ class LargeCNNClassifier(torch.nn.Module):
         final_out = self.output_layer(x)
 
         return final_out
+
+
+def _write_synthetic_chromatin_data(work_dir, num_pos, num_neg, seq_len, crop, seed):
+    rng = np.random.default_rng(seed)
+    chrom_len = (num_pos + num_neg) * seq_len
+    chrom_sizes = {"chr1": chrom_len}
+    genome_fa = write_genome_fasta(
+        os.path.join(work_dir, "genome.fa"), chrom_sizes, rng
+    )
+    bigwig = write_bigwig(os.path.join(work_dir, "signal.bw"), chrom_sizes, rng)
+
+    starts = rng.permutation(num_pos + num_neg) * seq_len
+    tsvs = []
+    for name, region_starts in [
+        ("pos", starts[:num_pos]),
+        ("neg", starts[num_pos:]),
+    ]:
+        path = os.path.join(work_dir, f"{name}.tsv")
+        pl.DataFrame(
+            {
+                "chr": ["chr1"] * len(region_starts),
+                "input_start": region_starts,
+                "input_end": region_starts + seq_len,
+                "elem_start": region_starts + crop,
+                "elem_end": region_starts + seq_len - crop,
+                "elem_relative_start": [crop] * len(region_starts),
+                "elem_relative_end": [seq_len - crop] * len(region_starts),
+            }
+        ).write_csv(path, separator="\t")
+        tsvs.append(path)
+
+    return genome_fa, bigwig, tsvs
+
+
+def benchmark_epoch_loading(
+    work_dir,
+    num_epochs=4,
+    num_workers=2,
+    batch_size=32,
+    num_pos=256,
+    num_neg=2560,
+    downsample_ratio=10,
+    seq_len=1024,
+    crop=128,
+    seed=0,
+):
+    """
+    Time to load num_epochs epochs of the end-to-end chromatin training data,
+    from a synthetic genome written to work_dir, when the negative subset and
+    DataLoader are rebuilt every epoch (as fine-tuning previously did) and
+    with one DataLoader driven by EpochSubsetSampler. Also times how long
+    each takes to deliver its first batch of an epoch, which is where worker
+    startup shows.
+    """
+    genome_fa, bigwig, (pos_tsv, neg_tsv) = _write_synthetic_chromatin_data(
+        work_dir, num_pos, num_neg, seq_len, crop, seed
+    )
+    pos_dataset = ChromatinEndToEndDataset(genome_fa, bigwig, pos_tsv, None, crop)
+    neg_dataset = ChromatinEndToEndDataset(
+        genome_fa, bigwig, neg_tsv, None, crop, downsample_ratio=downsample_ratio
+    )
+    loader_kwargs = dict(
+        batch_size=batch_size,
+        num_workers=num_workers,
+        persistent_workers=num_workers > 0,
+    )
+
+    def rebuilt():
+        for epoch in range(num_epochs):
+            neg_subset = Subset(neg_dataset, neg_dataset.epoch_indices(epoch))
+            dataset = ConcatDataset([pos_dataset, neg_subset])
+            yield DataLoader(dataset, shuffle=True, **loader_kwargs)
+
+    def sampled():
+        datasets = [pos_dataset, neg_dataset]
+        sampler = EpochSubsetSampler(datasets, seed=seed)
+        dataloader = DataLoader(
+            ConcatDataset(datasets), sampler=sampler, **loader_kwargs
+        )
+        for epoch in range(num_epochs):
+            sampler.set_epoch(epoch)
+            yield dataloader
+
+    results = {}
+    for name, epochs in [("rebuilt", rebuilt), ("sampler", sampled)]:
+        first_batch_time = 0.0
+        start = time.perf_counter()
+        for dataloader in epochs():
+            epoch_start = time.perf_counter()
+            for i, _ in enumerate(dataloader):
+                if i == 0:
+                    first_batch_time += time.perf_counter() - epoch_start
+        total_time = time.perf_counter() - start
+
+        results[name] = {
+            "total_s": total_time,
+            "first_batch_s": first_batch_time / num_epochs,
+        }
+        print(
+            f"{name:<10} {total_time:8.2f} s total  "
+            f"{first_batch_time / num_epochs:8.3f} s to first batch per epoch"
+        )
+
+    return results
+
+
+if __name__ == "__main__":
+    benchmark_epoch_loading(sys.argv[1], num_workers=int(sys.argv[2]))
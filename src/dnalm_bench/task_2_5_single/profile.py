@@ -1,20 +1,31 @@
-import importlib
+import contextlib
 import json
+import os
+import sys
 import time
 
 import numpy as np
+import polars as pl
 import torch
+import torch.nn.functional as F
 from torch.utils.data import DataLoader
 from tqdm import tqdm
-from transformers import (
-    AutoModel,
-    AutoModelForSequenceClassification,
-    AutoTokenizer,
-    BertConfig,
-)
 
+from ..benchmark_history import profile_metrics, sweep_metrics
+from ..devices import (
+    MemorySampler,
+    device_id,
+    empty_cache,
+    memory_stats,
+    peak_memory,
+    reset_peak_memory,
+    resolve_device,
+    synchronize,
+)
 from ..finetune import HFClassifierModel
-from ..utils import NoModule, onehot_to_chars
+from ..microbatch import is_oom
+from ..models import load_native_tokenizer, load_pretrained
+from .finetune import ChromatinEndToEndDataset
 
 
 def profile_model_resources(
@@ -30,6 +41,7 @@ def profile_model_resources(
     seed=0,
     num_batches_record=np.inf,
 ):
+    device = resolve_device(device, num_workers)
     num_batches_total = num_batches_warmup + num_batches_record
 
     num_params = sum(p.numel() for p in model.parameters())
@@ -39,7 +51,7 @@ def profile_model_resources(
         dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         drop_last=True,
     )
@@ -53,16 +65,16 @@ def profile_model_resources(
         if i >= num_batches_total:
             break
 
-        torch.cuda.reset_peak_memory_stats(device=device)
+        reset_peak_memory(device)
         track = track.to(device)
         model.zero_grad()
         start = time.time()
         loss = model(seq).sum()
         loss.backward()
-        torch.cuda.synchronize(device=device)
+        synchronize(device)
         end = time.time()
 
-        mem_usage = torch.cuda.max_memory_allocated(device=device)
+        mem_usage = peak_memory(device)
         time_elapsed = end - start
 
         if i >= num_batches_warmup:
@@ -75,7 +87,7 @@ def profile_model_resources(
     bwd_time_std = np.std(bwd_time)
 
     model.eval()
-    with torch.no_grad():
+    with torch.inference_mode():
         fwd_mem = []
         fwd_time = []
 
@@ -85,14 +97,14 @@ def profile_model_resources(
             if i >= num_batches_total:
                 break
 
-            torch.cuda.reset_peak_memory_stats(device=device)
+            reset_peak_memory(device)
             track = track.to(device)
             start = time.time()
             _ = model(seq)
-            torch.cuda.synchronize(device=device)
+            synchronize(device)
             end = time.time()
 
-            mem_usage = torch.cuda.max_memory_allocated(device=device)
+            mem_usage = peak_memory(device)
             time_elapsed = end - start
 
             if i >= num_batches_warmup:
@@ -122,28 +134,250 @@ def profile_model_resources(
     return metrics
 
 
-class DNABERT2Model(HFClassifierModel):
-    def __init__(self, model_name, num_labels):
-        model_name = f"zhihan1996/{model_name}"
-        with NoModule("triton"):
-            tokenizer = AutoTokenizer.from_pretrained(
-                model_name, trust_remote_code=True
+# Columns of the sweep table; memory in bytes, times in seconds. On the CPU,
+# mem_in_use is the resident memory of the process after a configuration and
+# peak_mem the peak resident memory of its steps above that before them.
+SWEEP_SCHEMA = {
+    "model": pl.Utf8,
+    "device": pl.Utf8,
+    "mode": pl.Utf8,
+    "seq_len": pl.Int64,
+    "batch_size": pl.Int64,
+    "num_tokens": pl.Int64,
+    "status": pl.Utf8,
+    "repeats": pl.Int64,
+    "time_mean": pl.Float64,
+    "time_p50": pl.Float64,
+    "time_p90": pl.Float64,
+    "time_p99": pl.Float64,
+    "tokens_per_sec": pl.Float64,
+    "bases_per_sec": pl.Float64,
+    "mem_in_use": pl.Int64,
+    "peak_mem": pl.Int64,
+    "peak_reserved": pl.Int64,
+    "alloc_retries": pl.Int64,
+    "num_ooms": pl.Int64,
+    "trace": pl.Utf8,
+}
+SWEEP_MODES = ("fwd", "bwd")
+
+
+def random_sequences(batch_size, seq_len, generator=None):
+    """
+    Random one-hot sequences, encoded as the datasets yield them
+    """
+    bases = torch.randint(4, (batch_size, seq_len), generator=generator)
+    return F.one_hot(bases, 4).to(torch.int8)
+
+
+def _num_tokens(model, seqs):
+    # Tokens the model sees, for models that tokenize their input
+    if hasattr(model, "_tokenize"):
+        tokens, _ = model._tokenize(seqs)
+        return tokens.numel()
+
+    return seqs.shape[0] * seqs.shape[1]
+
+
+def _step(model, seqs, mode):
+    if mode == "fwd":
+        with torch.inference_mode():
+            model(seqs)
+    else:
+        model.zero_grad(set_to_none=True)
+        model(seqs).sum().backward()
+
+
+def _profile_config(
+    model, seqs, mode, device, num_warmup, num_repeats, timeout, trace_path
+):
+    start_config = time.perf_counter()
+    with torch.inference_mode():
+        num_tokens = _num_tokens(model, seqs)
+
+    # The process-wide peak RSS cannot be reset, so on the CPU the peak of
+    # this configuration's steps is sampled, after returning memory freed by
+    # earlier configurations to the OS
+    empty_cache(device)
+    with contextlib.ExitStack() as stack:
+        sampler = None
+        if device.type == "cpu":
+            sampler = stack.enter_context(MemorySampler())
+
+        for _ in range(num_warmup):
+            _step(model, seqs, mode)
+        synchronize(device)
+        reset_peak_memory(device)
+
+        status = "ok"
+        times = []
+        for _ in range(num_repeats):
+            start = time.perf_counter()
+            _step(model, seqs, mode)
+            synchronize(device)
+            end = time.perf_counter()
+            times.append(end - start)
+
+            if timeout is not None and end - start_config > timeout:
+                if len(times) < num_repeats:
+                    status = "timeout"
+                break
+
+    stats = memory_stats(device)
+    if sampler is not None:
+        stats["peak_mem"] = sampler.peak_delta
+
+    if trace_path is not None:
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if device.type == "cuda":
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        with torch.profiler.profile(
+            activities=activities, record_shapes=True, profile_memory=True
+        ) as prof:
+            _step(model, seqs, mode)
+            synchronize(device)
+        prof.export_chrome_trace(trace_path)
+
+    times = np.array(times)
+    time_p50 = float(np.percentile(times, 50))
+
+    return {
+        "num_tokens": num_tokens,
+        "status": status,
+        "repeats": len(times),
+        "time_mean": float(times.mean()),
+        "time_p50": time_p50,
+        "time_p90": float(np.percentile(times, 90)),
+        "time_p99": float(np.percentile(times, 99)),
+        "tokens_per_sec": num_tokens / time_p50,
+        "bases_per_sec": seqs.shape[0] * seqs.shape[1] / time_p50,
+        **stats,
+        "trace": trace_path,
+    }
+
+
+def sweep_model_resources(
+    model,
+    out_path,
+    seq_lens=(500, 2114),
+    batch_sizes=(1, 4, 16),
+    modes=SWEEP_MODES,
+    device="auto",
+    num_warmup=2,
+    num_repeats=10,
+    timeout=None,
+    trace_dir=None,
+    label=None,
+    progress_bar=False,
+    seed=0,
+):
+    """
+    Latency and memory of a model over a grid of sequence lengths and batch
+    sizes, on random sequences, for inference (fwd) and training steps
+    (bwd, forward and backward). Each configuration runs num_warmup untimed
+    steps and then num_repeats timed ones, or as many as fit in timeout
+    seconds from its start. On the CPU, peak_mem is sampled during each
+    configuration's steps (see devices.MemorySampler), as the process-wide
+    peak RSS would carry over from larger earlier configurations and from
+    profile_model_resources. After an out-of-memory error or a timeout,
+    larger batches of the same length are skipped. With trace_dir, one more step of each
+    configuration is recorded with torch.profiler as a Chrome trace.
+
+    Writes one row per configuration and mode (see SWEEP_SCHEMA) to a TSV at
+    out_path and returns the table.
+    """
+    device = resolve_device(device)
+    label = label or type(model).__name__
+    model.to(device)
+    generator = torch.Generator().manual_seed(seed)
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
+
+    configs = [
+        (mode, seq_len, batch_size)
+        for mode in modes
+        for seq_len in sorted(seq_lens)
+        for batch_size in sorted(batch_sizes)
+    ]
+    rows = []
+    stopped = set()
+    for mode, seq_len, batch_size in tqdm(
+        configs, disable=(not progress_bar), desc="sweep", ncols=120
+    ):
+        row = {
+            "model": label,
+            "device": device_id(device),
+            "mode": mode,
+            "seq_len": seq_len,
+            "batch_size": batch_size,
+            "status": "skipped",
+            "repeats": 0,
+        }
+        if (mode, seq_len) in stopped:
+            rows.append(row)
+            continue
+
+        trace_path = None
+        if trace_dir is not None:
+            trace_path = os.path.join(
+                trace_dir, f"{label}_{mode}_{seq_len}_{batch_size}.json"
             )
-            config = BertConfig.from_pretrained(model_name)
-            config.num_labels = num_labels
-            model = AutoModelForSequenceClassification.from_pretrained(
-                model_name, trust_remote_code=True, config=config
+
+        model.train(mode == "bwd")
+        seqs = random_sequences(batch_size, seq_len, generator)
+        try:
+            row.update(
+                _profile_config(
+                    model,
+                    seqs,
+                    mode,
+                    device,
+                    num_warmup,
+                    num_repeats,
+                    timeout,
+                    trace_path,
+                )
             )
+        except Exception as e:
+            if not is_oom(e):
+                raise
+            row["status"] = "oom"
+            model.zero_grad(set_to_none=True)
+            empty_cache(device)
+
+        if row["status"] != "ok":
+            stopped.add((mode, seq_len))
+        rows.append(row)
+
+    model.zero_grad(set_to_none=True)
+
+    table = pl.from_dicts(rows, schema=SWEEP_SCHEMA)
+    table.write_csv(out_path, separator="\t")
+
+    return table
+
+
+class DNABERT2Model(HFClassifierModel):
+    def __init__(self, model_name, num_labels):
+        tokenizer, model = load_pretrained(
+            "dnabert2",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
+        )
 
         super().__init__(tokenizer, model)
 
 
 class MistralDNAModel(HFClassifierModel):
     def __init__(self, model_name, num_labels):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "mistral_dna",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
         model.config.pad_token_id = tokenizer.pad_token_id
 
@@ -152,52 +386,53 @@ class MistralDNAModel(HFClassifierModel):
 
 class GENALMModel(HFClassifierModel):
     def __init__(self, model_name, num_labels):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model_base = AutoModel.from_pretrained(model_name, trust_remote_code=True)
-        gena_module_name = model_base.__class__.__module__
-        cls = getattr(
-            importlib.import_module(gena_module_name), "BertForSequenceClassification"
+        tokenizer, model = load_pretrained(
+            "gena_lm",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
-        model = cls.from_pretrained(model_name, num_labels=num_labels)
 
         super().__init__(tokenizer, model)
 
 
 class NucleotideTransformerModel(HFClassifierModel):
     def __init__(self, model_name, num_labels):
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer(
+            "nucleotide_transformer", model_name
+        )
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
 
 class HyenaDNAModel(HFClassifierModel):
     def __init__(self, model_name, num_labels):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "hyenadna",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer("hyenadna", model_name)
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
@@ -212,20 +447,19 @@ class HyenaDNAModel(HFClassifierModel):
 
 class CaduceusModel(HFClassifierModel):
     def __init__(self, model_name, num_labels):
-        model_name = f"kuleshov-group/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForSequenceClassification.from_pretrained(
-            model_name, trust_remote_code=True, num_labels=num_labels
+        tokenizer, model = load_pretrained(
+            "caduceus",
+            model_name,
+            "sequence_classification",
+            shared=False,
+            num_labels=num_labels,
         )
 
         super().__init__(tokenizer, model)
+        self.native_tokenizer = load_native_tokenizer("caduceus", model_name)
 
     def _tokenize(self, seqs):
-        seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
-        tokens = encoded["input_ids"]
+        tokens = self.native_tokenizer(seqs)
 
         return tokens.to(self.device), None
 
@@ -236,3 +470,114 @@ class CaduceusModel(HFClassifierModel):
         logits = torch_outs.logits
 
         return logits
+
+
+PROFILE_MODELS = {
+    "caduceus": CaduceusModel,
+    "dnabert2": DNABERT2Model,
+    "gena_lm": GENALMModel,
+    "hyenadna": HyenaDNAModel,
+    "mistral_dna": MistralDNAModel,
+    "nucleotide_transformer": NucleotideTransformerModel,
+}
+
+
+def run_resource_profiling(
+    family,
+    model_name,
+    work_dir,
+    cache_dir=None,
+    device="auto",
+    cell_line="GM12878",
+    crop=557,
+    batch_size=16,
+    num_workers=4,
+    prefetch_factor=2,
+    num_batches_warmup=100,
+    progress_bar=True,
+    history=None,
+    **sweep_kwargs,
+):
+    """
+    The resource profiling experiment for one model of a family (a key of
+    PROFILE_MODELS): profile_model_resources on a cell line's chromatin
+    peaks, written to resource_profiling/{model_name}.json under work_dir,
+    and sweep_model_resources with sweep_kwargs, written to
+    resource_profiling/{model_name}_sweep.tsv. Both are also recorded in
+    history (a BenchmarkHistory) if given. Returns both results.
+    """
+    genome_fa = os.path.join(
+        work_dir, "refs/GRCh38_no_alt_analysis_set_GCA_000001405.15.fasta"
+    )
+    peaks_tsv = os.path.join(
+        work_dir,
+        f"task_4_chromatin_activity/processed_data/cell_line_expanded_peaks/{cell_line}_peaks.bed",
+    )
+    assay_bw = os.path.join(
+        work_dir,
+        f"task_4_chromatin_activity/processed_data/bigwigs/{cell_line}_unstranded.bw",
+    )
+
+    out_dir = os.path.join(work_dir, "resource_profiling")
+    os.makedirs(out_dir, exist_ok=True)
+
+    dataset = ChromatinEndToEndDataset(
+        genome_fa, assay_bw, peaks_tsv, None, crop, cache_dir=cache_dir
+    )
+    model = PROFILE_MODELS[family](model_name, 1)
+
+    metrics = profile_model_resources(
+        dataset,
+        model,
+        batch_size,
+        num_batches_warmup,
+        os.path.join(out_dir, f"{model_name}.json"),
+        num_workers,
+        prefetch_factor,
+        device,
+        progress_bar=progress_bar,
+    )
+    sweep = sweep_model_resources(
+        model,
+        os.path.join(out_dir, f"{model_name}_sweep.tsv"),
+        device=device,
+        label=model_name,
+        progress_bar=progress_bar,
+        **sweep_kwargs,
+    )
+
+    if history is not None:
+        params = {
+            "cell_line": cell_line,
+            "crop": crop,
+            "batch_size": batch_size,
+            "num_batches_warmup": num_batches_warmup,
+        }
+        history.record(
+            "model_profile", profile_metrics(metrics, model_name), params, device
+        )
+        history.record("model_sweep", sweep_metrics(sweep), sweep_kwargs, device)
+
+    return metrics, sweep
+
+
+if __name__ == "__main__":
+    # python -m dnalm_bench.task_2_5_single.profile <family> <model_name> <out.tsv>
+    #     [seq_lens, e.g. 500,2114] [batch_sizes, e.g. 1,4,16]
+    family, model_name, out_path = sys.argv[1:4]
+    sweep_kwargs = {}
+    if len(sys.argv) > 4:
+        sweep_kwargs["seq_lens"] = [int(x) for x in sys.argv[4].split(",")]
+    if len(sys.argv) > 5:
+        sweep_kwargs["batch_sizes"] = [int(x) for x in sys.argv[5].split(",")]
+
+    model = PROFILE_MODELS[family](model_name, 1)
+    table = sweep_model_resources(
+        model,
+        out_path,
+        device=os.environ.get("DART_DEVICE", "auto"),
+        label=model_name,
+        progress_bar=True,
+        **sweep_kwargs,
+    )
+    print(table)
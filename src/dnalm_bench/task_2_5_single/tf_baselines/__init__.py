@@ -0,0 +1,12 @@
+"""
+TensorFlow ChromBPNet and Enformer baselines. Kept out of the PyTorch modules
+so that importing dnalm_bench never pulls in TensorFlow.
+"""
+
+try:
+    import tensorflow  # noqa: F401
+except ImportError as e:
+    raise ImportError(
+        "The ChromBPNet and Enformer baselines require tensorflow "
+        "(and tensorflow_probability / tensorflow_hub)"
+    ) from e
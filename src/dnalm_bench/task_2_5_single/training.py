@@ -1,22 +1,27 @@
+import functools
 import hashlib
-import heapq
+import itertools
 import json
 import math
 import os
 import warnings
 
-import h5py
 import numpy as np
 import polars as pl
-import pyBigWig
 import torch
 import torch.nn.functional as F
-from ncls import NCLS
-from sklearn.metrics import average_precision_score, matthews_corrcoef, roc_auc_score
 from torch.utils.data import DataLoader, IterableDataset, get_worker_info
 from tqdm import tqdm
 
-from ..utils import copy_if_not_exists, log1mexp
+from ..collate import BufferRing, collate_embeddings, stack
+from ..devices import resolve_device
+from ..embedding_store import read_embeddings
+from ..utils import copy_if_not_exists, lazy_import, log1mexp
+
+h5py = lazy_import("h5py")
+pyBigWig = lazy_import("pyBigWig")
+ncls = lazy_import("ncls")
+skmetrics = lazy_import("sklearn.metrics")
 
 
 class AssayEmbeddingsDataset(IterableDataset):
@@ -114,10 +119,16 @@ class AssayEmbeddingsDataset(IterableDataset):
             start = worker_info.id * per_worker
             end = min(start + per_worker, len(self))
 
+        return self.iter_range(start, end)
+
+    def iter_range(self, start, end):
+        """
+        Iterates over elements start to end, regardless of bounds and workers
+        """
         df_sub = self.elements_df.slice(start, end - start)
         valid_inds = df_sub.get_column("region_idx").to_numpy().astype(np.int32)
         region_idx_to_row = {v: i for i, v in enumerate(valid_inds)}
-        query_struct = NCLS(valid_inds, valid_inds + 1, valid_inds)
+        query_struct = ncls.NCLS(valid_inds, valid_inds + 1, valid_inds)
 
         bw = pyBigWig.open(self.assay_bw)
 
@@ -142,7 +153,9 @@ class AssayEmbeddingsDataset(IterableDataset):
                 if len(chunk_range) == 0:
                     continue
 
-                seq_chunk = h5[f"seq/emb_{chunk_start}_{chunk_end}"][:]
+                seq_chunk, seq_scales = read_embeddings(
+                    h5["seq"], f"emb_{chunk_start}_{chunk_end}"
+                )
 
                 if not idx_seq_fixed:
                     idx_seq_chunk = h5["seq/idx_var"][chunk_start:chunk_end]
@@ -155,6 +168,7 @@ class AssayEmbeddingsDataset(IterableDataset):
                         seq_inds = idx_seq_chunk[i_rel].astype(np.int64)
 
                     seq_emb = seq_chunk[i_rel]
+                    seq_scale = None if seq_scales is None else seq_scales[i_rel]
 
                     _, chrom, region_start, region_end, _, _, _, _ = (
                         self.elements_df.row(region_idx_to_row[i])
@@ -166,54 +180,125 @@ class AssayEmbeddingsDataset(IterableDataset):
                     if self.crop > 0:
                         track = track[self.crop : -self.crop]
 
-                    yield torch.from_numpy(seq_emb), torch.from_numpy(
-                        seq_inds
-                    ), torch.from_numpy(track)
+                    # Embeddings stay in their stored encoding until collated
+                    yield seq_emb, torch.from_numpy(seq_inds), torch.from_numpy(
+                        track
+                    ), seq_scale
 
         bw.close()
         self._set_epoch()
 
 
+def interleave_schedule(counts, rng=None):
+    """
+    Order in which to draw counts[i] items from each dataset i, as an array of
+    dataset indices. Item k of dataset i is placed at fraction k / counts[i]
+    of the way through, so every dataset is spread evenly over the schedule.
+    With a numpy Generator rng, each item is instead placed at a uniformly
+    random point within its 1 / counts[i] stretch, which varies the order
+    while keeping it evenly mixed.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    inds = np.repeat(np.arange(len(counts)), counts)
+    starts = np.cumsum(counts) - counts
+    ranks = np.arange(len(inds)) - starts[inds]
+    lengths = counts[inds]
+
+    offsets = 0.0 if rng is None else rng.random(len(inds))
+    fracs = (ranks + offsets) / lengths
+
+    # Ties are broken as a heap of (frac, rank, length, index) would
+    order = np.lexsort((inds, lengths, ranks, fracs))
+
+    return inds[order]
+
+
 class InterleavedIterableDataset(IterableDataset):
-    def __init__(self, datasets):
+    """
+    Interleaves iterable datasets that support iter_range (or failing that,
+    bounds), appending the index of the source dataset to every item.
+
+    By default every item of every dataset is used, each dataset spread
+    evenly over the epoch. With weights, dataset i instead makes up
+    weights[i] / sum(weights) of each epoch, which is as long as possible
+    without repeating items; datasets with more items than that are read
+    from a contiguous window of them. The schedule (see interleave_schedule)
+    is computed up front and split evenly between workers.
+
+    With seed set, the order and the windows change with set_epoch; without,
+    every epoch is the same.
+    """
+
+    def __init__(self, datasets, weights=None, seed=None):
         super().__init__()
 
         self.datasets = datasets
+        self.weights = weights
+        self.seed = seed
+        self.epoch = 0
 
-    # def set_epoch(self, epoch):
-    #     for d in self.datasets:
-    #         d.set_epoch(epoch)
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _counts(self):
+        lengths = np.array([len(d) for d in self.datasets])
+        if self.weights is None:
+            return lengths
+
+        weights = np.asarray(self.weights, dtype=np.float64)
+        weights = weights / weights.sum()
+        used = weights > 0
+        total = np.min(lengths[used] / weights[used])
+
+        return np.minimum(np.floor(total * weights + 1e-9), lengths).astype(np.int64)
 
     def __len__(self):
-        return sum(len(d) for d in self.datasets)
+        return int(self._counts().sum())
 
     def __iter__(self):
-        lengths = []
-        worker_info = get_worker_info()
-        for d in self.datasets:
-            if worker_info is None:
-                d.bounds = (0, len(d))
-                lengths.append(len(d))
-            else:
-                per_worker = int(math.ceil(len(d) / float(worker_info.num_workers)))
-                start = worker_info.id * per_worker
-                end = min(start + per_worker, len(d))
-                d.bounds = (start, end)
-                lengths.append(end - start)
+        rng = None
+        if self.seed is not None:
+            rng = np.random.default_rng((self.seed, self.epoch))
 
-        iterators = [iter(dataset) for dataset in self.datasets]
-        heap = [(0.0, 0, l, i) for i, l in enumerate(lengths) if l > 0]
-        heapq.heapify(heap)
-        while heap:
-            frac, complete, length, ind = heapq.heappop(heap)
-            yield_vals = list(next(iterators[ind]))
-            yield_vals.append(torch.tensor(ind, dtype=torch.long))
+        counts = self._counts()
+        windows = np.zeros_like(counts)
+        if rng is not None:
+            for i, d in enumerate(self.datasets):
+                windows[i] = rng.integers(0, len(d) - counts[i] + 1)
 
-            yield tuple(yield_vals)
+        schedule = interleave_schedule(counts, rng)
 
-            if complete + 1 < length:
-                updated_record = ((complete + 1) / length, complete + 1, length, ind)
-                heapq.heappush(heap, updated_record)
+        worker_info = get_worker_info()
+        if worker_info is None:
+            lo, hi = 0, len(schedule)
+        else:
+            per_worker = int(math.ceil(len(schedule) / float(worker_info.num_workers)))
+            lo = min(worker_info.id * per_worker, len(schedule))
+            hi = min(lo + per_worker, len(schedule))
+
+        num_datasets = len(self.datasets)
+        starts = windows + np.bincount(schedule[:lo], minlength=num_datasets)
+        ends = starts + np.bincount(schedule[lo:hi], minlength=num_datasets)
+        schedule = schedule[lo:hi]
+        if len(schedule) == 0:
+            return
+
+        iterators = []
+        for d, start, end in zip(self.datasets, starts, ends):
+            if hasattr(d, "iter_range"):
+                iterators.append(d.iter_range(int(start), int(end)))
+            else:
+                d.bounds = (int(start), int(end))
+                iterators.append(iter(d))
+        indicators = [torch.tensor(i, dtype=torch.long) for i in range(num_datasets)]
+
+        # Consecutive items from the same dataset are taken as one run
+        run_starts = np.flatnonzero(np.diff(schedule)) + 1
+        run_starts = np.concatenate([[0], run_starts, [len(schedule)]])
+        for run_start, run_end in zip(run_starts[:-1], run_starts[1:]):
+            ind = schedule[run_start]
+            for vals in itertools.islice(iterators[ind], run_end - run_start):
+                yield (*vals, indicators[ind])
 
 
 class PeaksEmbeddingsDataset(IterableDataset):
@@ -275,10 +360,16 @@ class PeaksEmbeddingsDataset(IterableDataset):
             start = worker_info.id * per_worker
             end = min(start + per_worker, len(self))
 
+        return self.iter_range(start, end)
+
+    def iter_range(self, start, end):
+        """
+        Iterates over elements start to end, regardless of bounds and workers
+        """
         df_sub = self.elements_df.slice(start, end - start)
         valid_inds = df_sub.get_column("region_idx").to_numpy().astype(np.int32)
         region_idx_to_row = {v: i for i, v in enumerate(valid_inds)}
-        query_struct = NCLS(valid_inds, valid_inds + 1, valid_inds)
+        query_struct = ncls.NCLS(valid_inds, valid_inds + 1, valid_inds)
 
         chunk_start = 0
         with h5py.File(self.embeddings_h5) as h5:
@@ -301,7 +392,9 @@ class PeaksEmbeddingsDataset(IterableDataset):
                 if len(chunk_range) == 0:
                     continue
 
-                seq_chunk = h5[f"seq/emb_{chunk_start}_{chunk_end}"][:]
+                seq_chunk, seq_scales = read_embeddings(
+                    h5["seq"], f"emb_{chunk_start}_{chunk_end}"
+                )
 
                 if not idx_seq_fixed:
                     idx_seq_chunk = h5["seq/idx_var"][chunk_start:chunk_end]
@@ -314,15 +407,16 @@ class PeaksEmbeddingsDataset(IterableDataset):
                         seq_inds = idx_seq_chunk[i_rel].astype(np.int64)
 
                     seq_emb = seq_chunk[i_rel]
+                    seq_scale = None if seq_scales is None else seq_scales[i_rel]
 
                     _, chrom, start, end, _, _, _, label = self.elements_df.row(
                         region_idx_to_row[i]
                     )
                     label_ind = self.classes[label]
 
-                    yield torch.from_numpy(seq_emb), torch.from_numpy(
-                        seq_inds
-                    ), torch.tensor(label_ind)
+                    yield seq_emb, torch.from_numpy(seq_inds), torch.tensor(
+                        label_ind
+                    ), seq_scale
 
 
 def log1pMSELoss(log_predicted_counts, true_counts):
@@ -363,15 +457,15 @@ def counts_spearman(log_preds, targets):
     return r
 
 
-def _collate_batch(batch):
-    max_seq_len = max(seq_emb.shape[0] for seq_emb, _, _, _ in batch)
-    seq_embs = torch.zeros(len(batch), max_seq_len, batch[0][0].shape[1])
-    for i, (seq_emb, _, _, _) in enumerate(batch):
-        seq_embs[i, : seq_emb.shape[0]] = seq_emb
+def _collate_batch(batch, ring=None):
+    slot = None if ring is None else ring.acquire()
+    seq_embs = collate_embeddings(
+        [b[0] for b in batch], [b[3] for b in batch], ring, slot, "seq_embs"
+    )
 
-    seq_inds = torch.stack([seq_inds for _, seq_inds, _, _ in batch])
-    tracks = torch.stack([track for _, _, track, _ in batch])
-    indicators = torch.stack([indicator for _, _, _, indicator in batch])
+    seq_inds = stack([b[1] for b in batch], ring, slot, "seq_inds")
+    tracks = stack([b[2] for b in batch], ring, slot, "tracks")
+    indicators = stack([b[4] for b in batch], ring, slot, "indicators")
 
     return seq_embs, seq_inds, tracks, indicators
 
@@ -390,21 +484,24 @@ def train_predictor(
     progress_bar=False,
     resume_from=None,
 ):
+    device = resolve_device(device, num_workers)
+    train_ring = BufferRing(device)
     train_dataloader = DataLoader(
         train_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        collate_fn=_collate_batch,
-        pin_memory=True,
+        collate_fn=functools.partial(_collate_batch, ring=train_ring),
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=False,
     )
+    val_ring = BufferRing(device)
     val_dataloader = DataLoader(
         val_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        collate_fn=_collate_batch,
-        pin_memory=True,
+        collate_fn=functools.partial(_collate_batch, ring=val_ring),
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=False,
     )
@@ -427,10 +524,10 @@ def train_predictor(
         resume_checkpoint_path = os.path.join(out_dir, f"checkpoint_{resume_from}.pt")
         optimizer_checkpoint_path = os.path.join(out_dir, f"optimizer_{resume_from}.pt")
         start_epoch = resume_from + 1
-        checkpoint_resume = torch.load(resume_checkpoint_path)
+        checkpoint_resume = torch.load(resume_checkpoint_path, map_location="cpu")
         model.load_state_dict(checkpoint_resume, strict=False)
         try:
-            optimizer_resume = torch.load(optimizer_checkpoint_path)
+            optimizer_resume = torch.load(optimizer_checkpoint_path, map_location="cpu")
             optimizer.load_state_dict(optimizer_resume)
         except FileNotFoundError:
             warnings.warn(
@@ -446,12 +543,14 @@ def train_predictor(
 
         for epoch in range(start_epoch, num_epochs):
             model.train()
+            if hasattr(train_dataset, "set_epoch"):
+                train_dataset.set_epoch(epoch)
             for i, (seq_emb, seq_inds, track, indicator) in enumerate(
                 tqdm(train_dataloader, disable=(not progress_bar), desc="train")
             ):
-                seq_emb = seq_emb.to(device)
-                seq_inds = seq_inds.to(device)
-                track = track.to(device)
+                seq_emb, seq_inds, track = train_ring.to_device(
+                    (seq_emb, seq_inds, track), device
+                )
                 true_counts = track.sum(dim=1)
 
                 optimizer.zero_grad()
@@ -469,9 +568,11 @@ def train_predictor(
                 for i, (seq_emb, seq_inds, track, indicator) in enumerate(
                     tqdm(val_dataloader, disable=(not progress_bar), desc="val")
                 ):
-                    seq_emb = seq_emb.to(device)
-                    seq_inds = seq_inds.to(device)
-                    track = track.to(device)
+                    # The indicators are kept past this batch, so they are
+                    # copied out of the ring slot with the rest
+                    seq_emb, seq_inds, track, indicator = val_ring.to_device(
+                        (seq_emb, seq_inds, track, indicator), device
+                    )
                     true_counts = track.sum(dim=1)
 
                     optimizer.zero_grad()
@@ -525,6 +626,7 @@ def evaluate_chromatin_model(
     progress_bar=False,
     seed=0,
 ):
+    device = resolve_device(device, num_workers)
 
     torch.manual_seed(seed)
 
@@ -532,17 +634,18 @@ def evaluate_chromatin_model(
 
     model.eval()
 
-    with torch.no_grad():
+    with torch.inference_mode():
         test_loss_pos = 0
         test_counts_pred_pos = []
         test_counts_true_pos = []
+        test_pos_ring = BufferRing(device)
         test_pos_dataloader = DataLoader(
             pos_dataset,
             batch_size=batch_size,
             num_workers=num_workers,
-            pin_memory=True,
+            pin_memory=device.type == "cuda",
             prefetch_factor=prefetch_factor,
-            collate_fn=_collate_batch_classifier,
+            collate_fn=functools.partial(_collate_batch_classifier, ring=test_pos_ring),
         )
         for i, (seq_emb, seq_inds, track) in enumerate(
             tqdm(
@@ -552,9 +655,9 @@ def evaluate_chromatin_model(
                 ncols=120,
             )
         ):
-            seq_emb = seq_emb.to(device)
-            seq_inds = seq_inds.to(device)
-            track = track.to(device)
+            seq_emb, seq_inds, track = test_pos_ring.to_device(
+                (seq_emb, seq_inds, track), device
+            )
             true_counts = track.sum(dim=1)
 
             log1p_counts = model(seq_emb, seq_inds)
@@ -573,13 +676,14 @@ def evaluate_chromatin_model(
         test_loss_idr = 0
         test_counts_pred_idr = []
         test_counts_true_idr = []
+        test_idr_ring = BufferRing(device)
         test_idr_dataloader = DataLoader(
             idr_dataset,
             batch_size=batch_size,
             num_workers=num_workers,
-            pin_memory=True,
+            pin_memory=device.type == "cuda",
             prefetch_factor=prefetch_factor,
-            collate_fn=_collate_batch_classifier,
+            collate_fn=functools.partial(_collate_batch_classifier, ring=test_idr_ring),
         )
         for i, (seq_emb, seq_inds, track) in enumerate(
             tqdm(
@@ -589,9 +693,9 @@ def evaluate_chromatin_model(
                 ncols=120,
             )
         ):
-            seq_emb = seq_emb.to(device)
-            seq_inds = seq_inds.to(device)
-            track = track.to(device)
+            seq_emb, seq_inds, track = test_idr_ring.to_device(
+                (seq_emb, seq_inds, track), device
+            )
             true_counts = track.sum(dim=1)
 
             log1p_counts = model(seq_emb, seq_inds)
@@ -610,13 +714,14 @@ def evaluate_chromatin_model(
         test_loss_neg = 0
         test_counts_pred_neg = []
         test_counts_true_neg = []
+        test_neg_ring = BufferRing(device)
         test_neg_dataloader = DataLoader(
             neg_dataset,
             batch_size=batch_size,
             num_workers=num_workers,
-            pin_memory=True,
+            pin_memory=device.type == "cuda",
             prefetch_factor=prefetch_factor,
-            collate_fn=_collate_batch_classifier,
+            collate_fn=functools.partial(_collate_batch_classifier, ring=test_neg_ring),
         )
         for i, (seq_emb, seq_inds, track) in enumerate(
             tqdm(
@@ -626,9 +731,9 @@ def evaluate_chromatin_model(
                 ncols=120,
             )
         ):
-            seq_emb = seq_emb.to(device)
-            seq_inds = seq_inds.to(device)
-            track = track.to(device)
+            seq_emb, seq_inds, track = test_neg_ring.to_device(
+                (seq_emb, seq_inds, track), device
+            )
             true_counts = track.sum(dim=1)
 
             log1p_counts = model(seq_emb, seq_inds)  # .squeeze(1)
@@ -664,10 +769,10 @@ def evaluate_chromatin_model(
             ],
             dim=0,
         )
-        test_auroc = roc_auc_score(
+        test_auroc = skmetrics.roc_auc_score(
             test_labels.numpy(force=True), test_counts_pred_cls.numpy(force=True)
         )
-        test_auprc = average_precision_score(
+        test_auprc = skmetrics.average_precision_score(
             test_labels.numpy(force=True), test_counts_pred_cls.numpy(force=True)
         )
 
@@ -694,14 +799,14 @@ def evaluate_chromatin_model(
     return metrics
 
 
-def _collate_batch_classifier(batch):
-    max_seq_len = max(seq_emb.shape[0] for seq_emb, _, _ in batch)
-    seq_embs = torch.zeros(len(batch), max_seq_len, batch[0][0].shape[1])
-    for i, (seq_emb, _, _) in enumerate(batch):
-        seq_embs[i, : seq_emb.shape[0]] = seq_emb
+def _collate_batch_classifier(batch, ring=None):
+    slot = None if ring is None else ring.acquire()
+    seq_embs = collate_embeddings(
+        [b[0] for b in batch], [b[3] for b in batch], ring, slot, "seq_embs"
+    )
 
-    seq_inds = torch.stack([seq_inds for _, seq_inds, _ in batch])
-    labels = torch.stack([label for _, _, label in batch])
+    seq_inds = stack([b[1] for b in batch], ring, slot, "seq_inds")
+    labels = stack([b[2] for b in batch], ring, slot, "labels")
 
     return seq_embs, seq_inds, labels
 
@@ -720,21 +825,24 @@ def train_peak_classifier(
     progress_bar=False,
     resume_from=None,
 ):
+    device = resolve_device(device, num_workers)
+    train_ring = BufferRing(device)
     train_dataloader = DataLoader(
         train_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        collate_fn=_collate_batch_classifier,
-        pin_memory=True,
+        collate_fn=functools.partial(_collate_batch_classifier, ring=train_ring),
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=False,
     )
+    val_ring = BufferRing(device)
     val_dataloader = DataLoader(
         val_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        collate_fn=_collate_batch_classifier,
-        pin_memory=True,
+        collate_fn=functools.partial(_collate_batch_classifier, ring=val_ring),
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=False,
     )
@@ -757,10 +865,10 @@ def train_peak_classifier(
         resume_checkpoint_path = os.path.join(out_dir, f"checkpoint_{resume_from}.pt")
         optimizer_checkpoint_path = os.path.join(out_dir, f"optimizer_{resume_from}.pt")
         start_epoch = resume_from + 1
-        checkpoint_resume = torch.load(resume_checkpoint_path)
+        checkpoint_resume = torch.load(resume_checkpoint_path, map_location="cpu")
         model.load_state_dict(checkpoint_resume, strict=False)
         try:
-            optimizer_resume = torch.load(optimizer_checkpoint_path)
+            optimizer_resume = torch.load(optimizer_checkpoint_path, map_location="cpu")
             optimizer.load_state_dict(optimizer_resume)
         except FileNotFoundError:
             warnings.warn(
@@ -788,9 +896,9 @@ def train_peak_classifier(
                     ncols=120,
                 )
             ):
-                seq_emb = seq_emb.to(device)
-                seq_inds = seq_inds.to(device)
-                labels = labels.to(device)
+                seq_emb, seq_inds, labels = train_ring.to_device(
+                    (seq_emb, seq_inds, labels), device
+                )
 
                 optimizer.zero_grad()
                 pred = model(seq_emb, seq_inds)
@@ -810,9 +918,9 @@ def train_peak_classifier(
                         ncols=120,
                     )
                 ):
-                    seq_emb = seq_emb.to(device)
-                    seq_inds = seq_inds.to(device)
-                    labels = labels.to(device)
+                    seq_emb, seq_inds, labels = val_ring.to_device(
+                        (seq_emb, seq_inds, labels), device
+                    )
 
                     pred = model(seq_emb, seq_inds)
                     loss = criterion(pred, labels)
@@ -844,15 +952,17 @@ def eval_peak_classifier(
     progress_bar=False,
     seed=0,
 ):
+    device = resolve_device(device, num_workers)
 
+    test_ring = BufferRing(device)
     test_dataloader = DataLoader(
         test_dataset,
         batch_size=batch_size,
         num_workers=num_workers,
-        pin_memory=True,
+        pin_memory=device.type == "cuda",
         prefetch_factor=prefetch_factor,
         persistent_workers=False,
-        collate_fn=_collate_batch_classifier,
+        collate_fn=functools.partial(_collate_batch_classifier, ring=test_ring),
     )
 
     torch.manual_seed(seed)
@@ -866,13 +976,13 @@ def eval_peak_classifier(
     labels = []
     model.eval()
     pred_logits = []
-    with torch.no_grad():
+    with torch.inference_mode():
         for i, (seq_emb, seq_inds, labels_batch) in enumerate(
             tqdm(test_dataloader, disable=(not progress_bar), desc="test", ncols=120)
         ):
-            seq_emb = seq_emb.to(device)
-            seq_inds = seq_inds.to(device)
-            labels_batch = labels_batch.to(device)
+            seq_emb, seq_inds, labels_batch = test_ring.to_device(
+                (seq_emb, seq_inds, labels_batch), device
+            )
             pred = model(seq_emb, seq_inds)
             pred_logits.append(pred)
             loss = criterion(pred, labels_batch)
@@ -905,9 +1015,9 @@ def eval_peak_classifier(
         class_preds = class_preds.numpy(force=True)
         class_labels = class_labels.numpy(force=True)
 
-        class_auroc = roc_auc_score(class_labels, class_log_odds)
-        class_auprc = average_precision_score(class_labels, class_log_odds)
-        class_mcc = matthews_corrcoef(class_labels, class_preds)
+        class_auroc = skmetrics.roc_auc_score(class_labels, class_log_odds)
+        class_auprc = skmetrics.average_precision_score(class_labels, class_log_odds)
+        class_mcc = skmetrics.matthews_corrcoef(class_labels, class_preds)
         class_acc = (class_preds == class_labels).sum().item() / len(class_labels)
 
         metrics[f"class_{class_name}_auroc"] = class_auroc
@@ -918,6 +1028,14 @@ def eval_peak_classifier(
     with open(out_path, "w") as f:
         json.dump(metrics, f, indent=4)
 
+    # Per-example labels and class log-odds for bootstrap confidence intervals
+    scores_path = os.path.splitext(out_path)[0] + "_scores.tsv"
+    pred_log_odds = pred_log_odds.numpy(force=True)
+    scores = {"label": labels.numpy(force=True)}
+    for class_name, class_idx in test_dataloader.dataset.classes.items():
+        scores[f"{class_name}_log_odds"] = pred_log_odds[:, class_idx]
+    pl.DataFrame(scores).write_csv(scores_path, separator="\t")
+
     return metrics
 
 
@@ -939,7 +1057,6 @@ class CNNEmbeddingsPredictorBase(torch.nn.Module):
         return embs
 
     def forward(self, embs, inds):
-        torch.cuda.synchronize()
         x = self._detokenize(embs, inds)
         x = x.swapaxes(1, 2)
         x = F.relu(self.conv1(x))
@@ -1010,7 +1127,6 @@ class LargeCNNPredictorBase(torch.nn.Module):
         return embs
 
     def forward(self, embs, inds):
-        torch.cuda.synchronize()
         x = self._detokenize(embs, inds)
         x = x.swapaxes(1, 2)
 
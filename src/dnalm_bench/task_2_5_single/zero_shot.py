@@ -3,16 +3,11 @@ from abc import ABCMeta, abstractmethod
 import torch
 import torch.nn.functional as F
 from torch.utils.data import DataLoader
-from transformers import (
-    AutoModel,
-    AutoModelForCausalLM,
-    AutoModelForMaskedLM,
-    AutoTokenizer,
-    BertConfig,
-)
 
-from ...utils import onehot_to_chars
-from ..components import SimpleSequence
+from ..devices import resolve_device
+from ..models import load_pretrained
+from ..utils import onehot_to_chars
+from .components import SimpleSequence
 
 
 class MaskedZeroShotScore(metaclass=ABCMeta):
@@ -71,10 +66,10 @@ class LogitExtractor(metaclass=ABCMeta):
             self.dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers
         )
 
-        self.device = device
+        self.device = resolve_device(device, num_workers)
         self.tokenizer = tokenizer
         self.model = model
-        self.model.to(device)
+        self.model.to(self.device)
         super().__init__(
             genome_fa, elements_tsv, chroms, batch_size, num_workers, seed, device
         )
@@ -95,9 +90,7 @@ class LogitExtractor(metaclass=ABCMeta):
 
     def tokenize(self, seqs):
         seqs_str = onehot_to_chars(seqs)
-        encoded = self.tokenizer.batch_encode_plus(
-            seqs_str, return_tensors="pt", padding=True
-        )
+        encoded = self.tokenizer(seqs_str, return_tensors="pt", padding=True)
         tokens = encoded["input_ids"]
         attention_mask = encoded["attention_mask"]
         if self.start_token is not None:
@@ -111,7 +104,7 @@ class LogitExtractor(metaclass=ABCMeta):
         return tokens, starts, ends, attention_mask
 
     def model_fwd(self, tokens, attention_mask):
-        with torch.no_grad():
+        with torch.inference_mode():
             torch_outs = self.model(
                 tokens,
                 attention_mask=attention_mask,
@@ -134,13 +127,7 @@ class DNABERT2Evaluator(LogitExtractor, MaskedZeroShotScore):
         seed,
         device,
     ):
-        model_name = f"zhihan1996/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        config = BertConfig.from_pretrained(self.model_name, trust_remote_code=True)
-        # model = AutoModelForMaskedLM.from_config(config)
-        model = AutoModelForMaskedLM.from_pretrained(
-            model_name, config=config, trust_remote_code=True
-        )
+        tokenizer, model = load_pretrained("dnabert2", model_name, "masked_lm")
         super().__init__(
             tokenizer,
             model,
@@ -174,9 +161,7 @@ class GenaLMEvaluator(LogitExtractor, MaskedZeroShotScore):
         seed,
         device,
     ):
-        model_name = f"AIRI-Institute/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModel.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("gena_lm", model_name, "base")
         super().__init__(
             tokenizer,
             model,
@@ -210,11 +195,7 @@ class HDEvaluator(LogitExtractor, CausalZeroShotScore):
         seed,
         device,
     ):
-        model_name = f"LongSafari/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(
-            model_name, trust_remote_code=True, padding_side="right"
-        )
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("hyenadna", model_name, "causal_lm")
         super().__init__(
             tokenizer,
             model,
@@ -248,9 +229,7 @@ class MistralEvaluator(LogitExtractor, CausalZeroShotScore):
         seed,
         device,
     ):
-        model_name = f"RaphaelMourad/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForCausalLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained("mistral_dna", model_name, "causal_lm")
         super().__init__(
             tokenizer,
             model,
@@ -287,9 +266,9 @@ class NTEvaluator(LogitExtractor, MaskedZeroShotScore):
         super().__init__(
             genome_fa, elements_tsv, chroms, batch_size, num_workers, seed, device
         )
-        model_name = f"InstaDeepAI/{model_name}"
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        model = AutoModelForMaskedLM.from_pretrained(model_name, trust_remote_code=True)
+        tokenizer, model = load_pretrained(
+            "nucleotide_transformer", model_name, "masked_lm"
+        )
         super().__init__(
             tokenizer,
             model,
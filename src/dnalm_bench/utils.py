@@ -1,16 +1,20 @@
+import importlib
 import math
 import shutil
 import sys
+import types
 
 import numpy as np
 import torch
 
 ALPHABET = np.array(["A", "C", "G", "T"], dtype="S1")
+ALPHABET_CODES = ALPHABET.view(np.uint8)
 
 
 def onehot_to_chars(onehot):
-    chararray = ALPHABET[np.argmax(onehot, axis=2)]
-    strings = [b"".join(row).decode() for row in chararray]
+    # Each row of ASCII codes is viewed as one fixed-width byte string
+    codes = ALPHABET_CODES[np.argmax(onehot, axis=2)]
+    strings = codes.view(f"S{codes.shape[1]}")[:, 0].astype(str).tolist()
 
     return strings
 
@@ -51,6 +55,27 @@ class NoModule:
                 del sys.modules[module_name]
 
 
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a heavy third-party module that is only imported on first
+    attribute access, so importing dnalm_bench (and spawning DataLoader
+    workers) does not pay for dependencies a code path never uses.
+    """
+
+    def __getattr__(self, name):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+
+        return getattr(module, name)
+
+
+def lazy_import(module_name):
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    return LazyModule(module_name)
+
+
 SEQ_TOKENS = np.array([0, 1, 2, 3], dtype=np.int8)
 
 
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+from torch.utils.data import Subset
+
+
+def file_hash(path, chunk_size=2**20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+
+    return h.hexdigest()[:16]
+
+
+def genome_hash(genome_fa):
+    """
+    Cheap genome fingerprint from the FASTA index (contig names, lengths and
+    offsets) and the FASTA file size, to avoid hashing the whole genome.
+    """
+    h = hashlib.sha256()
+    with open(genome_fa + ".fai", "rb") as f:
+        h.update(f.read())
+    h.update(str(os.path.getsize(genome_fa)).encode("utf-8"))
+
+    return h.hexdigest()[:16]
+
+
+def pretrained_model_id(model_name, evaluator):
+    """
+    Cache model id of a pretrained model scored by an evaluator: the model
+    name, the hub revision its weights were resolved to ("local" if none) and
+    the evaluator class, so that scores of different checkpoints or scoring
+    code are never mixed
+    """
+    config = getattr(evaluator.model, "config", None)
+    revision = getattr(config, "_commit_hash", None) or "local"
+
+    return f"{model_name}@{revision}:{type(evaluator).__name__}"
+
+
+def variant_keys(dataset):
+    """
+    Returns the (chr, pos, ref, alt) rows of a VariantDataset, or of a Subset of one
+    """
+    if isinstance(dataset, Subset):
+        return variant_keys(dataset.dataset)[np.asarray(dataset.indices)]
+
+    return dataset.elements_df.select(dataset.elements_df.columns[:4])
+
+
+class VariantScoreCache:
+    """
+    Persistent store of per-variant scores shared across runs and variant sets.
+    Entries are keyed by (model id, scoring mode, genome hash, chrom, pos, ref,
+    alt, window) and hold a float32 vector per variant.
+    """
+
+    def __init__(self, path, model_id, mode, genome_fa, window):
+        self.path = path
+        self.model_id = model_id
+        self.mode = mode
+        self.genome = genome_hash(genome_fa)
+        self.window = window
+
+        self.hits = 0
+        self.misses = 0
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        self.conn = sqlite3.connect(path, timeout=600)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS variant_scores (
+                model TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                genome TEXT NOT NULL,
+                chrom TEXT NOT NULL,
+                pos INTEGER NOT NULL,
+                ref TEXT NOT NULL,
+                alt TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                scores BLOB NOT NULL,
+                PRIMARY KEY (model, mode, genome, chrom, pos, ref, alt, window)
+            ) WITHOUT ROWID
+            """)
+        self.conn.commit()
+
+    def lookup(self, keys):
+        """
+        Bulk lookup of a (chr, pos, ref, alt) frame. Returns a boolean mask of
+        cached rows and a (num_found, width) array of their scores.
+        """
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS query "
+            "(i INTEGER PRIMARY KEY, chrom TEXT, pos INTEGER, ref TEXT, alt TEXT)"
+        )
+        self.conn.execute("DELETE FROM query")
+        self.conn.executemany(
+            "INSERT INTO query VALUES (?, ?, ?, ?, ?)",
+            ((i, *row) for i, row in enumerate(keys.iter_rows())),
+        )
+        rows = self.conn.execute(
+            """
+            SELECT q.i, s.scores FROM query q
+            JOIN variant_scores s
+            ON s.model = ? AND s.mode = ? AND s.genome = ? AND s.window = ?
+            AND s.chrom = q.chrom AND s.pos = q.pos AND s.ref = q.ref AND s.alt = q.alt
+            ORDER BY q.i
+            """,
+            (self.model_id, self.mode, self.genome, self.window),
+        ).fetchall()
+        self.conn.execute("DELETE FROM query")
+
+        found = np.zeros(keys.height, dtype=bool)
+        found[[i for i, _ in rows]] = True
+        if rows:
+            scores = np.stack([np.frombuffer(s, dtype=np.float32) for _, s in rows])
+        else:
+            scores = np.zeros((0, 0), dtype=np.float32)
+
+        self.hits += len(rows)
+        self.misses += keys.height - len(rows)
+
+        return found, scores
+
+    def store(self, keys, scores):
+        scores = np.ascontiguousarray(scores, dtype=np.float32)
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO variant_scores VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                (
+                    self.model_id,
+                    self.mode,
+                    self.genome,
+                    chrom,
+                    pos,
+                    ref,
+                    alt,
+                    self.window,
+                    row.tobytes(),
+                )
+                for (chrom, pos, ref, alt), row in zip(keys.iter_rows(), scores)
+            ),
+        )
+        self.conn.commit()
+
+    def report(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total > 0 else 0.0
+
+        return {
+            "model": self.model_id,
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": hit_rate,
+        }
+
+    def close(self):
+        self.conn.close()